@@ -0,0 +1,305 @@
+"""
+Columnar snapshots of the providers table for analytics.
+
+Analysts should not run check_database.py-style GROUP BY queries against the
+production database. Instead, export a snapshot once and query it locally:
+
+    python analytics_snapshot.py export snapshot/ [--format arrow|parquet]
+    python analytics_snapshot.py summary snapshot/
+
+The export writes two datasets, both partitioned by service type
+(snapshot/providers/service_type=auto/part-0.arrow, ...):
+- providers: one row per provider, including the one..five star counts
+- reviews: one row per sampled review, exploded from the reviews JSON
+
+The reader memory-maps the files, so summaries read only the columns they
+use from the OS page cache and never touch the database. Arrow IPC files
+(the default) are mapped zero-copy; Parquet is smaller on disk but has to
+be decoded.
+
+manifest.json lists every file the export wrote; the reader opens only
+those, so stray or half-written files in the directory are never read.
+
+Requires pyarrow (in requirements.txt), which the API itself doesn't use.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Add the backend directory to the path so we can import the database modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+# Rows fetched from the database per round trip during export
+EXPORT_BATCH_SIZE = 5000
+
+# Provider columns included in the snapshot (service_type is the partition key)
+PROVIDER_COLUMNS = [
+    'id', 'name', 'neighborhood', 'rating', 'reviews_count',
+    'one_star', 'two_star', 'three_star', 'four_star', 'five_star',
+    'city', 'postal_code', 'website', 'last_review_at', 'review_velocity'
+]
+
+FILE_EXTENSIONS = {'arrow': '.arrow', 'parquet': '.parquet'}
+
+def require_pyarrow():
+    if pa is None:
+        print("Analytics snapshots need pyarrow: pip install pyarrow")
+        sys.exit(1)
+
+def provider_schema():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('name', pa.string()),
+        ('neighborhood', pa.string()),
+        ('rating', pa.float64()),
+        ('reviews_count', pa.int64()),
+        ('one_star', pa.int64()),
+        ('two_star', pa.int64()),
+        ('three_star', pa.int64()),
+        ('four_star', pa.int64()),
+        ('five_star', pa.int64()),
+        ('city', pa.string()),
+        ('postal_code', pa.string()),
+        ('website', pa.string()),
+        ('last_review_at', pa.timestamp('s')),
+        ('review_velocity', pa.float64())
+    ])
+
+def review_schema():
+    return pa.schema([
+        ('provider_id', pa.int64()),
+        ('neighborhood', pa.string()),
+        ('reviewer', pa.string()),
+        ('rating', pa.int64()),
+        ('text', pa.string()),
+        ('date', pa.string()),
+        ('published_at', pa.timestamp('s'))
+    ])
+
+class PartitionWriter:
+    """
+    Writes one partition file (part-0) as record batches of up to
+    EXPORT_BATCH_SIZE rows, so only one batch is held in memory at a time.
+    """
+
+    def __init__(self, directory, schema, file_format):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'part-0' + FILE_EXTENSIONS[file_format])
+        self.schema = schema
+        self.rows = {name: [] for name in schema.names}
+        self.pending = 0
+        self.num_rows = 0
+        if file_format == 'parquet':
+            self.sink = None
+            self.writer = pq.ParquetWriter(self.path, schema)
+        else:
+            self.sink = pa.OSFile(self.path, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, schema)
+
+    def append(self, row):
+        for name in self.schema.names:
+            self.rows[name].append(row[name])
+        self.pending += 1
+        if self.pending >= EXPORT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch = pa.RecordBatch.from_pydict(self.rows, schema=self.schema)
+        self.writer.write_batch(batch)
+        self.num_rows += self.pending
+        self.rows = {name: [] for name in self.schema.names}
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+        return self.num_rows
+
+def partition_name(service_type):
+    return 'service_type=' + (service_type or 'unknown').replace('/', '_')
+
+def review_rows(provider):
+    """Explode a provider's reviews JSON into one row per review"""
+    try:
+        provider_reviews = json.loads(provider.reviews) if provider.reviews else []
+    except ValueError:
+        provider_reviews = []
+    for review in provider_reviews:
+        published_at = review.get('published_at')
+        yield {
+            'provider_id': provider.id,
+            'neighborhood': provider.neighborhood,
+            'reviewer': review.get('reviewer'),
+            'rating': review.get('rating'),
+            'text': review.get('text'),
+            'date': review.get('date'),
+            'published_at': datetime.fromisoformat(published_at) if published_at else None
+        }
+
+def export_snapshot(output_dir, file_format='arrow'):
+    """
+    Stream the providers table out of the database into a partitioned columnar snapshot.
+
+    Rows arrive ordered by service type, so only the current partition's
+    two writers are open, and memory use is bounded by EXPORT_BATCH_SIZE
+    rather than by the size of the table.
+    """
+    from database import Provider, SessionLocal
+
+    counts = {'providers': 0, 'reviews': 0}
+    files = {'providers': [], 'reviews': []}
+    service_types = []
+    writers = None
+
+    def close_writers():
+        for dataset, writer in writers.items():
+            counts[dataset] += writer.close()
+            files[dataset].append({
+                'service_type': service_types[-1],
+                'path': os.path.relpath(writer.path, output_dir)
+            })
+
+    db = SessionLocal()
+    try:
+        query = db.query(Provider).order_by(Provider.service_type, Provider.id).yield_per(EXPORT_BATCH_SIZE)
+        for provider in query:
+            if not service_types or provider.service_type != service_types[-1]:
+                if writers is not None:
+                    close_writers()
+                service_types.append(provider.service_type)
+                partition = partition_name(provider.service_type)
+                writers = {
+                    'providers': PartitionWriter(os.path.join(output_dir, 'providers', partition), provider_schema(), file_format),
+                    'reviews': PartitionWriter(os.path.join(output_dir, 'reviews', partition), review_schema(), file_format)
+                }
+            writers['providers'].append({column: getattr(provider, column) for column in PROVIDER_COLUMNS})
+            for row in review_rows(provider):
+                writers['reviews'].append(row)
+        if writers is not None:
+            close_writers()
+    finally:
+        db.close()
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'exported_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'format': file_format,
+            'providers': counts['providers'],
+            'reviews': counts['reviews'],
+            'service_types': sorted(service_types, key=lambda service_type: service_type or ''),
+            'files': files
+        }, f, indent=2)
+
+    print(f"Exported {counts['providers']} providers and {counts['reviews']} reviews to {output_dir} ({file_format})")
+    return counts
+
+class SnapshotReader:
+    """Memory-mapped reader for a snapshot written by export_snapshot()"""
+
+    def __init__(self, snapshot_dir):
+        with open(os.path.join(snapshot_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.snapshot_dir = snapshot_dir
+
+    def read(self, dataset, columns=None):
+        """
+        Read a dataset ('providers' or 'reviews') as one Arrow table, adding
+        the service_type partition column. Only the files listed in the
+        manifest are read; an export of an empty table gives an empty table.
+        """
+        tables = []
+        for entry in self.manifest['files'][dataset]:
+            path = os.path.join(self.snapshot_dir, entry['path'])
+            if path.endswith('.parquet'):
+                table = pq.read_table(path, columns=columns, memory_map=True)
+            else:
+                # Zero-copy: column buffers point straight into the mapped file
+                table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+                if columns is not None:
+                    table = table.select(columns)
+            service_type = pa.array([entry['service_type']] * table.num_rows, pa.string())
+            tables.append(table.append_column('service_type', service_type))
+        if not tables:
+            schema = provider_schema() if dataset == 'providers' else review_schema()
+            table = schema.empty_table()
+            if columns is not None:
+                table = table.select(columns)
+            return table.append_column('service_type', pa.array([], pa.string()))
+        return pa.concat_tables(tables)
+
+    def counts_by(self, column, dataset='providers'):
+        """Row counts per value of a column, highest first"""
+        counts = self.read(dataset, columns=[column] if column != 'service_type' else ['id'])[column].value_counts()
+        return sorted(((item['values'].as_py(), item['counts'].as_py()) for item in counts), key=lambda x: x[1], reverse=True)
+
+    def rating_histogram(self, bin_width=0.5):
+        """Number of providers per rating bucket, as (bucket start, count)"""
+        ratings = self.read('providers', columns=['rating'])['rating']
+        buckets = pc.multiply(pc.floor(pc.divide(ratings, bin_width)), bin_width)
+        counts = buckets.value_counts()
+        # Unrated providers (null rating) sort last
+        return sorted(((item['values'].as_py(), item['counts'].as_py()) for item in counts),
+                      key=lambda x: (x[0] is None, x[0] or 0))
+
+    def star_distribution(self):
+        """Total one..five star review counts across all providers"""
+        columns = ['one_star', 'two_star', 'three_star', 'four_star', 'five_star']
+        table = self.read('providers', columns=columns)
+        return {column: pc.sum(table[column]).as_py() or 0 for column in columns}
+
+def print_summary(snapshot_dir):
+    """Print the same coverage summaries as check_database.py, from a snapshot"""
+    reader = SnapshotReader(snapshot_dir)
+    manifest = reader.manifest
+    print(f"Snapshot exported at {manifest['exported_at']} ({manifest['format']})")
+    print(f"Total providers in snapshot: {manifest['providers']} ({manifest['reviews']} sampled reviews)")
+
+    print("\nProviders by service type:")
+    for service_type, count in reader.counts_by('service_type'):
+        print(f"  {service_type}: {count} providers")
+
+    print("\nTop 10 neighborhoods:")
+    for neighborhood, count in reader.counts_by('neighborhood')[:10]:
+        print(f"  {neighborhood}: {count} providers")
+
+    print("\nRating histogram:")
+    for bucket, count in reader.rating_histogram():
+        label = 'unrated' if bucket is None else f"{bucket:.1f}+"
+        print(f"  {label}: {count} providers")
+
+    print("\nReview star distribution:")
+    for column, count in reader.star_distribution().items():
+        print(f"  {column}: {count}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and summarise columnar snapshots of the providers table")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export the providers table to a snapshot directory")
+    export_parser.add_argument("output_dir")
+    export_parser.add_argument("--format", choices=sorted(FILE_EXTENSIONS), default="arrow", help="Arrow IPC (memory-mappable) or Parquet")
+
+    summary_parser = subparsers.add_parser("summary", help="Summarise a snapshot without touching the database")
+    summary_parser.add_argument("snapshot_dir")
+
+    args = parser.parse_args()
+    require_pyarrow()
+
+    if args.command == "export":
+        export_snapshot(args.output_dir, args.format)
+    else:
+        print_summary(args.snapshot_dir)
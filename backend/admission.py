@@ -0,0 +1,142 @@
+"""
+Admission control for the API.
+
+Each client IP gets a token bucket, and each worker caps the number of
+requests it has in flight. Requests over either limit are rejected straight
+away (429 or 503 with Retry-After) instead of queueing for a database
+connection, so one aggressive client can't slow everyone else down.
+"""
+import math
+import os
+import time
+from collections import OrderedDict
+
+from starlette.responses import JSONResponse
+
+# Sustained requests per second allowed per client IP (0 disables rate limiting)
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", "10"))
+
+# Extra requests a client may burst above the sustained rate
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "20"))
+
+# Requests a single worker processes at once before shedding load (0 disables the cap)
+MAX_IN_FLIGHT_REQUESTS = int(os.environ.get("MAX_IN_FLIGHT_REQUESTS", "64"))
+
+# Use the first X-Forwarded-For address as the client IP (enable behind a trusted proxy)
+TRUST_FORWARDED_FOR = os.environ.get("TRUST_FORWARDED_FOR", "0") == "1"
+
+# Health checks and metrics scrapes are never rejected
+EXEMPT_PATHS = ("/ping", "/ready", "/metrics")
+
+# Upper bound on the number of client buckets kept in memory
+MAX_TRACKED_CLIENTS = 10000
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        """
+        Take one token. Returns 0 if the request is allowed, otherwise the
+        number of seconds until a token becomes available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class AdmissionController:
+    """Per-client token buckets, the in-flight counter and rejection counters for one worker"""
+
+    def __init__(self, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST, max_in_flight=MAX_IN_FLIGHT_REQUESTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.buckets = OrderedDict()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected_rate_limited = 0
+        self.rejected_overloaded = 0
+
+    def retry_after(self, client):
+        """Charge the client one token; returns seconds to wait if it has none left"""
+        if self.rate <= 0:
+            return 0
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.rate, max(self.burst, 1))
+            # Forget the least recently seen clients so memory stays bounded
+            if len(self.buckets) > MAX_TRACKED_CLIENTS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client)
+        return bucket.take()
+
+    def snapshot(self):
+        """Counters for the /metrics endpoint"""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "rejected_overloaded": self.rejected_overloaded,
+            "tracked_clients": len(self.buckets)
+        }
+
+def client_address(scope):
+    """Return the client IP for a request scope"""
+    if TRUST_FORWARDED_FOR:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that enforces an AdmissionController's limits"""
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        controller = self.controller
+        wait = controller.retry_after(client_address(scope))
+        if wait:
+            controller.rejected_rate_limited += 1
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+            await response(scope, receive, send)
+            return
+
+        if controller.max_in_flight and controller.in_flight >= controller.max_in_flight:
+            controller.rejected_overloaded += 1
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server busy"},
+                headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+
+        controller.admitted += 1
+        controller.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.in_flight -= 1
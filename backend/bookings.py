@@ -0,0 +1,190 @@
+"""
+Write-behind queue for booking requests.
+
+POST /bookings puts each booking on an in-process asyncio queue. A single
+flusher task drains it in batches (up to BOOKING_BATCH_SIZE, or whatever
+arrived within BOOKING_FLUSH_INTERVAL seconds) and writes each batch with
+one commit, so a surge of bookings costs one commit per batch rather than
+one per request.
+
+BOOKING_DURABILITY controls when the client gets its answer:
+- "commit" (default): after the batch containing the booking is committed
+- "queued": as soon as the booking is on the queue (faster, but bookings
+  still queued are lost if the process crashes)
+"""
+import asyncio
+import os
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+
+from database import Booking, Provider, SessionLocal
+
+# Maximum bookings written per commit
+BOOKING_BATCH_SIZE = int(os.environ.get("BOOKING_BATCH_SIZE", "50"))
+
+# Seconds to wait for more bookings before committing a partial batch
+BOOKING_FLUSH_INTERVAL = float(os.environ.get("BOOKING_FLUSH_INTERVAL", "0.05"))
+
+# Bookings that may wait on the queue before new ones are rejected with 503
+BOOKING_QUEUE_MAX = int(os.environ.get("BOOKING_QUEUE_MAX", "1000"))
+
+# "commit" or "queued", see the module docstring
+BOOKING_DURABILITY = os.environ.get("BOOKING_DURABILITY", "commit")
+
+class QueueFull(Exception):
+    """Raised when the booking queue is at capacity"""
+
+def write_bookings(bookings):
+    """
+    Insert a batch of bookings in one transaction.
+
+    Returns the new booking ids in the same order, with None for bookings
+    whose provider doesn't exist.
+    """
+    db = SessionLocal()
+    try:
+        provider_ids = {booking["provider_id"] for booking in bookings}
+        provider_names = dict(db.query(Provider.id, Provider.name).filter(Provider.id.in_(provider_ids)).all())
+
+        now = datetime.utcnow()
+        rows = []
+        for booking in bookings:
+            if booking["provider_id"] not in provider_names:
+                rows.append(None)
+                continue
+            row = Booking(
+                provider_id=booking["provider_id"],
+                provider_name=provider_names[booking["provider_id"]],
+                name=booking["name"],
+                email=booking["email"],
+                phone=booking["phone"],
+                preferred_date=booking["date"],
+                preferred_time=booking["time"],
+                message=booking.get("message"),
+                created_at=now
+            )
+            db.add(row)
+            rows.append(row)
+
+        # Flush to get the generated ids before the commit expires the objects
+        db.flush()
+        ids = [row.id if row is not None else None for row in rows]
+        db.commit()
+        return ids
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+class BookingQueue:
+    """In-process queue that group-commits bookings from a background task"""
+
+    def __init__(self, batch_size=BOOKING_BATCH_SIZE, flush_interval=BOOKING_FLUSH_INTERVAL,
+                 max_size=BOOKING_QUEUE_MAX, wait_for_commit=BOOKING_DURABILITY != "queued"):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.wait_for_commit = wait_for_commit
+        self.queue = None
+        self.task = None
+        self.flushing = None
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        """Start the flusher task (call from the running event loop)"""
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write out everything still queued and stop the flusher task"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        if self.flushing is not None:
+            await self.flushing
+        while not self.queue.empty():
+            await self._flush(self._take_batch())
+
+    def submit(self, booking):
+        """
+        Queue a booking. Returns a future resolving to the booking id (or
+        None if the provider doesn't exist) when waiting for commits, and
+        None otherwise. Raises QueueFull when the queue is at capacity.
+        """
+        if self.queue is None:
+            raise RuntimeError("Booking queue has not been started")
+        future = asyncio.get_running_loop().create_future() if self.wait_for_commit else None
+        try:
+            self.queue.put_nowait((booking, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFull()
+        self.accepted += 1
+        return future
+
+    def _take_batch(self):
+        batch = []
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                batch.append(await self.queue.get())
+                deadline = loop.time() + self.flush_interval
+                # Collect more bookings until the batch is full or the interval runs out
+                while len(batch) < self.batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            finally:
+                # Shielded so bookings already taken off the queue are still written when stop() cancels us
+                self.flushing = asyncio.ensure_future(self._flush(batch))
+                await asyncio.shield(self.flushing)
+
+    async def _flush(self, batch):
+        if not batch:
+            return
+        self.batches += 1
+        try:
+            ids = await run_in_threadpool(write_bookings, [booking for booking, _ in batch])
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Error writing {len(batch)} bookings: {e}")
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        self.written += sum(1 for booking_id in ids if booking_id is not None)
+        for (_, future), booking_id in zip(batch, ids):
+            if future is not None and not future.done():
+                future.set_result(booking_id)
+
+    def snapshot(self):
+        """Counters for the /metrics endpoint"""
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches
+        }
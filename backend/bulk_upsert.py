@@ -0,0 +1,195 @@
+"""
+Bulk provider upserts for the admin API.
+
+POST /admin/providers:bulkUpsert takes NDJSON, one provider per line. The
+body is parsed as it arrives, each record is validated on its own, and
+valid records are written in batches with a single INSERT ... ON CONFLICT
+(provider_key) DO UPDATE per batch, so data corrections no longer need an
+edit to enhanced_providers.py and a full reseed.
+
+On a PostgreSQL providers table partitioned by neighbourhood (see
+partitioning.py) the unique index is (provider_key, neighborhood), so the
+conflict target includes neighborhood, and a provider whose neighbourhood
+changes is first moved into its new partition by updating the existing row.
+
+Each batch is its own transaction, which also updates the stats rows of
+the (service_type, neighborhood) pairs it touched. Once it has committed,
+the endpoint publishes it (database.publish_data_change): the touched
+partitions are rebuilt and then a new data version records those pairs, so
+workers drop only the affected cache entries.
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from sqlalchemy import delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import Provider, SessionLocal, get_engine, is_invalid_neighborhood, make_provider_key
+from partitioning import is_partitioned
+from review_dates import resolve_review_dates
+from stats import refresh_stats
+
+# Valid records written per INSERT ... ON CONFLICT statement and transaction
+BATCH_SIZE = 500
+
+# Longest accepted NDJSON line; a longer one means a malformed body rather than a big provider
+MAX_LINE_BYTES = 1024 * 1024
+
+DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+class ProviderRecord(BaseModel):
+    """One provider in a bulk upsert. Fields left out keep their stored values on update."""
+
+    name: str = Field(..., min_length=1, max_length=200)
+    service_type: str = Field(..., min_length=1, max_length=100)
+    neighborhood: str = Field(..., min_length=1, max_length=100)
+    contact: Optional[str] = None
+    rating: Optional[float] = Field(None, ge=0, le=5)
+    address: Optional[str] = None
+    street: Optional[str] = None
+    city: Optional[str] = None
+    postal_code: Optional[str] = None
+    website: Optional[str] = None
+    full_phone: Optional[str] = None
+    email: Optional[str] = None
+    reviews_count: Optional[int] = Field(None, ge=0)
+    one_star: Optional[int] = Field(None, ge=0)
+    two_star: Optional[int] = Field(None, ge=0)
+    three_star: Optional[int] = Field(None, ge=0)
+    four_star: Optional[int] = Field(None, ge=0)
+    five_star: Optional[int] = Field(None, ge=0)
+    reviews: Optional[List[Dict[str, Any]]] = None
+
+    @field_validator("service_type", "neighborhood")
+    @classmethod
+    def lowercase(cls, value):
+        # Stored service types and neighbourhoods are lowercase
+        return value.strip().lower()
+
+    @field_validator("neighborhood")
+    @classmethod
+    def valid_neighborhood(cls, value):
+        if is_invalid_neighborhood(value):
+            raise ValueError(f"{value!r} is not a valid neighbourhood")
+        return value
+
+class LineTooLong(Exception):
+    pass
+
+async def iter_lines(chunks):
+    """Yield (line number, line bytes) from an async iterator of body chunks, skipping blank lines"""
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+        if len(buffer) > MAX_LINE_BYTES:
+            raise LineTooLong(f"Line {number + 1} is longer than {MAX_LINE_BYTES} bytes")
+    if buffer.strip():
+        yield number + 1, buffer
+
+def parse_record(line):
+    """Validate one NDJSON line; returns (row, None) or (None, error message)"""
+    try:
+        record = ProviderRecord.model_validate_json(line)
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(str(part) for part in error['loc']) or 'record'}: {error['msg']}"
+                               for error in e.errors())
+    row = record.model_dump(exclude_unset=True)
+    if "reviews" in row:
+        # Resolved the same way as at seeding so sort=recent_activity stays meaningful
+        reviews_json = json.dumps(row["reviews"]) if row["reviews"] is not None else None
+        row.update(resolve_review_dates(reviews_json, datetime.utcnow().replace(microsecond=0)))
+    row["provider_key"] = make_provider_key(record.name, record.service_type)
+    return row, None
+
+def move_rows(db, rows, existing):
+    """
+    On a partitioned table, move providers whose neighbourhood changed into
+    their new partition before the upsert, keeping their id and the fields
+    the record leaves out. Copies of the key in other neighbourhoods are
+    deleted, so each provider key ends up in one neighbourhood.
+    """
+    for row in rows:
+        matches = existing.get(row["provider_key"], [])
+        others = sorted(provider_id for provider_id, neighborhood in matches if neighborhood != row["neighborhood"])
+        if not others:
+            continue
+        if len(others) == len(matches):
+            # PostgreSQL moves a row to the matching partition when its partition key is updated
+            db.execute(
+                update(Provider).where(Provider.id == others[0], Provider.provider_key == row["provider_key"])
+                .values(neighborhood=row["neighborhood"]),
+                execution_options={"synchronize_session": False}
+            )
+            others = others[1:]
+        if others:
+            db.execute(
+                delete(Provider).where(Provider.id.in_(others), Provider.provider_key == row["provider_key"]),
+                execution_options={"synchronize_session": False}
+            )
+
+def uses_partitioned_table():
+    """
+    True if upserts go to a neighbourhood-partitioned PostgreSQL table.
+    Looked up once per request and passed to each batch.
+    """
+    engine = get_engine()
+    return engine.dialect.name == "postgresql" and is_partitioned(engine)
+
+def upsert_batch(db, rows, partitioned=False):
+    """
+    Insert or update a batch of rows (unique provider keys) and commit.
+
+    Returns ({provider_key: (id, "inserted" or "updated")}, touched pairs).
+    """
+    keys = [row["provider_key"] for row in rows]
+    existing = {}
+    touched = set()
+    for provider_id, key, service_type, neighborhood in db.query(
+        Provider.id, Provider.provider_key, Provider.service_type, Provider.neighborhood
+    ).filter(Provider.provider_key.in_(keys)):
+        existing.setdefault(key, []).append((provider_id, neighborhood))
+        touched.add((service_type, neighborhood))
+
+    insert = DIALECT_INSERTS[db.get_bind().dialect.name]
+    conflict_columns = [Provider.provider_key]
+    if partitioned:
+        # Unique indexes on a partitioned table include the partition key
+        conflict_columns.append(Provider.neighborhood)
+        move_rows(db, rows, existing)
+    # A multi-row VALUES list needs the same columns in every row, so group rows by the fields they set
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+        touched.add((row["service_type"], row["neighborhood"]))
+    ids = {}
+    for columns, group in groups.items():
+        statement = insert(Provider).values(group)
+        statement = statement.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={column: statement.excluded[column] for column in columns if column != "provider_key"}
+        ).returning(Provider.id, Provider.provider_key)
+        for provider_id, key in db.execute(statement):
+            ids[key] = provider_id
+
+    refresh_stats(db, touched)
+    db.commit()
+    return {key: (ids.get(key), "updated" if key in existing else "inserted") for key in keys}, touched
+
+def write_batch(rows, partitioned=False):
+    """upsert_batch in a session of its own (called from the threadpool)"""
+    db = SessionLocal()
+    try:
+        return upsert_batch(db, rows, partitioned)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
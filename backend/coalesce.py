@@ -0,0 +1,51 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight computation
+instead of each running it, so a burst of identical requests costs the
+database one query per key.
+"""
+import asyncio
+
+from starlette.concurrency import run_in_threadpool
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key; the blocking work runs in the threadpool"""
+
+    def __init__(self):
+        self.in_flight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, func, *args):
+        """
+        Return func(*args), sharing the result with any concurrent callers
+        that use the same key. Results are shared by reference, so callers
+        must not mutate them.
+        """
+        task = self.in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            # The computation runs as its own task so a caller that disconnects
+            # doesn't cancel it for the others waiting on the same key
+            task = asyncio.ensure_future(run_in_threadpool(func, *args))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda finished: self._finish(key, finished))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self):
+        """Counters for the /metrics endpoint"""
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight_keys": len(self.in_flight)
+        }
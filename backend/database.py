@@ -1,7 +1,22 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float
+import json
+import hashlib
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Index, event, insert, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.schema import CreateIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; seeding falls back to running unlocked
+    fcntl = None
 
 # Get database URL from environment variable or use SQLite for local development
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./test.db")
@@ -10,11 +25,110 @@ DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./test.db")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# Prebuilt SQLite snapshot (see prebuilt_db.py). When set it is used instead of DATABASE_URL:
+# opened read-only, immutable and memory-mapped, so every worker shares the same pages
+# through the OS page cache and nothing is created or seeded at startup.
+PREBUILT_DB_PATH = os.environ.get("PREBUILT_DB_PATH")
+PREBUILT_MMAP_BYTES = int(os.environ.get("PREBUILT_MMAP_MB", "1024")) * 1024 * 1024
+READ_ONLY = bool(PREBUILT_DB_PATH)
+
+# Pair-level data changes remembered for cache invalidation (see bump_data_version)
+DATA_CHANGE_HISTORY = 100
+
+# Arbitrary application-wide key for the PostgreSQL seeding advisory lock
+SEED_LOCK_ID = 726354001
+
+# Reference time for the relative review dates in the seed data ("a month ago").
+# Defaults to the time of seeding when the original scrape time isn't known.
+SEED_SCRAPED_AT = os.environ.get("SEED_SCRAPED_AT")
+
+# Bump when the way seed rows are derived changes so existing databases get reseeded
+SEED_FORMAT_VERSION = 5
+
+# Lock file used to serialise seeding on SQLite (all workers share one host)
+SEED_LOCK_FILE = os.environ.get(
+    "SEED_LOCK_FILE",
+    os.path.join(tempfile.gettempdir(), "neighbourhood-pro-finder-seed.lock")
+)
+
+# The engine is created on first use so importing this module stays cheap at cold start
+_engine = None
+_engine_lock = threading.Lock()
+
+# Session factory, bound to the engine when the engine is created
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+# Functions applied to every engine that serves the app, e.g. to add event listeners
+_engine_setup = []
+
+def get_engine():
+    """Return the SQLAlchemy engine, creating it on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if READ_ONLY:
+                    _engine = create_prebuilt_engine(PREBUILT_DB_PATH)
+                else:
+                    # SQLite connections may be used from different threadpool threads (e.g. streamed responses)
+                    connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+                    _engine = create_engine(DATABASE_URL, connect_args=connect_args)
+                    if _engine.dialect.name == "sqlite":
+                        event.listen(_engine, "connect", enable_foreign_keys)
+                configure_engine(_engine)
+                _session_factory.configure(bind=_engine)
+    return _engine
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def create_prebuilt_engine(path):
+    """
+    Engine for a prebuilt snapshot. immutable=1 tells SQLite the file never
+    changes, so it skips locking and change detection entirely; replace the
+    file and restart the workers to deploy new data.
+    """
+    url = f"sqlite:///file:{os.path.abspath(path)}?mode=ro&immutable=1&uri=true"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def set_mmap_size(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"PRAGMA mmap_size = {PREBUILT_MMAP_BYTES}")
+
+    return engine
+
+def add_engine_setup(setup):
+    """
+    Register setup(engine) for the app's engines: it is applied to the
+    current engine straight away and to every engine created after it.
+    """
+    _engine_setup.append(setup)
+    if _engine is not None:
+        setup(_engine)
+
+def configure_engine(engine):
+    """Apply the registered engine setup to a newly created engine"""
+    for setup in _engine_setup:
+        setup(engine)
+
+@compiles(CreateIndex, "sqlite")
+def create_index_sqlite(create, compiler, **kw):
+    # SQLite doesn't accept NULLS LAST in index definitions. It sorts NULLs lowest, so a DESC
+    # column already keeps them last, and ORDER BY ... DESC NULLS LAST still reads the index in order
+    return compiler.visit_create_index(create, **kw).replace(" NULLS LAST", "")
+
+def enable_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys unless asked per connection; without this a reseed, which
+    # reuses provider ids, would leave bookings pointing at a different provider instead of NULL
+    dbapi_connection.execute("PRAGMA foreign_keys = ON")
+
+def SessionLocal():
+    """Open a new database session"""
+    get_engine()
+    return _session_factory()
+
+def __getattr__(name):
+    # Keep `from database import engine` working without creating the engine at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Create base class for models
 Base = declarative_base()
@@ -24,6 +138,8 @@ class Provider(Base):
     __tablename__ = "providers"
     
     id = Column(Integer, primary_key=True, index=True)
+    # Stable identity across reseeds and ingests, see make_provider_key()
+    provider_key = Column(String, nullable=True, unique=True, index=True)
     name = Column(String, index=True)
     service_type = Column(String, index=True)
     neighborhood = Column(String, index=True)
@@ -50,10 +166,24 @@ class Provider(Base):
     # Reviews (stored as JSON strings)
     reviews = Column(String, nullable=True)
     
+    # Review activity, resolved from the relative review dates at ingest
+    scraped_at = Column(DateTime, nullable=True)
+    last_review_at = Column(DateTime, nullable=True, index=True)
+    review_velocity = Column(Float, nullable=True, index=True)
+    
+    # One index per /recommendations sort mode: the (service_type, neighborhood) equality
+    # prefix narrows the scan to one bucket, already in the ORDER BY of the sort mode
+    # (DESC NULLS LAST, see main.SORT_ORDERS), so the database never sorts the bucket
+    __table_args__ = (
+        Index("ix_providers_service_neighborhood_rating", service_type, neighborhood, rating.desc().nullslast()),
+        Index("ix_providers_service_neighborhood_reviews", service_type, neighborhood,
+              reviews_count.desc().nullslast(), rating.desc().nullslast()),
+        Index("ix_providers_service_neighborhood_last_review", service_type, neighborhood,
+              last_review_at.desc().nullslast(), rating.desc().nullslast()),
+    )
+    
     def to_dict(self):
         """Convert model instance to dictionary for API response"""
-        import json
-        
         # Parse reviews JSON if it exists
         reviews_data = []
         if self.reviews:
@@ -87,12 +217,182 @@ class Provider(Base):
             "email": self.email,
             "reviews_count": self.reviews_count,
             "review_distribution": review_distribution,
-            "reviews": reviews_data
+            "reviews": reviews_data,
+            "last_review_at": self.last_review_at.isoformat() if self.last_review_at else None,
+            "review_velocity": self.review_velocity
         }
 
+# Booking requests submitted through the booking form
+class Booking(Base):
+    __tablename__ = "bookings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # Set to NULL if the provider is removed by a reseed; provider_name keeps the booking readable
+    provider_id = Column(Integer, ForeignKey("providers.id", ondelete="SET NULL"), nullable=True, index=True)
+    provider_name = Column(String, nullable=True)
+    name = Column(String)
+    email = Column(String)
+    phone = Column(String)
+    preferred_date = Column(String)
+    preferred_time = Column(String)
+    message = Column(String, nullable=True)
+    created_at = Column(DateTime, index=True)
+    
+    provider = relationship("Provider")
+
+# Review-text features computed offline by review_features.py, one row per provider
+class ProviderFeature(Base):
+    __tablename__ = "provider_features"
+    
+    provider_id = Column(Integer, ForeignKey("providers.id", ondelete="CASCADE"), primary_key=True)
+    review_texts = Column(Integer, nullable=False, default=0)
+    # Lexicon sentiment from -1 (negative) to 1 (positive); NULL when no review has scorable text
+    sentiment = Column(Float, nullable=True, index=True)
+    mentions_emergency = Column(Boolean, nullable=False, default=False, index=True)
+    mentions_warranty = Column(Boolean, nullable=False, default=False, index=True)
+    mentions_same_day = Column(Boolean, nullable=False, default=False, index=True)
+    # Most frequent review terms as a JSON list of [term, count]
+    top_terms = Column(String, nullable=True)
+    computed_at = Column(DateTime, nullable=True)
+
+# Ledger of scrape files ingested by the watch mode, so each file is applied once
+class IngestedFile(Base):
+    __tablename__ = "ingest_ledger"
+    
+    id = Column(Integer, primary_key=True)
+    checksum = Column(String, unique=True, index=True)
+    path = Column(String)
+    size = Column(Integer)
+    records = Column(Integer)
+    inserted = Column(Integer)
+    updated = Column(Integer)
+    unchanged = Column(Integer)
+    seconds = Column(Float)
+    ingested_at = Column(DateTime)
+
+# Materialised provider statistics, maintained by the seed and ingestion paths.
+# An empty string in service_type or neighborhood means "all", so the table holds
+# per-pair rows, per-service and per-neighbourhood rollups and one overall total.
+class ProviderStat(Base):
+    __tablename__ = "provider_stats"
+    
+    service_type = Column(String, primary_key=True)
+    neighborhood = Column(String, primary_key=True)
+    provider_count = Column(Integer, nullable=False, default=0)
+    avg_rating = Column(Float, nullable=True)
+    total_reviews = Column(Integer, nullable=False, default=0)
+    # Running sums behind avg_rating, so a new review can adjust it without regrouping
+    rating_sum = Column(Float, nullable=True)
+    rated_count = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+# Key/value table recording the state of the loaded data (seed fingerprint, timestamps)
+class DataState(Base):
+    __tablename__ = "data_state"
+    
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=True)
+
+def get_state(db, key):
+    """Return the stored value for a data state key, or None if it is unset"""
+    state = db.get(DataState, key)
+    return state.value if state else None
+
+def set_state(db, key, value):
+    """Set a data state key (the caller is responsible for committing)"""
+    state = db.get(DataState, key)
+    if state:
+        state.value = value
+    else:
+        db.add(DataState(key=key, value=value))
+
+def bump_data_version(db, pairs=None):
+    """
+    Mark the provider data as changed so response caches drop what they hold.
+
+    With pairs, the change is recorded as touching only those
+    (service_type, neighborhood) pairs, so caches that were up to date can
+    drop just their entries (see get_data_changes).
+    """
+    previous = get_state(db, "data_version")
+    version = uuid.uuid4().hex
+    changes = []
+    if pairs is not None:
+        changes = json.loads(get_state(db, "data_changes") or "[]")
+        changes.append({"from": previous, "to": version, "pairs": sorted(list(pair) for pair in pairs)})
+        changes = changes[-DATA_CHANGE_HISTORY:]
+    set_state(db, "data_changes", json.dumps(changes) if changes else None)
+    set_state(db, "data_version", version)
+
+def publish_data_change(neighborhoods=None, pairs=None):
+    """
+    Publish provider changes that have already been committed.
+    
+    The partitions of the given neighbourhoods (all of them for None) are
+    rebuilt first and only then is a new data version committed. Workers
+    clear and re-warm their response caches as soon as they see the new
+    version, so bumping it any earlier would warm them from stale partitions.
+    
+    With pairs, only those (service_type, neighborhood) pairs changed: their
+    neighbourhoods' partitions are rebuilt and the version records them, so
+    workers drop just their cache entries.
+    """
+    # partitioning imports this module, so import it lazily
+    from partitioning import refresh_partitions
+    
+    if pairs is not None and neighborhoods is None:
+        neighborhoods = {neighborhood for _, neighborhood in pairs}
+    refresh_partitions(neighborhoods)
+    db = SessionLocal()
+    try:
+        bump_data_version(db, pairs)
+        db.commit()
+    finally:
+        db.close()
+
+def get_data_version():
+    """Current data version, or None while no data has been loaded"""
+    db = SessionLocal()
+    try:
+        # Databases seeded before data versions existed fall back to the seed time
+        return get_state(db, "data_version") or get_state(db, "seeded_at")
+    except SQLAlchemyError:
+        return None
+    finally:
+        db.close()
+
+def get_data_changes(since):
+    """
+    Return (current data version, pairs changed since the given version).
+
+    The pairs are None when they aren't known: a full reload happened since,
+    or the version is older than the recorded history. Both are read in one
+    query so they always describe the same version.
+    """
+    db = SessionLocal()
+    try:
+        states = dict(db.query(DataState.key, DataState.value).filter(
+            DataState.key.in_(["data_version", "seeded_at", "data_changes"])
+        ).all())
+    except SQLAlchemyError:
+        return None, None
+    finally:
+        db.close()
+    version = states.get("data_version") or states.get("seeded_at")
+    if since is None or version is None:
+        return version, None
+    pairs = set()
+    for change in json.loads(states.get("data_changes") or "[]"):
+        if change["from"] == since:
+            pairs.update(tuple(pair) for pair in change["pairs"])
+            since = change["to"]
+    return version, pairs if since == version else None
+
 # Function to get a database session
 def get_db():
-    db = SessionLocal()
+    from tracing import span
+    with span("session", "db"):
+        db = SessionLocal()
     try:
         yield db
     finally:
@@ -100,70 +400,151 @@ def get_db():
 
 # Create all tables in the database
 def create_tables():
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+
+def add_missing_columns(engine):
+    """
+    Add columns and indexes that were introduced after a table was created.
+    
+    create_all() only creates missing tables, so existing databases would
+    otherwise never pick up new nullable columns.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+
+@contextmanager
+def seed_lock(blocking=True):
+    """
+    Hold the cross-process seeding lock for the duration of the block.
+    
+    Uses a PostgreSQL advisory lock when running against PostgreSQL and an
+    flock()ed file otherwise. Yields True if the lock was acquired; with
+    blocking=False it yields False immediately when another process holds it.
+    """
+    engine = get_engine()
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            if blocking:
+                conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": SEED_LOCK_ID})
+                acquired = True
+            else:
+                acquired = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": SEED_LOCK_ID}).scalar()
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SEED_LOCK_ID})
+        return
+    
+    if fcntl is None:
+        print("File locking is not available on this platform, seeding without a lock")
+        yield True
+        return
+    
+    with open(SEED_LOCK_FILE, "a+") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            acquired = True
+        except BlockingIOError:
+            acquired = False
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def make_provider_key(name, service_type):
+    """Stable provider identity: service type plus the case- and whitespace-normalised name"""
+    return f"{service_type}:{' '.join((name or '').lower().split())}"
 
-# Import enhanced providers from the processed dataset.json file
-from enhanced_providers import enhanced_providers
+def is_invalid_neighborhood(neighborhood):
+    """Neighbourhood values produced by bad scrapes that should never be served"""
+    return neighborhood in ("unknown", "nightclub!")
+
+def dataset_fingerprint(providers):
+    """Stable hash of the seed data, used to skip reseeding unchanged data"""
+    payload = json.dumps([SEED_FORMAT_VERSION, SEED_SCRAPED_AT, providers], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 # Function to seed the database with sample data
-def seed_database():
+def seed_database(force=False):
+    """
+    Load the enhanced provider data into the providers table.
+    
+    The table is replaced in a single transaction so concurrent readers see
+    either the old or the new data, never an empty or partial table. Seeding
+    is skipped when the stored fingerprint matches the seed data, unless
+    force is True. Returns True if the table was (re)loaded.
+    """
+    # Import enhanced providers from the processed dataset.json file
+    from enhanced_providers import enhanced_providers
+    from review_dates import resolve_review_dates
+    from stats import refresh_stats
+    
     db = SessionLocal()
     try:
-        # Get existing service types
-        existing_service_types = set(row[0] for row in db.query(Provider.service_type).distinct().all())
-        
-        # Check if we need to add new service types
-        new_service_types = set(provider["service_type"] for provider in enhanced_providers)
-        missing_service_types = new_service_types - existing_service_types
-        
-        # Get existing neighborhoods
-        existing_neighborhoods = set(row[0] for row in db.query(Provider.neighborhood).distinct().all())
-        new_neighborhoods = set(provider["neighborhood"] for provider in enhanced_providers)
-        missing_neighborhoods = new_neighborhoods - existing_neighborhoods
+        fingerprint = dataset_fingerprint(enhanced_providers)
+        if not force and get_state(db, "seed_fingerprint") == fingerprint and db.query(Provider.id).first():
+            print("Database already contains the current seed data, skipping seed")
+            return False
         
-        # Force database refresh if we're using enhanced providers
-        force_refresh = True
+        # Exclude providers with 'unknown' or invalid neighborhoods and duplicate provider keys
+        scraped_at = datetime.fromisoformat(SEED_SCRAPED_AT) if SEED_SCRAPED_AT else datetime.utcnow().replace(microsecond=0)
+        rows = []
+        seen = set()
+        for provider_data in enhanced_providers:
+            key = make_provider_key(provider_data["name"], provider_data["service_type"])
+            if is_invalid_neighborhood(provider_data["neighborhood"]) or key in seen:
+                continue
+            seen.add(key)
+            # Resolve relative review dates once here rather than on every request
+            rows.append({
+                **provider_data,
+                **resolve_review_dates(provider_data.get("reviews"), scraped_at),
+                "provider_key": key
+            })
         
-        if force_refresh or missing_service_types or missing_neighborhoods or db.query(Provider).count() == 0:
-            # If we're forcing a refresh or have new data
-            if force_refresh:
-                print("Forcing database refresh with enhanced provider data...")
-                # Clear existing providers
-                db.query(Provider).delete()
-                db.commit()
-            else:
-                # Remove any providers with 'unknown' or invalid neighborhoods
-                unknown_count = db.query(Provider).filter(Provider.neighborhood.in_(["unknown", "nightclub!"])).delete()
-                if unknown_count > 0:
-                    print(f"Removed {unknown_count} existing providers with 'unknown' or invalid neighborhoods")
-                    db.commit()
-            
-            if missing_service_types:
-                print(f"Adding providers for new service types: {', '.join(missing_service_types)}")
-            
-            if missing_neighborhoods:
-                print(f"Adding providers for new neighborhoods: {', '.join(missing_neighborhoods)}")
-            
-            # Add enhanced providers (excluding those with 'unknown' or invalid neighborhoods)
-            filtered_providers = [p for p in enhanced_providers if p["neighborhood"] != "unknown" and p["neighborhood"] != "nightclub!"]
-            print(f"Adding {len(filtered_providers)} enhanced providers from dataset (excluded {len(enhanced_providers) - len(filtered_providers)} with unknown or invalid neighborhoods)...")
-            for provider_data in filtered_providers:
-                # Check if this exact provider already exists
-                existing = db.query(Provider).filter(
-                    Provider.name == provider_data["name"],
-                    Provider.service_type == provider_data["service_type"]
-                ).first()
-                
-                if not existing:
-                    provider = Provider(**provider_data)
-                    db.add(provider)
-            
-            db.commit()
-            print(f"Database seeding completed successfully")
-        else:
-            print("Database already contains all service types and neighborhoods, skipping seed")
+        print(f"Replacing providers with {len(rows)} enhanced providers from dataset (excluded {len(enhanced_providers) - len(rows)} invalid or duplicate entries)...")
+        # Provider ids are reassigned, so features computed for the old rows no longer apply
+        db.query(ProviderFeature).delete()
+        db.query(Provider).delete()
+        if rows:
+            db.execute(insert(Provider), rows)
+        refresh_stats(db)
+        set_state(db, "seed_fingerprint", fingerprint)
+        set_state(db, "seeded_at", datetime.utcnow().isoformat())
+        db.commit()
+        publish_data_change()
+        print("Database seeding completed successfully")
+        return True
     except Exception as e:
         print(f"Error seeding database: {e}")
         db.rollback()
+        raise
+    finally:
+        db.close()
+
+def is_data_ready():
+    """Return True once the seed data has been loaded into the database"""
+    db = SessionLocal()
+    try:
+        return get_state(db, "seeded_at") is not None
+    except SQLAlchemyError:
+        # Tables may not exist yet while the first process is still starting up
+        return False
     finally:
         db.close()
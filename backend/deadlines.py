@@ -0,0 +1,170 @@
+"""
+Per-request deadlines.
+
+Every request gets a deadline (REQUEST_DEADLINE_SECONDS, overridable per
+path prefix with ENDPOINT_DEADLINES="/recommendations=2,/stats=5"; 0 means
+no deadline). When it passes, the request is answered with a 504 straight
+away, and any database work it started is interrupted rather than left
+holding a worker thread and a pool connection:
+
+- PostgreSQL: each transaction starts with SET LOCAL statement_timeout
+  set to the time remaining.
+- SQLite: a progress handler aborts the running statement once the
+  deadline has passed, and busy_timeout is capped at the time remaining
+  when the connection is checked out, so a database locked by a reseed
+  can't stall the request either. The connection's own busy_timeout is
+  restored when it goes back to the pool, so background work that reuses
+  it (seeding, the booking flusher) keeps waiting for locks as before.
+
+The listeners are added to the app's engines only (database.add_engine_setup),
+never to every SQLAlchemy engine in the process.
+"""
+import asyncio
+import contextvars
+import os
+import time
+
+from fastapi.responses import JSONResponse
+
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "10"))
+
+# Health checks, metrics, streamed exports and admin uploads (committed batch by batch) never time out
+DEFAULT_ENDPOINT_DEADLINES = "/ping=0,/ready=0,/metrics=0,/export=0,/admin=0"
+
+# SQLite virtual machine instructions between deadline checks
+PROGRESS_HANDLER_INTERVAL = 1000
+
+# Monotonic deadline of the request being handled; copied into threadpool threads
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+def parse_endpoint_deadlines(value):
+    """Parse "prefix=seconds,..." into (prefix, seconds) pairs, longest prefix first"""
+    deadlines = {}
+    for item in value.split(","):
+        if "=" in item:
+            prefix, seconds = item.split("=", 1)
+            deadlines[prefix.strip()] = float(seconds)
+    return sorted(deadlines.items(), key=lambda item: len(item[0]), reverse=True)
+
+ENDPOINT_DEADLINES = parse_endpoint_deadlines(
+    DEFAULT_ENDPOINT_DEADLINES + "," + os.environ.get("ENDPOINT_DEADLINES", "")
+)
+
+def deadline_for(path):
+    """Deadline in seconds for a request path (0 for none)"""
+    for prefix, seconds in ENDPOINT_DEADLINES:
+        if path.startswith(prefix):
+            return seconds
+    return REQUEST_DEADLINE_SECONDS
+
+def remaining_ms():
+    """Milliseconds left before the current request's deadline, or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(1, int((deadline - time.monotonic()) * 1000))
+
+def deadline_passed():
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+class DeadlineStats:
+    def __init__(self):
+        self.timeouts = {}
+        self.statements_interrupted = 0
+
+    def snapshot(self):
+        return {
+            "default_seconds": REQUEST_DEADLINE_SECONDS,
+            "timeouts": dict(self.timeouts),
+            "statements_interrupted": self.statements_interrupted
+        }
+
+deadline_stats = DeadlineStats()
+
+def _progress_handler():
+    # Runs inside SQLite, in whichever thread is executing the statement
+    if deadline_passed():
+        deadline_stats.statements_interrupted += 1
+        return 1
+    return 0
+
+def install_statement_timeouts(engine):
+    """Apply the current request's deadline to the SQL run on engine (see database.add_engine_setup)"""
+    from sqlalchemy import event
+
+    if engine.dialect.name == "postgresql":
+        @event.listens_for(engine, "begin")
+        def on_begin(conn):
+            timeout_ms = remaining_ms()
+            if timeout_ms is not None:
+                # Lasts until the end of the transaction, which the session ends when it closes
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+    elif engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            dbapi_connection.set_progress_handler(_progress_handler, PROGRESS_HANDLER_INTERVAL)
+            connection_record.info["busy_timeout"] = dbapi_connection.execute("PRAGMA busy_timeout").fetchone()[0]
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            timeout_ms = remaining_ms()
+            if timeout_ms is not None:
+                if "busy_timeout" not in connection_record.info:
+                    # Opened before the listeners were installed
+                    connection_record.info["busy_timeout"] = dbapi_connection.execute("PRAGMA busy_timeout").fetchone()[0]
+                dbapi_connection.execute(f"PRAGMA busy_timeout = {timeout_ms}")
+                connection_record.info["busy_timeout_capped"] = True
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            # Undo a request's capped busy_timeout before anything else checks the connection out
+            if dbapi_connection is not None and connection_record.info.pop("busy_timeout_capped", False):
+                dbapi_connection.execute(f"PRAGMA busy_timeout = {connection_record.info['busy_timeout']}")
+
+class DeadlineMiddleware:
+    """ASGI middleware that answers 504 once a request's deadline has passed"""
+
+    def __init__(self, app, stats=deadline_stats):
+        self.app = app
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = deadline_for(scope["path"])
+        if seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        token = _deadline.set(time.monotonic() + seconds)
+        started = False
+
+        async def send_tracking_start(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await asyncio.wait_for(self.app(scope, receive, send_tracking_start), timeout=seconds)
+        except asyncio.TimeoutError:
+            await self._timed_out(scope, receive, send, started)
+        except Exception:
+            # A statement interrupted by the deadline surfaces as a database error
+            if not deadline_passed():
+                raise
+            await self._timed_out(scope, receive, send, started)
+        finally:
+            _deadline.reset(token)
+
+    async def _timed_out(self, scope, receive, send, started):
+        path = scope["path"]
+        self.stats.timeouts[path] = self.stats.timeouts.get(path, 0) + 1
+        if started:
+            # Too late to change the status; the client sees a truncated response
+            return
+        response = JSONResponse(status_code=504, content={"detail": "Request timed out"})
+        await response(scope, receive, send)
@@ -0,0 +1,68 @@
+"""
+Streaming bulk export of the provider directory.
+
+Rows are read with a server-side cursor (yield_per) and written out in
+chunks as NDJSON or CSV, optionally gzip-compressed on the fly, so memory
+use stays flat for any table size and the first bytes go out as soon as
+the first batch has been read.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+
+from database import Provider, SessionLocal
+
+# Rows fetched per round trip and written per response chunk
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "500"))
+
+# Columns written to CSV exports (NDJSON rows contain the full provider including reviews)
+CSV_COLUMNS = [
+    "id", "name", "service_type", "neighborhood", "contact", "rating", "address", "street",
+    "city", "postal_code", "website", "full_phone", "email", "reviews_count",
+    "one_star", "two_star", "three_star", "four_star", "five_star", "last_review_at", "review_velocity"
+]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def iter_provider_export(file_format):
+    """Yield the providers table as encoded NDJSON or CSV chunks, one chunk per batch"""
+    db = SessionLocal()
+    try:
+        query = db.query(Provider).order_by(Provider.id).yield_per(EXPORT_BATCH_SIZE)
+
+        buffer = io.StringIO()
+        writer = None
+        if file_format == "csv":
+            writer = csv.writer(buffer)
+            writer.writerow(CSV_COLUMNS)
+
+        rows = 0
+        for provider in query:
+            if writer is not None:
+                values = [getattr(provider, column) for column in CSV_COLUMNS]
+                writer.writerow(["" if value is None else value for value in values])
+            else:
+                buffer.write(json.dumps(provider.to_dict()))
+                buffer.write("\n")
+            rows += 1
+
+            if rows % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    finally:
+        db.close()
+
+def gzip_chunks(chunks):
+    """Gzip-compress a chunk stream, flushing after each chunk so clients receive data promptly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
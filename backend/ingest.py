@@ -0,0 +1,58 @@
+"""
+Incremental provider upserts for the ingestion scripts.
+
+Rows are matched to existing providers by provider_key, so re-ingesting a
+scrape only writes providers that are new or whose fields changed.
+"""
+from database import Provider, is_invalid_neighborhood, make_provider_key
+
+# Keys per IN (...) lookup when loading existing providers
+LOOKUP_CHUNK_SIZE = 500
+
+def upsert_providers(db, rows):
+    """
+    Insert new providers and update changed ones (by provider_key).
+
+    Only the fields present in each row are compared and written. Runs in
+    the caller's transaction. Returns a dict with inserted, updated,
+    unchanged and skipped counts, and the (service_type, neighborhood)
+    pairs that were touched.
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+    touched = set()
+
+    # Last row wins if a file lists the same provider twice
+    by_key = {}
+    for row in rows:
+        if row.get("name") and not is_invalid_neighborhood(row.get("neighborhood")):
+            by_key[make_provider_key(row["name"], row["service_type"])] = row
+    counts["skipped"] = len(rows) - len(by_key)
+
+    keys = list(by_key)
+    existing = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        for provider in db.query(Provider).filter(Provider.provider_key.in_(chunk)):
+            existing[provider.provider_key] = provider
+
+    for key, row in by_key.items():
+        provider = existing.get(key)
+        if provider is None:
+            db.add(Provider(**row, provider_key=key))
+            counts["inserted"] += 1
+            touched.add((row["service_type"], row["neighborhood"]))
+            continue
+
+        changes = {field: value for field, value in row.items() if getattr(provider, field) != value}
+        if not changes:
+            counts["unchanged"] += 1
+            continue
+        # A provider moving neighbourhood changes the stats of both buckets
+        touched.add((provider.service_type, provider.neighborhood))
+        for field, value in changes.items():
+            setattr(provider, field, value)
+        touched.add((provider.service_type, provider.neighborhood))
+        counts["updated"] += 1
+
+    counts["touched"] = touched
+    return counts
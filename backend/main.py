@@ -1,16 +1,63 @@
 import os
-from fastapi import FastAPI, Query, HTTPException, Depends
+import hmac
+import heapq
+import itertools
+import threading
+import asyncio
+from fastapi import FastAPI, Query, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from typing import List, Dict, Optional
+from pydantic import BaseModel, Field
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 # Import database models and functions
-from database import Provider, get_db, create_tables, seed_database
+from admission import AdmissionController, AdmissionControlMiddleware
+from bookings import BookingQueue, QueueFull
+from coalesce import SingleFlight
+from deadlines import DeadlineMiddleware, deadline_stats, install_statement_timeouts
+from bulk_upsert import BATCH_SIZE, LineTooLong, iter_lines, parse_record, uses_partitioned_table, write_batch
+from database import (READ_ONLY, Provider, ProviderFeature, SessionLocal, add_engine_setup, get_data_changes, get_db,
+                      is_data_ready, publish_data_change)
+from export import MEDIA_TYPES, gzip_chunks, iter_provider_export
+from partitioning import session_for_neighborhood
+from query_normalizer import QueryNormalizer
+from response_cache import create_response_cache, warm_cache
+from reviews import ReviewChanges, add_review
+from seed import run_seed
+from stats import list_pairs, read_stats
+from tracing import TracingMiddleware, install_sql_tracing, span, trace_writer, tracing_enabled, tracing_snapshot
+
+# Seed in the background on startup unless seeding is run as a separate step (python seed.py)
+SEED_ON_STARTUP = os.environ.get("SEED_ON_STARTUP", "1") == "1"
+
+# Precompute /recommendations for every (service, neighbourhood) pair once data is loaded,
+# stopping after WARM_TIME_BUDGET seconds or WARM_MEMORY_BUDGET_MB of cached responses
+WARM_CACHE = os.environ.get("WARM_CACHE", "1") == "1"
+WARM_TIME_BUDGET = float(os.environ.get("WARM_TIME_BUDGET", "30"))
+WARM_MEMORY_BUDGET_MB = float(os.environ.get("WARM_MEMORY_BUDGET_MB", "32"))
+
+# How often to check whether a reseed or ingest has changed the data behind cached responses
+CACHE_VERSION_CHECK_SECONDS = float(os.environ.get("CACHE_VERSION_CHECK_SECONDS", "5"))
+
+# Bearer token for the /admin endpoints; they are disabled when it is not set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
 
 # Initialize FastAPI app
 app = FastAPI(title="Neighbourhood Pro Finder API")
 
+# Per-request deadlines (REQUEST_DEADLINE_SECONDS, ENDPOINT_DEADLINES). Innermost, so only
+# admitted requests count against the deadline, and 504s still carry CORS headers.
+add_engine_setup(install_statement_timeouts)
+app.add_middleware(DeadlineMiddleware)
+
+# Per-client rate limiting and in-flight cap for this worker. Added before CORS so
+# rejections still carry CORS headers and browsers can read the Retry-After.
+admission = AdmissionController()
+app.add_middleware(AdmissionControlMiddleware, controller=admission)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +67,11 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Sampled per-request tracing (TRACE_SAMPLE_RATE); added last so the request span covers everything
+if tracing_enabled():
+    install_sql_tracing()
+    app.add_middleware(TracingMiddleware)
+
 # Provider response model
 class ProviderResponse(Dict):
     pass
@@ -27,13 +79,111 @@ class ProviderResponse(Dict):
 class RecommendationsResponse(Dict):
     pass
 
-# Startup event to create tables and seed database
+# Review submitted for a provider
+class ReviewRequest(BaseModel):
+    rating: int = Field(..., ge=1, le=5)
+    text: Optional[str] = Field(None, max_length=5000)
+    reviewer: Optional[str] = Field(None, max_length=200)
+
+# Booking request body, matching the fields of the frontend booking form
+class BookingRequest(BaseModel):
+    provider_id: int
+    name: str = Field(..., min_length=1, max_length=200)
+    email: str = Field(..., min_length=3, max_length=320)
+    phone: str = Field(..., min_length=1, max_length=50)
+    date: str = Field(..., max_length=20)
+    time: str = Field(..., max_length=20)
+    message: Optional[str] = Field(None, max_length=5000)
+
+# Set once the data is known to be loaded so /ready stops querying the database
+data_ready = False
+
+def seed_in_background():
+    try:
+        if run_seed(blocking=False):
+            print("Database initialization complete")
+    except Exception as e:
+        print(f"Background seeding failed: {e}")
+
+# Bookings are written in batches by a background task
+booking_queue = BookingQueue()
+
+# Pairs changed by reviews, published to the other workers once per interval
+review_changes = ReviewChanges()
+
+# Maps search terms to canonical service types and neighbourhoods, rebuilt when the data changes
+query_normalizer = QueryNormalizer()
+
+# Ranked /recommendations and /options responses, dropped whenever the data version changes.
+# Per worker by default; RESPONSE_CACHE_BACKEND=sqlite or shm shares one cache between workers.
+response_cache = create_response_cache()
+cache_state = {"data_version": None, "warmup": None}
+version_watcher = None
+
+async def cache_call(method, *args):
+    """Call a response cache method from the event loop, in the threadpool if the backend blocks (shared caches)"""
+    if response_cache.blocking:
+        return await run_in_threadpool(method, *args)
+    return method(*args)
+
+def warm_in_background():
+    """Cache the default ranking of every (service, neighbourhood) pair, largest first"""
+    try:
+        db = SessionLocal()
+        try:
+            pairs = list_pairs(db)
+        finally:
+            db.close()
+        keys = [(service_type, neighborhood, "rating", None, None, None, None, None) for service_type, neighborhood in pairs]
+        report = warm_cache(response_cache, find_recommendations, keys, WARM_TIME_BUDGET, WARM_MEMORY_BUDGET_MB * 1024 * 1024)
+        cache_state["warmup"] = report
+        print(f"Warmed {report['warmed']} of {report['keys']} recommendation lists in {report['seconds']}s ({report['stopped_by']})")
+    except Exception as e:
+        print(f"Cache warm-up failed: {e}")
+
+async def watch_data_version():
+    """
+    Refresh the query normaliser and the response cache when the data changes.
+    
+    If only known (service_type, neighborhood) pairs changed since the cached
+    version (admin upserts), just their entries are dropped; otherwise the
+    whole cache is cleared and warmed again.
+    """
+    while True:
+        try:
+            version, changed_pairs = await run_in_threadpool(get_data_changes, cache_state["data_version"])
+            if version is not None and version != cache_state["data_version"]:
+                await run_in_threadpool(query_normalizer.refresh)
+                cache_state["data_version"] = version
+                await cache_call(response_cache.set_version, version, changed_pairs)
+                if changed_pairs is None:
+                    if WARM_CACHE:
+                        # Warm in a thread so /ping and other requests are served meanwhile
+                        threading.Thread(target=warm_in_background, daemon=True).start()
+        except Exception as e:
+            print(f"Data version check failed: {e}")
+        await asyncio.sleep(CACHE_VERSION_CHECK_SECONDS)
+
+# Startup event to seed the database without blocking the worker from serving
 @app.on_event("startup")
 async def startup_event():
+    global version_watcher
     print("Starting up the FastAPI application...")
-    create_tables()
-    seed_database()
-    print("Database initialization complete")
+    booking_queue.start()
+    review_changes.start()
+    version_watcher = asyncio.create_task(watch_data_version())
+    if SEED_ON_STARTUP and not READ_ONLY:
+        # Only the worker that wins the seeding lock does any work; the others skip it
+        threading.Thread(target=seed_in_background, daemon=True).start()
+
+# Shutdown event to write out bookings and traces that are still queued and publish pending reviews
+@app.on_event("shutdown")
+async def shutdown_event():
+    if version_watcher is not None:
+        version_watcher.cancel()
+    await booking_queue.stop()
+    await review_changes.stop()
+    await run_in_threadpool(trace_writer.stop)
 
 # Root endpoint to provide API documentation
 @app.get("/", response_class=HTMLResponse)
@@ -93,15 +243,75 @@ async def root():
                 <p>Example: <code>/ping</code></p>
             </div>
             
+            <div class="endpoint">
+                <p><span class="method">GET</span> <code>/ready</code></p>
+                <p>Readiness check that returns 503 until provider data has been loaded.</p>
+                <p>Example: <code>/ready</code></p>
+            </div>
+            
+            <div class="endpoint">
+                <p><span class="method">GET</span> <code>/metrics</code></p>
+                <p>Request counters for the worker that serves the request, including rate-limited and shed requests, response cache hits, the startup cache warm-up and requests that timed out (504) per endpoint.</p>
+                <p>Example: <code>/metrics</code></p>
+            </div>
+            
+            <div class="endpoint">
+                <p><span class="method">GET</span> <code>/stats</code></p>
+                <p>Provider counts, average rating and total reviews per service type and neighbourhood.</p>
+                <p>Example: <code>/stats</code></p>
+            </div>
+            
             <div class="endpoint">
                 <p><span class="method">GET</span> <code>/recommendations</code></p>
                 <p>Get service provider recommendations based on service type and neighborhood.</p>
                 <p>Required query parameters:</p>
                 <ul>
                     <li><code>service_type</code>: The type of service needed (e.g., plumber, electrician)</li>
-                    <li><code>neighborhood</code>: The neighborhood to search in</li>
                 </ul>
+                <p>Optional query parameters:</p>
+                <ul>
+                    <li><code>neighborhood</code>: The neighborhood to search in. Repeat it or separate names with commas to search several, or leave it out to find the best providers anywhere</li>
+                    <li><code>sort</code>: <code>rating</code> (default), <code>reviews_count</code>, <code>recent_activity</code> or <code>sentiment</code></li>
+                    <li><code>min_rating</code>, <code>min_reviews</code>: minimum rating and review count</li>
+                    <li><code>has_website</code>, <code>has_phone</code>: <code>true</code> or <code>false</code></li>
+                    <li><code>mentions</code>: <code>emergency</code>, <code>warranty</code> or <code>same_day</code> to only include providers whose reviews mention it</li>
+                    <li><code>limit</code>, <code>offset</code>: return one page of the ranking; <code>has_more</code> in the response says whether more follow</li>
+                </ul>
+                <p>Search terms are matched to canonical values (e.g. <code>plumbing</code> matches <code>plumber</code>); the response's <code>canonical</code> field shows the values used.</p>
                 <p>Example: <code>/recommendations?service_type=plumber&neighborhood=downtown</code></p>
+                <p>Example: <code>/recommendations?service_type=electrician&limit=10&offset=10</code></p>
+            </div>
+            
+            <div class="endpoint">
+                <p><span class="method">GET</span> <code>/export/providers</code></p>
+                <p>Stream the full provider directory. Optional <code>format</code>: <code>ndjson</code> (default) or <code>csv</code>. Gzip-compressed when requested with <code>Accept-Encoding: gzip</code>.</p>
+                <p>Example: <code>/export/providers?format=csv</code></p>
+            </div>
+            
+            <div class="endpoint">
+                <p><span class="method">GET</span> <code>/providers/{id}/similar</code></p>
+                <p>Providers most similar to the given provider, by name, service type and review text.</p>
+                <p>Optional query parameters:</p>
+                <ul>
+                    <li><code>k</code>: number of similar providers to return (default 5)</li>
+                    <li><code>same_service_type</code>: <code>true</code> to only return providers of the same service type</li>
+                </ul>
+                <p>Example: <code>/providers/1/similar?k=3&same_service_type=true</code></p>
+            </div>
+            
+            <div class="endpoint">
+                <p><span class="method">POST</span> <code>/providers/{id}/reviews</code></p>
+                <p>Add a review to a provider (JSON body with <code>rating</code> from 1 to 5 and optional <code>text</code> and <code>reviewer</code>). Returns the provider's new rating and review count.</p>
+            </div>
+            
+            <div class="endpoint">
+                <p><span class="method">POST</span> <code>/admin/providers:bulkUpsert</code></p>
+                <p>Insert or update providers from an NDJSON body (one provider per line with at least <code>name</code>, <code>service_type</code> and <code>neighborhood</code>), matched on service type and name. Requires <code>Authorization: Bearer</code> with the <code>ADMIN_TOKEN</code>; returns a result per line.</p>
+            </div>
+            
+            <div class="endpoint">
+                <p><span class="method">POST</span> <code>/bookings</code></p>
+                <p>Submit a booking request for a provider (JSON body with <code>provider_id</code>, <code>name</code>, <code>email</code>, <code>phone</code>, <code>date</code>, <code>time</code> and optional <code>message</code>). Returns 503 when serving a prebuilt read-only database.</p>
             </div>
             
             <h2>API Documentation</h2>
@@ -123,66 +333,177 @@ async def ping():
     """
     return {"status": "ok"}
 
-# Get available service types and neighbourhoods endpoint
-@app.get("/options")
-async def get_options(db: Session = Depends(get_db)):
+# Metrics endpoint
+@app.get("/metrics")
+async def metrics():
     """
-    Get available service types and neighbourhoods from the database.
-    
-    Returns:
-    - A list of unique service types and neighbourhoods
+    Counters for this worker: admitted and rejected requests, the current
+    number of requests in flight, coalesced /recommendations queries, the
+    response cache (including the last warm-up), the booking write queue and
+    requests that ran past their deadline.
     """
-    # Query unique service types
-    service_types = db.query(Provider.service_type).distinct().all()
-    service_types = [item[0] for item in service_types]
-    
-    # Query unique neighbourhoods
-    neighbourhoods = db.query(Provider.neighborhood).distinct().all()
-    neighbourhoods = [item[0] for item in neighbourhoods]
+    return {
+        "admission": admission.snapshot(),
+        "coalescing": recommendation_flights.snapshot(),
+        "cache": {**await cache_call(response_cache.snapshot), **cache_state},
+        "bookings": booking_queue.snapshot(),
+        "reviews": review_changes.snapshot(),
+        "tracing": tracing_snapshot(),
+        "deadlines": deadline_stats.snapshot()
+    }
+
+# Readiness endpoint for load balancers and deploy checks
+@app.get("/ready")
+def ready():
+    """
+    Readiness check that reports whether provider data has been loaded.
+    Returns 503 while the database is still being seeded.
+    """
+    global data_ready
+    if not data_ready:
+        data_ready = is_data_ready()
+    if not data_ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+# Cache key of the /options response. It belongs to no (service, neighbourhood) pair,
+# so any data change drops it.
+OPTIONS_KEY = ("options",)
+
+def find_options():
+    """The distinct service types and neighbourhoods in the providers table"""
+    db = SessionLocal()
+    try:
+        # Query unique service types
+        service_types = db.query(Provider.service_type).distinct().all()
+        service_types = [item[0] for item in service_types]
+        
+        # Query unique neighbourhoods
+        neighbourhoods = db.query(Provider.neighborhood).distinct().all()
+        neighbourhoods = [item[0] for item in neighbourhoods]
+    finally:
+        db.close()
     
-    # Return formatted response
     return {
         "service_types": sorted(service_types),
         "neighbourhoods": sorted(neighbourhoods)
     }
 
-# Recommendations endpoint
-@app.get("/recommendations")
-async def get_recommendations(
-    service_type: str = Query(..., description="Type of service needed"),
-    neighborhood: str = Query(..., description="Neighbourhood to search in"),
-    db: Session = Depends(get_db)
-):
+def cached_options():
+    """find_options, storing the result in the response cache"""
+    generation = response_cache.generation
+    options = find_options()
+    response_cache.put(OPTIONS_KEY, options, generation)
+    return options
+
+# Get available service types and neighbourhoods endpoint
+@app.get("/options")
+async def get_options():
     """
-    Get service provider recommendations based on service type and neighbourhood.
-    
-    Parameters:
-    - service_type: The type of service needed (e.g., plumber, electrician)
-    - neighborhood: The neighbourhood to search in
+    Get available service types and neighbourhoods from the database.
     
     Returns:
-    - A list of recommended service providers, sorted by rating (highest first)
+    - A list of unique service types and neighbourhoods
     """
-    # Normalize inputs to lowercase for case-insensitive matching
-    service_type_lower = service_type.lower()
-    neighborhood_lower = neighborhood.lower()
+    options = await cache_call(response_cache.get, OPTIONS_KEY)
+    if options is None:
+        options = await run_in_threadpool(cached_options)
+    return options
+
+# Provider coverage statistics endpoint
+@app.get("/stats")
+def get_stats(db: Session = Depends(get_db)):
+    """
+    Get provider counts, average rating and total reviews per service type,
+    per neighbourhood and per (service type, neighbourhood) pair.
     
-    # Query the database for matching providers and sort by rating (highest first)
-    providers = db.query(Provider).filter(
-        Provider.service_type == service_type_lower,
-        Provider.neighborhood == neighborhood_lower
-    ).order_by(Provider.rating.desc()).all()
+    Served from the materialised provider_stats table, so this never scans
+    the providers table.
+    """
+    return read_stats(db)
+
+# Identical concurrent /recommendations queries share one database query
+recommendation_flights = SingleFlight()
+
+# ORDER BY clauses for each /recommendations sort mode. Unrated providers always come
+# last; the matching indexes on the providers table are declared in the same order.
+SORT_ORDERS = {
+    "rating": (Provider.rating.desc().nullslast(),),
+    "reviews_count": (Provider.reviews_count.desc().nullslast(), Provider.rating.desc().nullslast()),
+    "recent_activity": (Provider.last_review_at.desc().nullslast(), Provider.rating.desc().nullslast()),
+    "sentiment": (ProviderFeature.sentiment.desc().nullslast(), Provider.rating.desc().nullslast())
+}
+
+# Review-text features that /recommendations can filter on (see review_features.py)
+MENTION_COLUMNS = {
+    "emergency": ProviderFeature.mentions_emergency,
+    "warranty": ProviderFeature.mentions_warranty,
+    "same_day": ProviderFeature.mentions_same_day
+}
+
+def find_recommendations(service_type, neighborhood, sort, min_rating=None, min_reviews=None,
+                         has_website=None, has_phone=None, mentions=None):
+    """
+    Query and rank the providers for a normalised set of search options.
     
-    # Convert provider objects to dictionaries for the response
-    provider_dicts = [provider.to_dict() for provider in providers]
+    Runs in the threadpool with its own session because the result is shared
+    by every request coalesced onto the same options.
+    """
+    filters = [
+        Provider.service_type == service_type,
+        Provider.neighborhood == neighborhood
+    ]
+    if min_rating is not None:
+        filters.append(Provider.rating >= min_rating)
+    if min_reviews is not None:
+        filters.append(Provider.reviews_count >= min_reviews)
+    if has_website is not None:
+        website_present = (Provider.website.isnot(None)) & (Provider.website != "")
+        filters.append(website_present if has_website else ~website_present)
+    if has_phone is not None:
+        phone_present = (Provider.full_phone.isnot(None)) & (Provider.full_phone != "")
+        filters.append(phone_present if has_phone else ~phone_present)
+    if mentions is not None:
+        filters.append(MENTION_COLUMNS[mentions].is_(True))
+    
+    # Review features live in a side table in the main database only, so queries using
+    # them join it there; everything else is routed to the neighbourhood's partition
+    uses_features = mentions is not None or sort == "sentiment"
+    with span("session", "db"):
+        db = SessionLocal() if uses_features else session_for_neighborhood(neighborhood)
+        db.connection()
+    try:
+        # Query the database for matching providers
+        with span("query", "db", sort=sort):
+            # The sentiment score is returned with each provider when ranking by it
+            query = db.query(Provider, ProviderFeature.sentiment) if sort == "sentiment" else db.query(Provider)
+            if uses_features:
+                query = query.outerjoin(ProviderFeature, ProviderFeature.provider_id == Provider.id)
+            providers = query.filter(*filters).order_by(*SORT_ORDERS[sort]).all()
+        
+        # Convert provider objects to dictionaries for the response
+        with span("to_dict", rows=len(providers)):
+            if sort == "sentiment":
+                provider_dicts = [{**provider.to_dict(), "sentiment": sentiment} for provider, sentiment in providers]
+            else:
+                provider_dicts = [provider.to_dict() for provider in providers]
+    finally:
+        db.close()
     
     # Add AI-powered ranking explanation
-    for i, provider in enumerate(provider_dicts):
+    with span("rank"):
+        annotate_ranking(provider_dicts)
+    
+    return provider_dicts
+
+def annotate_ranking(provider_dicts, start=1):
+    """Add the rank position (counting from start) and recommendation strength to each provider"""
+    for i, provider in enumerate(provider_dicts, start):
         # Add rank position
-        provider["rank"] = i + 1
+        provider["rank"] = i
         
         # Add recommendation strength based on rating
-        rating = provider.get("rating", 0)
+        rating = provider.get("rating") or 0
         if rating >= 4.8:
             provider["recommendation_strength"] = "Highly Recommended"
         elif rating >= 4.5:
@@ -192,7 +513,304 @@ async def get_recommendations(
         else:
             provider["recommendation_strength"] = "Somewhat Recommended"
     
-    return {"providers": provider_dicts}
+    return provider_dicts
+
+def cached_recommendations(*key):
+    """find_recommendations, storing the result in the response cache"""
+    generation = response_cache.generation
+    provider_dicts = find_recommendations(*key)
+    response_cache.put(key, provider_dicts, generation)
+    return provider_dicts
+
+async def ranked_providers(key):
+    """The ranked providers for one neighbourhood's search options, from the cache or the database"""
+    provider_dicts = await cache_call(response_cache.get, key)
+    if provider_dicts is None:
+        with span("recommendations", cached=False, neighborhood=key[1]):
+            provider_dicts = await recommendation_flights.do(key, cached_recommendations, *key)
+    return provider_dicts
+
+def _nulls_last(value):
+    return (value is not None, value if value is not None else 0)
+
+# Merge keys matching SORT_ORDERS, for combining per-neighbourhood lists in descending order
+MERGE_KEYS = {
+    "rating": lambda p: _nulls_last(p["rating"]),
+    "reviews_count": lambda p: (_nulls_last(p["reviews_count"]), _nulls_last(p["rating"])),
+    # ISO timestamps compare in time order
+    "recent_activity": lambda p: (p["last_review_at"] is not None, p["last_review_at"] or "", _nulls_last(p["rating"])),
+    "sentiment": lambda p: (_nulls_last(p["sentiment"]), _nulls_last(p["rating"]))
+}
+
+async def merged_recommendations(service_type, neighborhoods, sort, filters, offset, limit):
+    """
+    One page of the best providers across several neighbourhoods.
+
+    Each neighbourhood's list is already ranked (and usually cached), so they
+    are combined with a lazy k-way heap merge that stops after the requested
+    page, rather than querying and sorting every provider of the service.
+    Returns the page, re-ranked across the neighbourhoods, and whether more follow.
+    """
+    lists = await asyncio.gather(*(ranked_providers((service_type, neighborhood, sort, *filters))
+                                   for neighborhood in neighborhoods))
+    merged = heapq.merge(*lists, key=MERGE_KEYS[sort], reverse=True)
+    stop = offset + limit + 1 if limit is not None else None
+    page = list(itertools.islice(merged, offset, stop))
+    has_more = limit is not None and len(page) > limit
+    # Copies, so the cached per-neighbourhood ranks are left alone
+    page = [dict(provider) for provider in page[:limit]]
+    return annotate_ranking(page, start=offset + 1), has_more
+
+# Recommendations endpoint
+@app.get("/recommendations")
+async def get_recommendations(
+    service_type: str = Query(..., description="Type of service needed"),
+    neighborhood: Optional[List[str]] = Query(None, description="Neighbourhood(s) to search in, repeated or comma-separated; omit to search everywhere"),
+    sort: str = Query("rating", pattern="^(rating|reviews_count|recent_activity|sentiment)$", description="Sort order: rating, reviews_count, recent_activity or sentiment"),
+    min_rating: Optional[float] = Query(None, ge=0, le=5, description="Only providers rated at least this high"),
+    min_reviews: Optional[int] = Query(None, ge=0, description="Only providers with at least this many reviews"),
+    has_website: Optional[bool] = Query(None, description="Only providers with (true) or without (false) a website"),
+    has_phone: Optional[bool] = Query(None, description="Only providers with (true) or without (false) a phone number"),
+    mentions: Optional[str] = Query(None, pattern="^(emergency|warranty|same_day)$", description="Only providers whose reviews mention emergency call-outs, a warranty or same-day service"),
+    limit: Optional[int] = Query(None, ge=1, description="Return only the top N providers"),
+    offset: int = Query(0, ge=0, description="Skip this many providers (for paging with limit)")
+):
+    """
+    Get service provider recommendations based on service type and neighbourhood.
+    
+    Parameters:
+    - service_type: The type of service needed (e.g., plumber, electrician)
+    - neighborhood: The neighbourhood to search in. Several can be given
+      (repeated or comma-separated), or none to find the best providers in
+      any neighbourhood; the ranking then spans all of them.
+    - sort: "rating" (default), "reviews_count" (most reviewed first),
+      "recent_activity" (most recently reviewed first) or "sentiment"
+      (most positive review text first)
+    - min_rating, min_reviews, has_website, has_phone: optional filters
+    - mentions: "emergency", "warranty" or "same_day" to only include
+      providers whose reviews mention it
+    - limit, offset: return one page of the ranking
+    
+    Returns:
+    - A list of recommended service providers in the requested order,
+      whether more follow the page (has_more), and the canonical service
+      type and neighbourhood(s) the search terms matched (null where nothing
+      matched; a list when several neighbourhoods were given)
+    """
+    terms = [term for value in neighborhood or [] for term in value.split(",") if term.strip()]
+    # Map the search terms onto the stored values ("Plumbing" -> "plumber", "Reading " -> "reading").
+    # The first request a worker serves may get here before the version watcher has built the maps.
+    if not query_normalizer.loaded:
+        await run_in_threadpool(query_normalizer.ensure_loaded)
+    canonical_service_type = query_normalizer.service_type(service_type)
+    canonical_neighborhoods = [query_normalizer.neighborhood(term) for term in terms]
+    canonical = {
+        "service_type": canonical_service_type,
+        "neighborhood": canonical_neighborhoods[0] if len(terms) == 1 else canonical_neighborhoods or None
+    }
+    if canonical_service_type is None:
+        # No provider can match, so skip the database entirely
+        return {"providers": [], "has_more": False, "canonical": canonical}
+    filters = (min_rating, min_reviews, has_website, has_phone, mentions)
+    
+    if len(terms) != 1:
+        neighborhoods = ([nb for nb in dict.fromkeys(canonical_neighborhoods) if nb is not None] if terms
+                         else query_normalizer.neighborhoods_for(canonical_service_type))
+        provider_dicts, has_more = await merged_recommendations(
+            canonical_service_type, neighborhoods, sort, filters, offset, limit
+        )
+    elif canonical_neighborhoods[0] is None:
+        return {"providers": [], "has_more": False, "canonical": canonical}
+    else:
+        provider_dicts = await ranked_providers((canonical_service_type, canonical_neighborhoods[0], sort, *filters))
+        end = offset + limit if limit is not None else None
+        has_more = end is not None and end < len(provider_dicts)
+        provider_dicts = provider_dicts[offset:end]
+    
+    # Rendered here rather than by FastAPI so serialisation shows up as its own span
+    with span("serialize", providers=len(provider_dicts)):
+        return JSONResponse(content={"providers": provider_dicts, "has_more": has_more, "canonical": canonical})
+
+# Booking endpoint
+@app.post("/bookings", status_code=201)
+async def create_booking(booking: BookingRequest):
+    """
+    Store a booking request for a provider.
+    
+    Bookings are written in batches by a background task. Depending on
+    BOOKING_DURABILITY the response is sent once the booking is committed
+    (201 with the booking id) or as soon as it is queued (202).
+    """
+    if READ_ONLY:
+        raise HTTPException(status_code=503, detail="Bookings are unavailable while serving a read-only database")
+    try:
+        future = booking_queue.submit(booking.model_dump())
+    except QueueFull:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Too many bookings in progress, please try again"},
+            headers={"Retry-After": "1"}
+        )
+    
+    if future is None:
+        return JSONResponse(status_code=202, content={"status": "queued"})
+    
+    booking_id = await asyncio.shield(future)
+    if booking_id is None:
+        raise HTTPException(status_code=404, detail="Provider not found")
+    return {"id": booking_id, "status": "received"}
+
+# Bulk export endpoint
+@app.get("/export/providers")
+def export_providers(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv")
+):
+    """
+    Stream the full provider directory as NDJSON or CSV.
+    
+    Rows are read with a server-side cursor and sent as they are read, so
+    memory use doesn't grow with the table. The stream is gzip-compressed
+    when the client sends Accept-Encoding: gzip.
+    """
+    chunks = iter_provider_export(format)
+    headers = {"Content-Disposition": f'attachment; filename="providers.{format}"', "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[format], headers=headers)
+
+# Similar providers endpoint
+@app.get("/providers/{provider_id}/similar")
+def similar_providers(
+    provider_id: int,
+    k: int = Query(5, ge=1, le=50, description="Number of similar providers to return"),
+    same_service_type: bool = Query(False, description="Only return providers of the same service type")
+):
+    """
+    Providers whose name, service type and review text are most similar to
+    the given provider, by cosine similarity of precomputed TF-IDF vectors.
+    """
+    # NumPy is only imported once similarity is first used, keeping worker start-up fast
+    from similarity import get_similarity_index, np
+    if np is None:
+        raise HTTPException(status_code=503, detail="Similar providers are unavailable")
+    data_version = cache_state["data_version"]
+    if data_version is None:
+        raise HTTPException(status_code=503, detail="Provider data is still loading")
+    
+    index = get_similarity_index(data_version)
+    if index is None:
+        raise HTTPException(status_code=503, detail="The similar-providers index is being built", headers={"Retry-After": "5"})
+    results = index.similar(provider_id, k, same_service_type)
+    db = SessionLocal()
+    try:
+        if results is None:
+            # Providers added since the index being served was built are not in it yet
+            if index.data_version != data_version and db.get(Provider, provider_id) is not None:
+                raise HTTPException(status_code=503, detail="The similar-providers index is being rebuilt", headers={"Retry-After": "5"})
+            raise HTTPException(status_code=404, detail="Provider not found")
+        ids = [similar_id for similar_id, _ in results]
+        providers = {provider.id: provider for provider in db.query(Provider).filter(Provider.id.in_(ids))}
+        similar = [
+            {**providers[similar_id].to_dict(), "similarity": round(score, 4)}
+            for similar_id, score in results if similar_id in providers
+        ]
+    finally:
+        db.close()
+    return {"provider_id": provider_id, "similar": similar}
+
+# Review endpoint
+@app.post("/providers/{provider_id}/reviews", status_code=201)
+def create_review(provider_id: int, review: ReviewRequest, db: Session = Depends(get_db)):
+    """
+    Add a review (1 to 5 stars, optional text and reviewer name) to a provider.
+    
+    The provider's rating, review counters and recent reviews, and the
+    /stats figures, are updated in place in one transaction; see reviews.py.
+    Other workers (and on SQLite the neighbourhood partition) pick the
+    review up within REVIEW_PUBLISH_INTERVAL seconds.
+    """
+    if READ_ONLY:
+        raise HTTPException(status_code=503, detail="Reviews are unavailable while serving a read-only database")
+    result = add_review(db, provider_id, review.rating, review.text, review.reviewer)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Provider not found")
+    rating, reviews_count, service_type, neighborhood = result
+    review_changes.record((service_type, neighborhood))
+    # This worker's cached rankings change now; the other workers' on their next version check
+    response_cache.invalidate_pairs({(service_type, neighborhood)})
+    return {"provider_id": provider_id, "rating": rating, "reviews_count": reviews_count}
+
+def require_admin(request: Request):
+    """Dependency for /admin endpoints: a bearer token matching ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = request.headers.get("authorization", "")
+    if not hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {ADMIN_TOKEN}".encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid or missing admin token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+# Admin bulk upsert endpoint
+@app.post("/admin/providers:bulkUpsert", dependencies=[Depends(require_admin)])
+async def bulk_upsert_providers(request: Request):
+    """
+    Insert or update providers from an NDJSON body, one provider per line,
+    matched on their provider key (service type plus name).
+    
+    The body is read as a stream and records are written in batches as
+    they arrive; see bulk_upsert.py. Returns counts and a result per line:
+    inserted, updated, invalid (with the validation error) or failed (the
+    batch could not be written).
+    """
+    if READ_ONLY:
+        raise HTTPException(status_code=503, detail="Updates are unavailable while serving a read-only database")
+    
+    results = []
+    touched = set()
+    batch = {}
+    partitioned = await run_in_threadpool(uses_partitioned_table)
+    
+    async def flush():
+        lines = list(batch.values())
+        batch.clear()
+        try:
+            outcomes, pairs = await run_in_threadpool(write_batch, [row for _, row in lines], partitioned)
+        except SQLAlchemyError as e:
+            error = str(getattr(e, "orig", None) or e)
+            results.extend({"line": number, "provider_key": row["provider_key"], "status": "failed", "error": error}
+                           for number, row in lines)
+            return
+        # Rebuild the touched partitions before publishing the version that names them
+        await run_in_threadpool(publish_data_change, None, pairs)
+        touched.update(pairs)
+        for number, row in lines:
+            provider_id, status = outcomes[row["provider_key"]]
+            results.append({"line": number, "provider_key": row["provider_key"], "id": provider_id, "status": status})
+    
+    try:
+        async for number, line in iter_lines(request.stream()):
+            row, error = parse_record(line)
+            if error is not None:
+                results.append({"line": number, "status": "invalid", "error": error})
+                continue
+            # One statement can't write the same provider twice, so a repeat starts a new batch
+            if row["provider_key"] in batch or len(batch) >= BATCH_SIZE:
+                await flush()
+            batch[row["provider_key"]] = (number, row)
+    except LineTooLong as e:
+        results.append({"line": None, "status": "invalid", "error": f"{e}; the rest of the body was not read"})
+    if batch:
+        await flush()
+    
+    if touched:
+        # This worker sees its own writes straight away; the others on their next version check
+        await cache_call(response_cache.invalidate_pairs, touched)
+    
+    results.sort(key=lambda result: result["line"] if result["line"] is not None else float("inf"))
+    counts = {status: sum(1 for result in results if result["status"] == status)
+              for status in ("inserted", "updated", "invalid", "failed")}
+    return {**counts, "results": results}
 
 # Run the server
 if __name__ == "__main__":
@@ -0,0 +1,301 @@
+"""
+Optional partitioning of the providers table by neighbourhood.
+
+Every recommendation query filters on neighborhood (in the scraped data this
+is the town or city, e.g. "reading"), so splitting the table along it keeps
+each index and rebuild proportional to one area rather than the whole
+country. Enable with PARTITION_MODE=neighborhood:
+
+- PostgreSQL: providers becomes a declaratively partitioned table
+  (PARTITION BY LIST (neighborhood)) with one partition per neighbourhood
+  and a DEFAULT partition catching new ones. The planner prunes to the one
+  partition a query asks for, so no routing is needed.
+- SQLite: the main database stays the source of truth for seeding,
+  ingestion and bookings, and each neighbourhood's providers are copied
+  into their own database file under PARTITION_DIR. Recommendation queries
+  are routed to the file for the requested neighbourhood.
+
+Convert an existing database (or split new neighbourhoods out of the
+DEFAULT partition / rebuild the SQLite files):
+
+    python partitioning.py migrate
+    python partitioning.py status
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+
+from sqlalchemy import create_engine, insert, inspect, select, text
+from sqlalchemy.orm import sessionmaker
+
+from database import Provider, SessionLocal, configure_engine, create_tables, get_engine
+
+# "none" keeps the single providers table; "neighborhood" partitions it
+PARTITION_MODE = os.environ.get("PARTITION_MODE", "none")
+
+# Directory holding the per-neighbourhood SQLite files
+PARTITION_DIR = os.environ.get("PARTITION_DIR", "./partitions")
+
+# Rows copied per round trip when rebuilding SQLite partition files
+COPY_BATCH_SIZE = 1000
+
+DEFAULT_PARTITION = "providers_p_default"
+
+# Partition file path -> (inode, engine). The inode detects a file replaced by another process.
+_partition_engines = {}
+_partition_lock = threading.Lock()
+
+def partitioning_enabled():
+    return PARTITION_MODE == "neighborhood"
+
+def partition_name(neighborhood):
+    """Identifier-safe partition name; the hash keeps distinct neighbourhoods apart after slugging"""
+    slug = re.sub(r"[^a-z0-9]+", "_", neighborhood.lower()).strip("_")[:40]
+    digest = hashlib.sha1(neighborhood.encode("utf-8")).hexdigest()[:8]
+    return f"providers_p_{slug}_{digest}"
+
+def partition_path(neighborhood):
+    return os.path.join(PARTITION_DIR, partition_name(neighborhood) + ".db")
+
+def _partition_engine(path):
+    """Engine for a SQLite partition file, or None if the file doesn't exist yet"""
+    try:
+        inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+    with _partition_lock:
+        cached = _partition_engines.get(path)
+        if cached and cached[0] == inode:
+            return cached[1]
+        if cached:
+            # Rebuilt since we opened it; pooled connections still point at the old file
+            cached[1].dispose()
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        configure_engine(engine)
+        _partition_engines[path] = (inode, engine)
+        return engine
+
+def session_for_neighborhood(neighborhood):
+    """
+    Open a session for reading one neighbourhood's providers.
+
+    With SQLite partitioning this is a session on the neighbourhood's
+    partition file; otherwise (or if the file hasn't been built) it is a
+    normal session on the main database.
+    """
+    if partitioning_enabled() and get_engine().dialect.name == "sqlite":
+        engine = _partition_engine(partition_path(neighborhood))
+        if engine is not None:
+            return sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    return SessionLocal()
+
+def is_partitioned(engine):
+    """True if providers is already a partitioned table (PostgreSQL only)"""
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('providers')")
+        ).scalar() or False
+
+def _quote_literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+def _partition_tables(conn):
+    """Existing partitions of providers as {partition name: bound expression}"""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'providers'::regclass"
+    ))
+    return dict(rows.fetchall())
+
+def migrate_postgres(engine):
+    """Convert providers into a list-partitioned table, copying the existing rows"""
+    with engine.begin() as conn:
+        neighborhoods = [row[0] for row in conn.execute(
+            text("SELECT DISTINCT neighborhood FROM providers WHERE neighborhood IS NOT NULL ORDER BY 1")
+        )]
+        conn.execute(text(
+            "CREATE TABLE providers_partitioned (LIKE providers INCLUDING DEFAULTS) PARTITION BY LIST (neighborhood)"
+        ))
+        # The partition key must be part of every primary key and unique index
+        conn.execute(text("ALTER TABLE providers_partitioned ALTER COLUMN neighborhood SET NOT NULL"))
+        conn.execute(text("ALTER TABLE providers_partitioned ADD PRIMARY KEY (id, neighborhood)"))
+        for neighborhood in neighborhoods:
+            conn.execute(text(
+                f"CREATE TABLE {partition_name(neighborhood)} PARTITION OF providers_partitioned "
+                f"FOR VALUES IN ({_quote_literal(neighborhood)})"
+            ))
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF providers_partitioned DEFAULT"))
+        conn.execute(text("INSERT INTO providers_partitioned SELECT * FROM providers"))
+
+        # Foreign keys must reference a unique key including the partition column, so references
+        # to providers.id (bookings, provider_features) can no longer be enforced by the database
+        inspector = inspect(conn)
+        for table_name in ("bookings", "provider_features"):
+            if not inspector.has_table(table_name):
+                continue
+            for foreign_key in inspector.get_foreign_keys(table_name):
+                if foreign_key["referred_table"] == "providers" and foreign_key.get("name"):
+                    conn.execute(text(f"ALTER TABLE {table_name} DROP CONSTRAINT {foreign_key['name']}"))
+
+        # Keep the id sequence when the old table is dropped
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence('providers', 'id')")).scalar()
+        conn.execute(text("ALTER TABLE providers RENAME TO providers_unpartitioned"))
+        conn.execute(text("ALTER TABLE providers_partitioned RENAME TO providers"))
+        if sequence:
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY providers.id"))
+        conn.execute(text("DROP TABLE providers_unpartitioned"))
+
+        for index in Provider.__table__.indexes:
+            if index.unique:
+                # Unique per partition only: the same provider key may appear in several neighbourhoods
+                columns = ", ".join(column.name for column in index.columns)
+                conn.execute(text(f"CREATE UNIQUE INDEX {index.name} ON providers ({columns}, neighborhood)"))
+            else:
+                # Keeps each index's column order (e.g. DESC NULLS LAST for the sort indexes)
+                index.create(conn)
+    print(f"Partitioned providers into {len(neighborhoods)} neighbourhood partitions plus {DEFAULT_PARTITION}")
+
+def split_default_partition(engine):
+    """Give each neighbourhood that has landed in the DEFAULT partition its own partition"""
+    with engine.begin() as conn:
+        neighborhoods = [row[0] for row in conn.execute(
+            text(f"SELECT DISTINCT neighborhood FROM {DEFAULT_PARTITION} ORDER BY 1")
+        )]
+        if not neighborhoods:
+            print("No new neighbourhoods in the default partition")
+            return
+        # A partition can't be added while the default partition holds matching rows
+        conn.execute(text(f"ALTER TABLE providers DETACH PARTITION {DEFAULT_PARTITION}"))
+        for neighborhood in neighborhoods:
+            name = partition_name(neighborhood)
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF providers FOR VALUES IN ({_quote_literal(neighborhood)})"
+            ))
+            conn.execute(
+                text(f"INSERT INTO providers SELECT * FROM {DEFAULT_PARTITION} WHERE neighborhood = :neighborhood"),
+                {"neighborhood": neighborhood}
+            )
+            conn.execute(
+                text(f"DELETE FROM {DEFAULT_PARTITION} WHERE neighborhood = :neighborhood"),
+                {"neighborhood": neighborhood}
+            )
+        conn.execute(text(f"ALTER TABLE providers ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    print(f"Moved {len(neighborhoods)} neighbourhoods out of {DEFAULT_PARTITION}")
+
+def rebuild_sqlite_partitions(neighborhoods=None):
+    """
+    Rebuild the SQLite partition files from the main database.
+
+    Rebuilds every neighbourhood unless a subset is given. Each file is
+    written under a temporary name and swapped in with os.replace(), so
+    readers see either the old or the new partition. Files for
+    neighbourhoods that no longer have providers are removed.
+    """
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    db = SessionLocal()
+    try:
+        current = {row[0] for row in db.query(Provider.neighborhood).distinct() if row[0]}
+        targets = current if neighborhoods is None else set(neighborhoods)
+        columns = [column.name for column in Provider.__table__.columns]
+
+        rebuilt = 0
+        for neighborhood in sorted(targets):
+            path = partition_path(neighborhood)
+            if neighborhood not in current:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+
+            temp_path = path + ".tmp"
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            engine = create_engine(f"sqlite:///{temp_path}")
+            try:
+                Provider.__table__.create(engine)
+                query = db.execute(
+                    select(Provider.__table__).where(Provider.neighborhood == neighborhood).order_by(Provider.id)
+                )
+                with engine.begin() as conn:
+                    while True:
+                        rows = query.fetchmany(COPY_BATCH_SIZE)
+                        if not rows:
+                            break
+                        conn.execute(insert(Provider.__table__), [dict(zip(columns, row)) for row in rows])
+                    conn.execute(text("ANALYZE"))
+            finally:
+                engine.dispose()
+            os.replace(temp_path, path)
+            rebuilt += 1
+
+        if neighborhoods is None:
+            # Drop files left behind by neighbourhoods that have disappeared entirely
+            expected = {partition_name(neighborhood) + ".db" for neighborhood in current}
+            for filename in os.listdir(PARTITION_DIR):
+                if filename.startswith("providers_p_") and filename.endswith(".db") and filename not in expected:
+                    os.remove(os.path.join(PARTITION_DIR, filename))
+    finally:
+        db.close()
+    return rebuilt
+
+def refresh_partitions(neighborhoods=None):
+    """
+    Bring partitions up to date after the main providers table changed.
+
+    Only SQLite partition files need refreshing; on PostgreSQL rows are
+    written straight into their partition (new neighbourhoods go to the
+    DEFAULT partition until the next migrate).
+    """
+    if not partitioning_enabled() or get_engine().dialect.name != "sqlite":
+        return
+    rebuilt = rebuild_sqlite_partitions(neighborhoods)
+    print(f"Rebuilt {rebuilt} neighbourhood partition files in {PARTITION_DIR}")
+
+def migrate():
+    """Partition an existing database, or bring an already partitioned one up to date"""
+    create_tables()
+    engine = get_engine()
+    if engine.dialect.name == "postgresql":
+        if is_partitioned(engine):
+            split_default_partition(engine)
+        else:
+            migrate_postgres(engine)
+    else:
+        rebuilt = rebuild_sqlite_partitions()
+        print(f"Built {rebuilt} neighbourhood partition files in {PARTITION_DIR}")
+
+def print_status():
+    engine = get_engine()
+    print(f"PARTITION_MODE={PARTITION_MODE} ({engine.dialect.name})")
+    if engine.dialect.name == "postgresql":
+        if not is_partitioned(engine):
+            print("providers is not partitioned")
+            return
+        with engine.connect() as conn:
+            for name, bound in sorted(_partition_tables(conn).items()):
+                count = conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+                print(f"  {name}: {bound}, {count} providers")
+        return
+
+    db = SessionLocal()
+    try:
+        neighborhoods = sorted(row[0] for row in db.query(Provider.neighborhood).distinct() if row[0])
+    finally:
+        db.close()
+    for neighborhood in neighborhoods:
+        path = partition_path(neighborhood)
+        state = f"{os.path.getsize(path)} bytes" if os.path.exists(path) else "not built"
+        print(f"  {neighborhood}: {path} ({state})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition the providers table by neighbourhood")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="Partition the providers table or bring partitions up to date")
+    subparsers.add_parser("status", help="List the partitions")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate()
+    else:
+        print_status()
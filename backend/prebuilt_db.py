@@ -0,0 +1,69 @@
+"""
+Build a prebuilt, read-only SQLite snapshot of the provider database.
+
+Instead of every container rebuilding test.db from enhanced_providers at
+boot, build the database once (e.g. in CI or the image build):
+
+    python prebuilt_db.py -o providers.db [--workers 4] [--page-size 4096]
+
+The snapshot holds the seed data, the stats rollup and the review features,
+with fresh planner statistics (ANALYZE), no free pages (VACUUM) and a
+rollback journal, so it can be opened with immutable=1. Serve it with
+
+    PREBUILT_DB_PATH=providers.db uvicorn main:app --workers 4
+
+Workers then open it read-only and memory-mapped (PREBUILT_MMAP_MB) and skip
+table creation and seeding entirely, sharing its pages through the OS page
+cache. Endpoints that write return 503. The similar-providers index is
+built at the same time, at SIMILARITY_INDEX_PATH.
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+def build_prebuilt_database(output, workers=None, page_size=4096):
+    """Seed a new SQLite file, optimise it and move it into place at output"""
+    start = time.perf_counter()
+    temp_path = output + ".building"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    # The database module reads its configuration at import, so point it at the new file first
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(temp_path)}"
+    os.environ.pop("PREBUILT_DB_PATH", None)
+    from database import create_tables, get_engine, seed_database
+    from review_features import compute_features
+    from similarity import build_similarity_index
+
+    create_tables()
+    seed_database(force=True)
+    compute_features(workers)
+    build_similarity_index()
+    get_engine().dispose()
+
+    conn = sqlite3.connect(temp_path, isolation_level=None)
+    try:
+        # immutable=1 can't read a WAL, and page_size only takes effect on VACUUM
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute(f"PRAGMA page_size = {int(page_size)}")
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise RuntimeError(f"Integrity check failed: {result}")
+    finally:
+        conn.close()
+
+    os.replace(temp_path, output)
+    print(f"Built {output} ({os.path.getsize(output) / 1024 / 1024:.1f} MB) in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a read-only SQLite snapshot of the provider database")
+    parser.add_argument("-o", "--output", default="providers.db", help="Snapshot file to write")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for review features (default: one per CPU)")
+    parser.add_argument("--page-size", type=int, default=4096, help="SQLite page size in bytes")
+    args = parser.parse_args()
+
+    build_prebuilt_database(args.output, args.workers, args.page_size)
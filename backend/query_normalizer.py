@@ -0,0 +1,125 @@
+"""
+Normalisation of /recommendations search terms to canonical values.
+
+Maps what people type ("Plumbing", "electrical", "Reading ", "home
+improvement") onto the service types and neighbourhoods stored in the
+database, using hash maps built from the SERVICE_CATEGORIES keywords and the
+distinct values in the data. Queries that match nothing are answered without
+touching the database. The maps are loaded on first use and rebuilt
+whenever the data changes.
+"""
+import re
+import threading
+
+from database import SessionLocal
+from service_categories import SERVICE_CATEGORIES
+from stats import list_pairs, list_values
+
+# Characters treated as word separators in search terms
+SEPARATORS = re.compile(r"[\s_\-/&,.]+")
+
+def normalise_term(value):
+    """Lowercase, trim and collapse separators: " Home-Improvement " -> "home improvement" """
+    return SEPARATORS.sub(" ", (value or "").lower()).strip()
+
+def _variants(term):
+    """A normalised term plus its plural and spaceless forms"""
+    variants = {term, term.replace(" ", "")}
+    if not term.endswith("s"):
+        variants.add(term + "s")
+    return variants
+
+class QueryNormalizer:
+    """Alias -> canonical value maps for service types and neighbourhoods"""
+
+    def __init__(self):
+        self.service_aliases = {}
+        self.neighborhood_aliases = {}
+        # Neighbourhoods with providers of each service type, largest first
+        self.service_neighborhoods = {}
+        # Longest alias in words, bounding the phrases tried in a multi-word query
+        self.max_service_words = 1
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def ensure_loaded(self):
+        """Build the maps now if they have never been built (blocks the first caller)"""
+        if self.loaded:
+            return
+        with self.lock:
+            if not self.loaded:
+                self.refresh()
+
+    def refresh(self):
+        """Rebuild the maps from the service types and neighbourhoods currently in the database"""
+        db = SessionLocal()
+        try:
+            service_types, neighborhoods = list_values(db)
+            pairs = list_pairs(db)
+        finally:
+            db.close()
+        self.build(service_types, neighborhoods, pairs)
+
+    def build(self, service_types, neighborhoods, pairs=()):
+        service_aliases = {}
+        known = set(service_types)
+        # Keyword aliases first, in SERVICE_CATEGORIES precedence, then the canonical names
+        # themselves, so "plumber" always means plumber even if another category lists it
+        for category, keywords in SERVICE_CATEGORIES.items():
+            # A category may be stored under one of its keywords (home_improvement as "handyman")
+            target = category if category in known else next((keyword for keyword in keywords if keyword in known), None)
+            if target is None:
+                continue
+            for keyword in [category, *keywords]:
+                for variant in _variants(normalise_term(keyword)):
+                    service_aliases.setdefault(variant, target)
+        for service_type in service_types:
+            for variant in _variants(normalise_term(service_type)):
+                service_aliases[variant] = service_type
+
+        neighborhood_aliases = {}
+        for neighborhood in neighborhoods:
+            term = normalise_term(neighborhood)
+            neighborhood_aliases[term] = neighborhood
+            neighborhood_aliases.setdefault(term.replace(" ", ""), neighborhood)
+
+        service_neighborhoods = {}
+        for service_type, neighborhood in pairs:
+            service_neighborhoods.setdefault(service_type, []).append(neighborhood)
+
+        self.max_service_words = max((len(alias.split()) for alias in service_aliases), default=1)
+        self.service_aliases = service_aliases
+        self.neighborhood_aliases = neighborhood_aliases
+        self.service_neighborhoods = service_neighborhoods
+        self.loaded = True
+
+    def service_type(self, query):
+        """
+        Canonical service type for a search term, or None if nothing matches.
+        Multi-word queries ("emergency boiler repair") match on their longest
+        known phrase, earliest first.
+        """
+        self.ensure_loaded()
+        term = normalise_term(query)
+        aliases = self.service_aliases
+        if term in aliases:
+            return aliases[term]
+        words = term.split()
+        for length in range(min(self.max_service_words, len(words)), 0, -1):
+            for start in range(len(words) - length + 1):
+                match = aliases.get(" ".join(words[start:start + length]))
+                if match:
+                    return match
+        return None
+
+    def neighborhood(self, query):
+        """Canonical neighbourhood for a search term, or None if nothing matches"""
+        self.ensure_loaded()
+        term = normalise_term(query)
+        aliases = self.neighborhood_aliases
+        return aliases.get(term) or aliases.get(term.replace(" ", ""))
+
+    def neighborhoods_for(self, service_type):
+        """Neighbourhoods that have providers of a canonical service type"""
+        self.ensure_loaded()
+        return self.service_neighborhoods.get(service_type, [])
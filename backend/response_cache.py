@@ -0,0 +1,188 @@
+"""
+Cache of ranked /recommendations and /options responses, and startup warming.
+
+ResponseCache is the in-process backend; RESPONSE_CACHE_BACKEND=sqlite or
+shm selects a store shared by all workers on the host (shared_cache.py)
+with the same interface.
+
+Entries are evicted least-recently-used beyond an entry count or byte
+budget and expire after a TTL. The whole cache is dropped when the data
+version changes (a reseed or ingest), or just the affected pairs' entries
+when the change was recorded per pair, so it never serves rankings from
+older data for longer than one version check.
+
+warm_cache() fills the cache for every (service_type, neighborhood) pair,
+largest first, so the first visitors after a deploy don't take the cold
+path (page faults, query compilation, to_dict parsing).
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RESPONSE_CACHE_ENTRIES = int(os.environ.get("RESPONSE_CACHE_ENTRIES", "2000"))
+RESPONSE_CACHE_MB = float(os.environ.get("RESPONSE_CACHE_MB", "64"))
+# Seconds an entry may be served for; 0 disables expiry (version changes still clear the cache)
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "600"))
+
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+
+def pair_of(key):
+    """The (service_type, neighborhood) pair a cache key belongs to, or None for keys like /options"""
+    return tuple(key[:2]) if len(key) >= 2 else None
+
+def estimate_size(value):
+    """Approximate size of a cached response in bytes (its JSON length)"""
+    return len(json.dumps(value, default=str))
+
+class ResponseCache:
+    """Thread-safe LRU cache with TTL and byte budget; shared by the event loop and warm-up thread"""
+
+    # Calls are quick in-memory operations, safe to make on the event loop
+    blocking = False
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, max_bytes=int(RESPONSE_CACHE_MB * 1024 * 1024),
+                 ttl=RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.bytes = 0
+        # Bumped by clear() and invalidate_pairs(); results computed before then are not stored
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def has(self, key):
+        """Whether key is cached (without counting a hit or refreshing its recency)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and (entry[0] is None or entry[0] >= time.monotonic())
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value, generation=None):
+        """
+        Store value under key. If generation is given and the cache has been
+        cleared since it was read, the (possibly stale) value is dropped.
+        """
+        size = estimate_size(value)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return False
+            if size > self.max_bytes:
+                return False
+            if key in self.entries:
+                self._remove(key)
+            expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+            self.entries[key] = (expires_at, size, value)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.generation += 1
+
+    def set_version(self, version, changed_pairs=None):
+        """Move to a new data version, dropping what it invalidates (all entries unless changed_pairs is given)"""
+        if changed_pairs is None:
+            self.clear()
+        else:
+            self.invalidate_pairs(changed_pairs)
+
+    def invalidate_pairs(self, pairs):
+        """
+        Drop the entries for the given (service_type, neighborhood) pairs
+        (the first two parts of every key), and entries that belong to no
+        pair (/options), which any change may affect. Like clear(), results
+        computed before the call are not stored. Returns the number of
+        entries dropped.
+        """
+        pairs = set(pairs)
+        with self.lock:
+            stale = [key for key in self.entries if pair_of(key) is None or pair_of(key) in pairs]
+            for key in stale:
+                self._remove(key)
+            self.generation += 1
+            return len(stale)
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "backend": "memory",
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+def create_response_cache(backend=RESPONSE_CACHE_BACKEND):
+    """
+    The response cache for this worker: "memory" (per process), or "sqlite"
+    or "shm" to share one cache between all workers on the host (see
+    shared_cache.py).
+    """
+    if backend == "memory":
+        return ResponseCache()
+    from shared_cache import SharedResponseCache, default_path
+    return SharedResponseCache(default_path(backend))
+
+def warm_cache(cache, compute, keys, time_budget, memory_budget):
+    """
+    Compute and cache compute(*key) for each key in order until done or a budget runs out.
+
+    time_budget is in seconds and memory_budget in bytes of cached
+    responses. Returns a report with how many keys were warmed, how long it
+    took and what stopped it.
+    """
+    start = time.perf_counter()
+    generation = cache.generation
+    warmed = 0
+    stopped_by = "complete"
+    for key in keys:
+        if time.perf_counter() - start >= time_budget:
+            stopped_by = "time_budget"
+            break
+        if cache.bytes >= memory_budget:
+            stopped_by = "memory_budget"
+            break
+        if cache.generation != generation:
+            stopped_by = "data_changed"
+            break
+        if cache.has(key):
+            # Already warmed, e.g. by another worker sharing the cache
+            continue
+        if cache.put(key, compute(*key), generation):
+            warmed += 1
+        # Let request threads in between pairs
+        time.sleep(0)
+    return {
+        "keys": len(keys),
+        "warmed": warmed,
+        "seconds": round(time.perf_counter() - start, 3),
+        "stopped_by": stopped_by
+    }
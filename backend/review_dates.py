@@ -0,0 +1,89 @@
+"""
+Resolve the relative review dates captured by the scraper ("a month ago",
+"7 months ago") into absolute timestamps and per-provider activity aggregates.
+
+This runs once at ingest so request handlers can sort and filter on indexed
+columns instead of parsing review JSON.
+"""
+import json
+import re
+from datetime import datetime, timedelta
+
+# "a month ago", "an hour ago", "7 months ago", ...
+RELATIVE_DATE_PATTERN = re.compile(r"^(a|an|\d+)\s+(minute|hour|day|week|month|year)s?\s+ago$")
+
+# Average unit lengths; the scraper only gives coarse dates so this is precise enough
+UNIT_LENGTHS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "month": timedelta(days=30.44),
+    "year": timedelta(days=365.25),
+}
+
+def parse_review_date(value, scraped_at):
+    """
+    Convert a review date to an absolute datetime.
+
+    Accepts relative strings such as "a month ago" (resolved against
+    scraped_at) and ISO 8601 timestamps. Returns None if the value can't be
+    parsed.
+    """
+    if not value or not isinstance(value, str):
+        return None
+
+    match = RELATIVE_DATE_PATTERN.match(value.strip().lower())
+    if match:
+        amount, unit = match.groups()
+        amount = 1 if amount in ("a", "an") else int(amount)
+        return scraped_at - amount * UNIT_LENGTHS[unit]
+
+    if value.strip().lower() == "yesterday":
+        return scraped_at - UNIT_LENGTHS["day"]
+
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    # Store naive UTC timestamps like the rest of the database
+    if parsed.tzinfo is not None:
+        parsed = parsed.replace(tzinfo=None) - parsed.utcoffset()
+    return parsed
+
+def review_velocity(published, as_of):
+    """Reviews per 30 days among the given publication times, measured up to as_of"""
+    if not published:
+        return None
+    # Measure over at least a month so a single recent review doesn't look like a burst
+    span_days = max((as_of - min(published)).days, 30)
+    return round(len(published) * 30 / span_days, 3)
+
+def resolve_review_dates(reviews_json, scraped_at):
+    """
+    Add absolute `published_at` timestamps to a provider's review JSON and
+    compute its activity aggregates.
+
+    Returns a dict of Provider column values: reviews (the updated JSON),
+    scraped_at, last_review_at and review_velocity. The velocity is the
+    number of sampled reviews per 30 days between the oldest sampled review
+    and the scrape time.
+    """
+    try:
+        reviews = json.loads(reviews_json) if reviews_json else []
+    except (TypeError, ValueError):
+        reviews = []
+
+    published = []
+    for review in reviews:
+        published_at = parse_review_date(review.get("date"), scraped_at)
+        if published_at is not None:
+            review["published_at"] = published_at.isoformat(timespec="seconds")
+            published.append(published_at)
+
+    return {
+        "reviews": json.dumps(reviews) if reviews else reviews_json,
+        "scraped_at": scraped_at,
+        "last_review_at": max(published) if published else None,
+        "review_velocity": review_velocity(published, scraped_at),
+    }
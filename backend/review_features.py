@@ -0,0 +1,177 @@
+"""
+Offline extraction of review-text features.
+
+Parsing and scoring review text per request would be far too slow, so this
+job does it once over the whole table, fanning providers out over a process
+pool, and stores the results in the provider_features side table:
+
+- term frequencies (the most frequent non-stopword terms)
+- a lexicon-based sentiment score from -1 to 1
+- whether any review mentions emergency call-outs, a warranty or
+  same-day service
+
+/recommendations filters and sorts on the indexed columns, with no text
+processing in the request path. seed.py runs it after every reseed; rerun
+it after ingesting:
+
+    python review_features.py [--workers 4] [--chunk-size 200]
+"""
+import argparse
+import json
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from database import Provider, ProviderFeature, SessionLocal, bump_data_version, create_tables
+
+# Providers per task sent to a worker process
+CHUNK_SIZE = 200
+
+# Number of most frequent terms stored per provider
+TOP_TERMS = 10
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z']+")
+
+STOPWORDS = {
+    "the", "and", "for", "was", "were", "they", "them", "their", "this", "that", "with", "have", "had",
+    "has", "are", "but", "not", "you", "your", "our", "out", "all", "from", "very", "would", "will",
+    "been", "there", "what", "which", "when", "who", "also", "just", "about", "into", "than", "then",
+    "can", "could", "did", "does", "his", "her", "she", "him", "its", "it's", "i'm", "i've", "one",
+    "get", "got", "done", "even", "any", "some", "more", "only", "other", "after", "again", "over"
+}
+
+POSITIVE_WORDS = {
+    "good", "great", "excellent", "fantastic", "brilliant", "amazing", "friendly", "helpful", "professional",
+    "reliable", "recommend", "recommended", "quick", "fast", "efficient", "effective", "reasonable",
+    "honest", "polite", "clean", "tidy", "punctual", "courteous", "knowledgeable", "happy", "pleased",
+    "perfect", "best", "superb", "outstanding", "thorough", "trustworthy", "fair", "quality", "prompt",
+    "communication", "communicative", "aftercare"
+}
+
+NEGATIVE_WORDS = {
+    "bad", "poor", "terrible", "awful", "rude", "slow", "expensive", "overpriced", "unprofessional",
+    "unreliable", "late", "dirty", "messy", "avoid", "disappointed", "disappointing", "worst",
+    "broken", "problem", "problems", "issue", "issues", "complaint", "useless", "cowboy", "cowboys",
+    "ignored", "careless", "horrible", "nightmare", "scam", "waste", "damaged"
+}
+
+# Words that flip the sentiment of the word after them ("not good", "lack of communication")
+NEGATIONS = {"not", "no", "never", "didn't", "don't", "wasn't", "isn't", "won't", "couldn't", "lack", "without"}
+
+MENTION_PATTERNS = {
+    "mentions_emergency": re.compile(r"\bemergenc(?:y|ies)\b|\b24/7\b|\b24 hours?\b|\bout of hours\b|\bcall[- ]out\b"),
+    "mentions_warranty": re.compile(r"\bwarrant(?:y|ies)\b|\bguarantee(?:d|s)?\b"),
+    "mentions_same_day": re.compile(r"\bsame[- ]day\b|\bsame afternoon\b|\bwithin the hour\b")
+}
+
+def review_sentiment(tokens):
+    """Lexicon score of one review from -1 to 1, or None if it has no sentiment words"""
+    score = 0
+    hits = 0
+    negate = False
+    for token in tokens:
+        if token in NEGATIONS:
+            negate = True
+            continue
+        polarity = 1 if token in POSITIVE_WORDS else -1 if token in NEGATIVE_WORDS else 0
+        if polarity:
+            score += -polarity if negate else polarity
+            hits += 1
+        # A negation applies to the next word only ("lack of" skips the "of")
+        negate = negate and token == "of"
+    return score / hits if hits else None
+
+def provider_features(provider_id, reviews_json):
+    """Extract the feature row for one provider from its reviews JSON"""
+    try:
+        reviews = json.loads(reviews_json) if reviews_json else []
+    except ValueError:
+        reviews = []
+
+    terms = Counter()
+    scores = []
+    mentions = dict.fromkeys(MENTION_PATTERNS, False)
+    texts = 0
+    for review in reviews:
+        text = (review.get("text") or "").lower()
+        if not text:
+            continue
+        texts += 1
+        tokens = TOKEN_PATTERN.findall(text)
+        terms.update(token for token in tokens if token not in STOPWORDS and len(token) > 2)
+        score = review_sentiment(tokens)
+        if score is not None:
+            scores.append(score)
+        for column, pattern in MENTION_PATTERNS.items():
+            if not mentions[column] and pattern.search(text):
+                mentions[column] = True
+
+    return {
+        "provider_id": provider_id,
+        "review_texts": texts,
+        "sentiment": round(sum(scores) / len(scores), 4) if scores else None,
+        **mentions,
+        "top_terms": json.dumps(terms.most_common(TOP_TERMS))
+    }
+
+def extract_chunk(chunk):
+    """Worker entry point: features for a list of (provider_id, reviews_json) pairs"""
+    return [provider_features(provider_id, reviews_json) for provider_id, reviews_json in chunk]
+
+def compute_features(workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Recompute provider_features for every provider.
+
+    Providers are read in chunks and scored in a process pool; the table is
+    then replaced in one transaction. Returns the number of feature rows.
+    """
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        query = db.query(Provider.id, Provider.reviews).order_by(Provider.id).yield_per(chunk_size)
+        chunks = []
+        chunk = []
+        for provider_id, reviews_json in query:
+            chunk.append((provider_id, reviews_json))
+            if len(chunk) == chunk_size:
+                chunks.append(chunk)
+                chunk = []
+        if chunk:
+            chunks.append(chunk)
+
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(extract_chunk, chunks):
+                rows.extend(result)
+
+        now = datetime.utcnow().replace(microsecond=0)
+        for row in rows:
+            row["computed_at"] = now
+
+        db.query(ProviderFeature).delete()
+        if rows:
+            db.execute(insert(ProviderFeature), rows)
+        # Cached rankings that filter or sort on features are now out of date
+        bump_data_version(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"Computed review features for {len(rows)} providers in {time.perf_counter() - start:.2f}s")
+    return len(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract review-text features for every provider")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Providers per worker task")
+    args = parser.parse_args()
+
+    create_tables()
+    compute_features(args.workers, args.chunk_size)
@@ -0,0 +1,190 @@
+"""
+Incremental review writes.
+
+A new review updates its provider in place instead of waiting for a reseed:
+reviews_count and the star counter are incremented, the rating becomes the
+running average (rounded to one decimal, like the scraped ratings), and the
+review is added to the stored sample, all in one UPDATE that computes the
+new values from the current ones. Nothing re-aggregates the provider's
+reviews: review_velocity is recomputed from the few sampled reviews that
+UPDATE returns, as review_dates does at ingest.
+
+The provider row is locked first (a no-op UPDATE ... RETURNING), so
+concurrent reviews of the same provider apply one after the other, and the
+previous rating it returns lets the provider's provider_stats pair row be
+adjusted by exact deltas in the same transaction. Only that row: the
+rollups are summed from the pair rows when read (see read_stats), so
+reviews of different pairs never wait on each other.
+
+Publishing the change (a new data version, and on SQLite the neighbourhood
+partition files) is left to ReviewChanges, which does it once per
+REVIEW_PUBLISH_INTERVAL for every pair reviewed in that time rather than
+once per review.
+"""
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import Float, Numeric, String, case, cast, func, literal, update
+from sqlalchemy.dialects.postgresql import JSONB
+from starlette.concurrency import run_in_threadpool
+
+from database import Provider, ProviderStat, publish_data_change
+from review_dates import review_velocity
+
+# Seconds between publishing the pairs changed by reviews as a new data version
+REVIEW_PUBLISH_INTERVAL = float(os.environ.get("REVIEW_PUBLISH_INTERVAL", "1"))
+
+# The scrape keeps the latest few reviews per provider; new reviews go first and push out the oldest
+MAX_STORED_REVIEWS = 5
+
+STAR_COLUMNS = {
+    1: Provider.one_star,
+    2: Provider.two_star,
+    3: Provider.three_star,
+    4: Provider.four_star,
+    5: Provider.five_star
+}
+
+def prepend_review(dialect, review_json):
+    """SQL expression for the reviews column with review_json added first, trimmed to MAX_STORED_REVIEWS"""
+    if dialect == "postgresql":
+        reviews = func.jsonb_build_array(cast(literal(review_json), JSONB)).op("||")(
+            func.coalesce(cast(Provider.reviews, JSONB), cast("[]", JSONB))
+        )
+        return cast(reviews.op("-")(MAX_STORED_REVIEWS), String)
+    # SQLite has no array concatenation, so splice the new element into the JSON text
+    rest = func.nullif(func.substr(func.trim(Provider.reviews), 2), "]", type_=String)
+    reviews = literal("[") + literal(review_json) + func.coalesce(literal(",") + rest, "]", type_=String)
+    return func.json_remove(reviews, f"$[{MAX_STORED_REVIEWS}]", type_=String)
+
+def add_review(db, provider_id, rating, text=None, reviewer=None):
+    """
+    Record a review of 1 to 5 stars for a provider and commit. Other
+    workers see it once the pair is published (see ReviewChanges).
+
+    Returns the provider's new (rating, reviews_count, service_type,
+    neighborhood), or None if there is no such provider.
+    """
+    previous = db.execute(
+        update(Provider).where(Provider.id == provider_id).values(id=Provider.id)
+        .returning(Provider.rating, Provider.service_type, Provider.neighborhood),
+        execution_options={"synchronize_session": False}
+    ).first()
+    if previous is None:
+        db.rollback()
+        return None
+    old_rating, service_type, neighborhood = previous
+
+    now = datetime.utcnow().replace(microsecond=0)
+    review_json = json.dumps({
+        "reviewer": reviewer,
+        "text": text,
+        "rating": rating,
+        "date": now.date().isoformat(),
+        "published_at": now.isoformat(timespec="seconds")
+    })
+    count = func.coalesce(Provider.reviews_count, 0)
+    star = STAR_COLUMNS[rating]
+    # Rounded in SQL (via numeric, which PostgreSQL's two-argument round needs) to the scraped precision
+    running_average = cast(func.round(cast((Provider.rating * count + rating) / (count + 1), Numeric), 1), Float)
+    new_rating, reviews_count, reviews = db.execute(
+        update(Provider).where(Provider.id == provider_id).values({
+            Provider.rating: case(
+                (Provider.rating.is_(None), float(rating)),
+                else_=running_average
+            ),
+            Provider.reviews_count: count + 1,
+            star: func.coalesce(star, 0) + 1,
+            Provider.reviews: prepend_review(db.get_bind().dialect.name, review_json),
+            Provider.last_review_at: now
+        }).returning(Provider.rating, Provider.reviews_count, Provider.reviews),
+        execution_options={"synchronize_session": False}
+    ).one()
+    # The row is still locked, so the sample can't change between the two UPDATEs
+    published = [datetime.fromisoformat(review["published_at"]) for review in json.loads(reviews)
+                 if isinstance(review, dict) and review.get("published_at")]
+    db.execute(
+        update(Provider).where(Provider.id == provider_id).values(review_velocity=review_velocity(published, now)),
+        execution_options={"synchronize_session": False}
+    )
+
+    # Only the pair's own row; the rollups are summed from the pair rows on read.
+    # Both ratings have one decimal, so round away the float error in their difference
+    rating_delta = round(new_rating - (old_rating or 0.0), 1)
+    rated_delta = 1 if old_rating is None else 0
+    rated_count = func.coalesce(ProviderStat.rated_count, 0) + rated_delta
+    db.execute(
+        update(ProviderStat).where(
+            ProviderStat.service_type == service_type,
+            ProviderStat.neighborhood == neighborhood
+        ).values({
+            ProviderStat.total_reviews: ProviderStat.total_reviews + 1,
+            ProviderStat.rating_sum: func.coalesce(ProviderStat.rating_sum, 0.0) + rating_delta,
+            ProviderStat.rated_count: rated_count,
+            ProviderStat.avg_rating: (func.coalesce(ProviderStat.rating_sum, 0.0) + rating_delta) / func.nullif(rated_count, 0)
+        }),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return new_rating, reviews_count, service_type, neighborhood
+
+class ReviewChanges:
+    """Pairs reviewed in this worker, published from a background task once per interval"""
+
+    def __init__(self, interval=REVIEW_PUBLISH_INTERVAL):
+        self.interval = interval
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.task = None
+        self.published = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the publishing task (call from the running event loop)"""
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Publish whatever is pending and stop the task"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        await self.flush()
+
+    def record(self, pair):
+        """Note a reviewed (service_type, neighborhood) pair (called from request threads)"""
+        with self.lock:
+            self.pending.add(pair)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        with self.lock:
+            pairs, self.pending = self.pending, set()
+        if not pairs:
+            return
+        try:
+            # Partitions first, then the version, so workers re-read fresh rows (see publish_data_change)
+            await run_in_threadpool(publish_data_change, None, pairs)
+        except Exception as e:
+            self.failed += 1
+            print(f"Error publishing reviews for {len(pairs)} pairs: {e}")
+            # Retried with the next interval's pairs
+            with self.lock:
+                self.pending |= pairs
+            return
+        self.published += len(pairs)
+
+    def snapshot(self):
+        """Counters for the /metrics endpoint"""
+        return {"pending_pairs": len(self.pending), "published_pairs": self.published, "failed": self.failed}
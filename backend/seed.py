@@ -0,0 +1,55 @@
+"""
+Create the database tables and load the seed data outside of the web workers.
+The review-text features (review_features.py) are recomputed after a reseed.
+
+Run this once per deploy (e.g. as a pre-deploy command) so that uvicorn
+workers can start serving immediately:
+
+    python seed.py [--force] [--no-wait]
+
+Seeding is serialised with a cross-process lock, so it is also safe for
+several processes to call run_seed() at the same time; only one of them
+does the work.
+"""
+import argparse
+import sys
+
+from database import READ_ONLY, create_tables, seed_database, seed_lock
+from review_features import compute_features
+
+def run_seed(blocking=True, force=False):
+    """
+    Create tables and seed the database while holding the seeding lock.
+    
+    With blocking=False this returns False straight away if another process
+    is already seeding. Returns True if this process ran the seed step.
+    """
+    if READ_ONLY:
+        print("Using a prebuilt read-only database (PREBUILT_DB_PATH), nothing to seed")
+        return False
+    with seed_lock(blocking=blocking) as acquired:
+        if not acquired:
+            print("Another process is seeding the database, skipping")
+            return False
+        create_tables()
+        if seed_database(force=force):
+            # Seeding dropped the features of the old rows; score the new ones once they are committed
+            compute_features()
+            # Imported here so the API doesn't load NumPy at start-up just to seed
+            from similarity import build_similarity_index
+            build_similarity_index()
+        return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Create tables and seed the provider database")
+    parser.add_argument("--force", action="store_true", help="Reload the seed data even if it is unchanged")
+    parser.add_argument("--no-wait", action="store_true", help="Exit immediately if another process holds the seeding lock")
+    args = parser.parse_args()
+    
+    try:
+        run_seed(blocking=not args.no_wait, force=args.force)
+    except Exception:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
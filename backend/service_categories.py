@@ -0,0 +1,59 @@
+"""
+Service type categories and the keywords that identify them.
+
+Used by the ingestion scripts to categorise scraped businesses and by the
+API to map search terms ("plumbing", "electrical") onto service types.
+"""
+
+# Keywords are matched as substrings of a business's categories, in this order;
+# the first service type with a matching keyword wins
+SERVICE_CATEGORIES = {
+    # Auto services
+    'auto': [
+        'car', 'auto', 'mechanic', 'garage', 'tyre', 'tire', 'vehicle', 'mot', 'brake', 
+        'battery', 'transmission', 'exhaust', 'wheel', 'alignment', 'oil change'
+    ],
+    
+    # Home improvement
+    'home_improvement': [
+        'builder', 'construction', 'renovation', 'remodel', 'contractor', 'carpentry', 
+        'painter', 'painting', 'decorator', 'flooring', 'tiling', 'roofing', 'roofer',
+        'kitchen', 'bathroom', 'cabinet', 'drywall', 'insulation', 'handyman'
+    ],
+    
+    # Plumbing
+    'plumber': [
+        'plumb', 'plumbing', 'drain', 'pipe', 'toilet', 'faucet', 'sink', 'water heater'
+    ],
+    
+    # Electrical
+    'electrician': [
+        'electric', 'electrical', 'electrician', 'wiring', 'lighting', 'power'
+    ],
+    
+    # Landscaping/Gardening
+    'gardener': [
+        'garden', 'landscape', 'lawn', 'tree', 'shrub', 'mow', 'yard', 'outdoor', 
+        'plant', 'grass', 'hedge', 'weed'
+    ],
+    
+    # Cleaning
+    'cleaner': [
+        'clean', 'cleaning', 'maid', 'janitorial', 'housekeeping', 'carpet cleaning', 
+        'window cleaning', 'pressure washing'
+    ],
+    
+    # HVAC
+    'hvac': [
+        'hvac', 'heating', 'cooling', 'air conditioning', 'furnace', 'boiler', 
+        'ventilation', 'heat pump'
+    ],
+    
+    # Locksmith
+    'locksmith': [
+        'lock', 'key', 'security', 'door'
+    ],
+    
+    # Other services (default category)
+    'other': []
+}
@@ -0,0 +1,258 @@
+"""
+Response cache shared by every worker on a host.
+
+With several uvicorn workers, per-process caches each hold, warm and
+invalidate their own copy of the same responses. This backend keeps one
+copy in a SQLite file that all workers open (WAL mode, so readers never
+block each other):
+
+- RESPONSE_CACHE_BACKEND=sqlite: a file in the temp directory
+- RESPONSE_CACHE_BACKEND=shm: the same file on /dev/shm, a memory-backed
+  filesystem, so the cache lives in shared memory and never touches disk
+
+RESPONSE_CACHE_PATH overrides the location. Values are stored as JSON with
+a TTL (RESPONSE_CACHE_TTL) and evicted least-recently-used beyond
+RESPONSE_CACHE_ENTRIES or RESPONSE_CACHE_MB. Each entry is tagged with the
+data version it was computed from and only served to workers on that
+version; moving to a new version retags the entries it doesn't invalidate,
+so a warm-up done by one worker serves them all.
+
+Every call is blocking file I/O, so the API runs them in the threadpool
+(blocking = True). Lookups only read; the recency of hits is written in a
+batch with the next store. Writers wait at most BUSY_TIMEOUT_SECONDS for
+another worker's write lock and otherwise skip the write: a response that
+isn't stored is just computed again.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from response_cache import RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_MB, RESPONSE_CACHE_TTL, pair_of
+
+RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH")
+
+CACHE_FILE_NAME = "neighbourhood-pro-finder-cache.db"
+SHM_DIRECTORY = "/dev/shm"
+
+# Recency is only rewritten when older than this, so most hits don't write
+LRU_TOUCH_SECONDS = 5
+
+# How long a write waits for another worker's write lock before giving up
+BUSY_TIMEOUT_SECONDS = 0.25
+
+# Entries removed per eviction statement
+EVICTION_BATCH = 16
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    service_type TEXT,
+    neighborhood TEXT,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_last_used ON entries (last_used);
+CREATE INDEX IF NOT EXISTS ix_entries_pair ON entries (service_type, neighborhood);
+"""
+
+def default_path(backend):
+    """Cache file for the "sqlite" or "shm" backend"""
+    if backend not in ("sqlite", "shm"):
+        raise ValueError(f"Unknown response cache backend {backend!r}")
+    if RESPONSE_CACHE_PATH:
+        return RESPONSE_CACHE_PATH
+    if backend == "shm":
+        if os.path.isdir(SHM_DIRECTORY):
+            return os.path.join(SHM_DIRECTORY, CACHE_FILE_NAME)
+        print(f"{SHM_DIRECTORY} is not available, keeping the response cache in the temp directory")
+    return os.path.join(tempfile.gettempdir(), CACHE_FILE_NAME)
+
+def encode_key(key):
+    return json.dumps(list(key), separators=(",", ":"))
+
+class SharedResponseCache:
+    """ResponseCache interface over a SQLite file shared between processes"""
+
+    # Calls do file I/O and may wait on a lock, so keep them off the event loop
+    blocking = True
+
+    def __init__(self, path, max_entries=RESPONSE_CACHE_ENTRIES, max_bytes=int(RESPONSE_CACHE_MB * 1024 * 1024),
+                 ttl=RESPONSE_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Data version this worker serves; nothing is read or stored until it is known
+        self.version = None
+        # Bumped on every invalidation; results computed before then are not stored
+        self.generation = 0
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped_writes = 0
+        # Keys hit since the last store -> time of the hit, written in one batch by put()
+        self.touched = {}
+        self.touched_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # Losing the cache in a crash is harmless, so don't wait for fsync
+            conn.execute("PRAGMA synchronous = OFF")
+            self.local.conn = conn
+        return conn
+
+    def has(self, key):
+        if self.version is None:
+            return False
+        row = self._connection().execute(
+            "SELECT expires_at FROM entries WHERE key = ? AND version = ?", (encode_key(key), self.version)
+        ).fetchone()
+        return row is not None and (row[0] is None or row[0] >= time.time())
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        row = None
+        if self.version is not None:
+            row = self._connection().execute(
+                "SELECT value, expires_at, last_used FROM entries WHERE key = ? AND version = ?",
+                (encode_key(key), self.version)
+            ).fetchone()
+        now = time.time()
+        if row is None or (row[1] is not None and row[1] < now):
+            self.misses += 1
+            return None
+        if row[2] < now - LRU_TOUCH_SECONDS:
+            with self.touched_lock:
+                self.touched[encode_key(key)] = now
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value, generation=None):
+        """
+        Store value under key. If generation is given and the cache has been
+        invalidated since it was read, the (possibly stale) value is dropped.
+        """
+        version = self.version
+        if version is None or (generation is not None and generation != self.generation):
+            return False
+        data = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return False
+        now = time.time()
+        pair = pair_of(key) or (None, None)
+        with self.touched_lock:
+            touched, self.touched = self.touched, {}
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if touched:
+                    conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                     [(used, touched_key) for touched_key, used in touched.items()])
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, version, service_type, neighborhood, value, size, expires_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (encode_key(key), version, pair[0], pair[1], data, len(data), now + self.ttl if self.ttl > 0 else None, now)
+                )
+                self._evict(conn, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError:
+            # Another worker holds the write lock; the recency updates are dropped with the value
+            self.skipped_writes += 1
+            return False
+        return True
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        while True:
+            count, size = conn.execute("SELECT count(*), total(size) FROM entries").fetchone()
+            if count <= self.max_entries and size <= self.max_bytes:
+                return
+            # No more than the excess entries, so a small cache doesn't lose what was just stored
+            limit = min(EVICTION_BATCH, max(count - self.max_entries, 1))
+            deleted = conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used LIMIT ?)",
+                (limit,)
+            ).rowcount
+            self.evictions += deleted
+
+    def set_version(self, version, changed_pairs=None):
+        """
+        Move to a new data version. Entries invalidated by the change are
+        deleted and the rest are retagged for the new version; entries
+        another worker already computed for the new version are kept.
+        """
+        previous = self.version
+        self.version = version
+        self.generation += 1
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if changed_pairs is None or previous is None:
+                    conn.execute("DELETE FROM entries WHERE version != ?", (version,))
+                else:
+                    self._delete_pairs(conn, changed_pairs, keep_version=version)
+                    conn.execute("UPDATE entries SET version = ? WHERE version = ?", (version, previous))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError:
+            # Entries still tagged with the previous version are never served on this one,
+            # so skipping the retag only loses them
+            self.skipped_writes += 1
+
+    def _delete_pairs(self, conn, pairs, keep_version=None):
+        # Entries that belong to no pair (/options) may be affected by any change
+        conn.execute("DELETE FROM entries WHERE service_type IS NULL AND version != ?", (keep_version or "",))
+        conn.executemany(
+            "DELETE FROM entries WHERE service_type = ? AND neighborhood = ? AND version != ?",
+            [(service_type, neighborhood, keep_version or "") for service_type, neighborhood in pairs]
+        )
+
+    def invalidate_pairs(self, pairs):
+        """Drop the entries for the given (service_type, neighborhood) pairs, in every worker"""
+        self.generation += 1
+        try:
+            self._delete_pairs(self._connection(), pairs)
+        except sqlite3.OperationalError:
+            # They are dropped on the next data version, which the change that caused this publishes
+            self.skipped_writes += 1
+
+    def clear(self):
+        self.generation += 1
+        self._connection().execute("DELETE FROM entries")
+
+    @property
+    def bytes(self):
+        return self._connection().execute("SELECT total(size) FROM entries").fetchone()[0]
+
+    def snapshot(self):
+        count, size = self._connection().execute("SELECT count(*), total(size) FROM entries").fetchone()
+        return {
+            "backend": "shared",
+            "path": self.path,
+            "entries": count,
+            "bytes": int(size),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "skipped_writes": self.skipped_writes
+        }
@@ -0,0 +1,281 @@
+"""
+"Similar providers" from precomputed TF-IDF vectors.
+
+Each provider is a document made of its name, service type and review text.
+The TF-IDF matrix is built when the data changes (seed, ingest) and saved as
+compact NumPy arrays (.npz) next to the database; API workers load it on
+first use. When a worker sees a new data version it rebuilds the index in a
+background thread and keeps serving the previous index until it is ready. A query is one sparse dot product against every provider,
+accumulated with np.bincount over the inverted index, followed by an
+argpartition top-k, so it stays well under a millisecond for tens of
+thousands of providers.
+
+Requires NumPy; without it the similar-providers endpoint is unavailable.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from database import Provider, SessionLocal, get_data_version
+from review_features import STOPWORDS, TOKEN_PATTERN
+
+SIMILARITY_INDEX_PATH = os.environ.get("SIMILARITY_INDEX_PATH", "./similarity_index.npz")
+
+# Terms in more than this share of providers say nothing about similarity ("good", "service")
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+# Each provider keeps only its highest-weighted terms. This bounds the postings a query
+# touches (common, low-weight terms drop out of most lists) at little cost to the ranking.
+MAX_TERMS_PER_PROVIDER = int(os.environ.get("SIMILARITY_MAX_TERMS", "32"))
+
+# Review writes bump the data version without changing which providers exist, so an index
+# built from slightly older data keeps being served until it is this many seconds old
+SIMILARITY_REBUILD_SECONDS = float(os.environ.get("SIMILARITY_REBUILD_SECONDS", "300"))
+
+# Rows read per round trip when building the index
+BUILD_BATCH_SIZE = 1000
+
+def review_texts(reviews_json):
+    try:
+        reviews = json.loads(reviews_json) if reviews_json else []
+    except ValueError:
+        return []
+    return [review.get("text") or "" for review in reviews]
+
+class SimilarityIndex:
+    """L2-normalised TF-IDF rows (CSR) plus the inverted index (CSC) used for scoring"""
+
+    ARRAYS = ("ids", "service_codes", "row_indptr", "row_terms", "row_weights",
+              "term_indptr", "term_rows", "term_weights")
+
+    def __init__(self, arrays, service_types, data_version):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.service_types = service_types
+        self.data_version = data_version
+        self.positions = {int(provider_id): position for position, provider_id in enumerate(self.ids)}
+
+    @classmethod
+    def build(cls, db, data_version):
+        """Build the index from the providers table"""
+        ids = []
+        service_names = []
+        documents = []
+        query = db.query(Provider.id, Provider.name, Provider.service_type, Provider.reviews)
+        for provider_id, name, service_type, reviews in query.order_by(Provider.id).yield_per(BUILD_BATCH_SIZE):
+            ids.append(provider_id)
+            service_names.append(service_type or "")
+            text = " ".join([name or "", service_type or "", *review_texts(reviews)]).lower()
+            documents.append(Counter(token for token in TOKEN_PATTERN.findall(text)
+                                     if token not in STOPWORDS and len(token) > 2))
+
+        document_count = len(documents)
+        document_frequency = Counter()
+        for counts in documents:
+            document_frequency.update(counts.keys())
+        max_df = max(2, int(MAX_DOCUMENT_FREQUENCY * document_count))
+        # Terms used by a single provider can't make two providers similar
+        vocabulary = {}
+        for term, df in document_frequency.items():
+            if 2 <= df <= max_df:
+                vocabulary[term] = len(vocabulary)
+        idf = np.zeros(len(vocabulary), dtype=np.float32)
+        for term, index in vocabulary.items():
+            idf[index] = np.log((1 + document_count) / (1 + document_frequency[term])) + 1
+
+        row_indptr = np.zeros(document_count + 1, dtype=np.int64)
+        row_terms = []
+        row_weights = []
+        for row, counts in enumerate(documents):
+            terms = np.array([vocabulary[term] for term in counts if term in vocabulary], dtype=np.int32)
+            tf = np.array([counts[term] for term in counts if term in vocabulary], dtype=np.float32)
+            weights = (1 + np.log(tf)) * idf[terms] if len(terms) else tf
+            if len(terms) > MAX_TERMS_PER_PROVIDER:
+                keep = np.argpartition(-weights, MAX_TERMS_PER_PROVIDER - 1)[:MAX_TERMS_PER_PROVIDER]
+                terms, weights = terms[keep], weights[keep]
+            norm = np.linalg.norm(weights)
+            if norm > 0:
+                weights /= norm
+            order = np.argsort(terms)
+            row_terms.append(terms[order])
+            row_weights.append(weights[order].astype(np.float32))
+            row_indptr[row + 1] = row_indptr[row] + len(terms)
+
+        row_terms = np.concatenate(row_terms) if row_terms else np.zeros(0, dtype=np.int32)
+        row_weights = np.concatenate(row_weights) if row_weights else np.zeros(0, dtype=np.float32)
+        row_numbers = np.repeat(np.arange(document_count, dtype=np.int32), np.diff(row_indptr))
+
+        # Inverted index: the same non-zeros grouped by term
+        order = np.argsort(row_terms, kind="stable")
+        term_indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_terms, minlength=len(vocabulary)), out=term_indptr[1:])
+
+        service_types = sorted(set(service_names))
+        codes = {service_type: code for code, service_type in enumerate(service_types)}
+        arrays = {
+            "ids": np.array(ids, dtype=np.int64),
+            "service_codes": np.array([codes[name] for name in service_names], dtype=np.int32),
+            "row_indptr": row_indptr,
+            "row_terms": row_terms,
+            "row_weights": row_weights,
+            "term_indptr": term_indptr,
+            "term_rows": row_numbers[order],
+            "term_weights": row_weights[order]
+        }
+        return cls(arrays, service_types, data_version)
+
+    def save(self, path):
+        """Write the index to an .npz file, replacing any previous index atomically"""
+        # A unique temporary file, so concurrent builds (several workers, a seed) never share one
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".similarity-", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    service_types=np.array(self.service_types, dtype=str),
+                    data_version=np.array(self.data_version or "", dtype=str),
+                    **{name: getattr(self, name) for name in self.ARRAYS}
+                )
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in cls.ARRAYS}
+            return cls(arrays, data["service_types"].tolist(), str(data["data_version"]))
+
+    def similar(self, provider_id, k=5, same_service_type=False):
+        """
+        Return up to k (provider_id, cosine similarity) pairs most similar to
+        provider_id, best first, or None if the provider isn't indexed.
+        """
+        row = self.positions.get(provider_id)
+        if row is None:
+            return None
+        start, end = self.row_indptr[row], self.row_indptr[row + 1]
+        terms = self.row_terms[start:end]
+        weights = self.row_weights[start:end]
+
+        # Gather the postings of every query term in one go and accumulate the dot products
+        posting_starts = self.term_indptr[terms]
+        lengths = self.term_indptr[terms + 1] - posting_starts
+        total = int(lengths.sum())
+        scores = np.zeros(len(self.ids), dtype=np.float64)
+        if total:
+            offsets = np.repeat(posting_starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+            scores += np.bincount(
+                self.term_rows[offsets],
+                weights=self.term_weights[offsets] * np.repeat(weights, lengths),
+                minlength=len(self.ids)
+            )
+
+        scores[row] = 0
+        if same_service_type:
+            scores[self.service_codes != self.service_codes[row]] = 0
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.ids[position]), float(scores[position])) for position in top if scores[position] > 0]
+
+_index = None
+# Data version the background thread is building an index for, if any
+_building = None
+_index_lock = threading.Lock()
+_index_loaded_at = 0.0
+_saved_file = (None, None)
+
+def build_similarity_index(path=SIMILARITY_INDEX_PATH, data_version=None):
+    """Build the index for the current data and save it (called after seeding and ingestion)"""
+    if np is None:
+        print("NumPy is not installed, skipping the similar-providers index")
+        return None
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        index = SimilarityIndex.build(db, data_version or get_data_version())
+    finally:
+        db.close()
+    index.save(path)
+    print(f"Built similar-providers index for {len(index.ids)} providers in {time.perf_counter() - start:.2f}s")
+    return index
+
+def saved_version(path):
+    """Data version of the saved index, or None; only re-read when the file changes"""
+    global _saved_file
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _saved_file[0] != mtime:
+        try:
+            with np.load(path) as data:
+                _saved_file = (mtime, str(data["data_version"]))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable similar-providers index {path}: {e}")
+            _saved_file = (mtime, None)
+    return _saved_file[1]
+
+def load_saved_index(path):
+    """The index saved at path, or None if there is none or it can't be read"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return SimilarityIndex.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable similar-providers index {path}: {e}")
+        return None
+
+def rebuild_in_background(path, data_version):
+    global _index, _building, _index_loaded_at
+    try:
+        index = build_similarity_index(path, data_version)
+        with _index_lock:
+            # A build for an older version that finishes late must not replace a newer index
+            if _index is None or _building == data_version:
+                _index = index
+                _index_loaded_at = time.monotonic()
+    except Exception as e:
+        print(f"Rebuilding the similar-providers index failed: {e}")
+    finally:
+        with _index_lock:
+            if _building == data_version:
+                _building = None
+
+def get_similarity_index(data_version, path=SIMILARITY_INDEX_PATH):
+    """
+    Return the index for data_version, or the previous index while the one
+    for data_version is rebuilt in the background. An index from older data
+    is kept without a rebuild while it is younger than
+    SIMILARITY_REBUILD_SECONDS, so a stream of reviews doesn't cause a
+    rebuild per review. Returns None only while no index has been built at all.
+    """
+    global _index, _building, _index_loaded_at
+    if _index is not None and _index.data_version == data_version:
+        return _index
+    with _index_lock:
+        if (_index is None or _index.data_version != data_version) and _building != data_version:
+            # The seed or ingest that changed the data has usually saved the new index already
+            if saved_version(path) == data_version or _index is None:
+                saved = load_saved_index(path)
+                if saved is not None:
+                    _index = saved
+                    _index_loaded_at = time.monotonic()
+            stale = _index is None or _index.data_version != data_version
+            if stale and (_index is None or time.monotonic() - _index_loaded_at >= SIMILARITY_REBUILD_SECONDS):
+                _building = data_version
+                threading.Thread(target=rebuild_in_background, args=(path, data_version), daemon=True).start()
+        return _index
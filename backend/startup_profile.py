@@ -0,0 +1,126 @@
+"""
+Measure the cold-start cost of the API so startup regressions show up in review.
+
+Reports two things:
+- the import-time breakdown of `main` (from `python -X importtime`)
+- the time from launching uvicorn until the first successful response
+
+Usage:
+
+    python startup_profile.py [--top 15] [--path /ping] [--budget-ms 3000] [--json]
+
+With --budget-ms the command exits with status 1 when time-to-first-response
+exceeds the budget, so it can be used as a CI check.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def import_breakdown(module="main", top=15):
+    """
+    Import the module in a fresh interpreter with -X importtime.
+
+    Returns (total_ms, rows) where rows are the `top` slowest imports as
+    dicts with self_ms, cumulative_ms and module, sorted by cumulative time.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "SEED_ON_STARTUP": "0"},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        # Format: "import time:   self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.rstrip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+
+    # Top-level imports are the ones without indentation; their cumulative times add up to the total
+    total_ms = sum(row["cumulative_ms"] for row in rows if not row["module"].startswith("  "))
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return total_ms, rows[:top]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_first_response(path="/ping", timeout=60.0):
+    """
+    Launch uvicorn and poll `path` until it answers.
+
+    Returns the elapsed time in milliseconds from process launch to the
+    first successful response.
+    """
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}{path}"
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {server.returncode} before responding")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    response.read()
+                return (time.perf_counter() - start) * 1000
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError(f"No response from {url} within {timeout} seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time and time-to-first-response for the API")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to show")
+    parser.add_argument("--path", default="/ping", help="Endpoint to poll for the first response")
+    parser.add_argument("--budget-ms", type=float, help="Fail if time-to-first-response exceeds this many milliseconds")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    total_import_ms, slowest = import_breakdown(top=args.top)
+    ttfr_ms = time_to_first_response(args.path)
+
+    if args.json:
+        print(json.dumps({
+            "import_ms": round(total_import_ms, 1),
+            "time_to_first_response_ms": round(ttfr_ms, 1),
+            "slowest_imports": slowest,
+        }, indent=2))
+    else:
+        print(f"Import time for main: {total_import_ms:.1f} ms")
+        print(f"\nSlowest {len(slowest)} imports (cumulative / self):")
+        for row in slowest:
+            print(f"  {row['cumulative_ms']:8.1f} ms {row['self_ms']:8.1f} ms  {row['module'].strip()}")
+        print(f"\nTime to first response from {args.path}: {ttfr_ms:.1f} ms")
+
+    if args.budget_ms is not None and ttfr_ms > args.budget_ms:
+        print(f"Startup budget exceeded: {ttfr_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Materialised provider statistics.
+
+The provider_stats table is rebuilt from one GROUP BY over providers whenever
+the seed or ingestion paths change the data, so /stats and coverage reports
+read a handful of precomputed rows instead of scanning the providers table.
+Targeted updates (the admin bulk upsert) recompute only the rows they affect.
+"""
+from datetime import datetime
+from sqlalchemy import func, insert, tuple_
+
+from database import Provider, ProviderStat
+
+# Empty string marks the "all" side of a rollup row
+ALL = ""
+
+def _aggregates():
+    # [count, rating sum, rated count, reviews], as accumulated in the rollup totals
+    return (func.count(Provider.id), func.sum(Provider.rating), func.count(Provider.rating), func.sum(Provider.reviews_count))
+
+def _stat_rows(totals):
+    now = datetime.utcnow().replace(microsecond=0)
+    return [
+        {
+            "service_type": service_type,
+            "neighborhood": neighborhood,
+            "provider_count": count,
+            "avg_rating": round((rating_sum or 0.0) / rated_count, 2) if rated_count else None,
+            "total_reviews": reviews or 0,
+            "rating_sum": rating_sum or 0.0,
+            "rated_count": rated_count,
+            "updated_at": now
+        }
+        for (service_type, neighborhood), (count, rating_sum, rated_count, reviews) in totals.items()
+        if count
+    ]
+
+def refresh_stats(db, pairs=None):
+    """
+    Recompute provider_stats from the providers table.
+    
+    With pairs, only the rows for those (service_type, neighborhood) pairs
+    and the rollups that contain them are recomputed, using the indexed
+    columns, instead of grouping the whole table.
+    
+    Runs inside the caller's transaction (nothing is committed here) so the
+    statistics always change atomically with the data they describe.
+    """
+    # Sessions don't autoflush, so write out pending providers before aggregating them
+    db.flush()
+    if pairs is not None:
+        refresh_pair_stats(db, set(pairs))
+        return
+    
+    rows = db.query(Provider.service_type, Provider.neighborhood, *_aggregates()).group_by(
+        Provider.service_type, Provider.neighborhood
+    ).all()
+    
+    # Roll each (service_type, neighbourhood) group up into the per-service,
+    # per-neighbourhood and overall totals: [count, rating sum, rated count, reviews]
+    totals = {}
+    for service_type, neighborhood, count, rating_sum, rated_count, reviews in rows:
+        for key in ((service_type, neighborhood), (service_type, ALL), (ALL, neighborhood), (ALL, ALL)):
+            total = totals.setdefault(key, [0, 0.0, 0, 0])
+            total[0] += count
+            total[1] += rating_sum or 0.0
+            total[2] += rated_count
+            total[3] += reviews or 0
+    
+    db.query(ProviderStat).delete()
+    stats = _stat_rows(totals)
+    if stats:
+        db.execute(insert(ProviderStat), stats)
+
+def refresh_pair_stats(db, pairs):
+    """Recompute the provider_stats rows affected by changes to the given pairs"""
+    if not pairs:
+        return
+    service_types = {service_type for service_type, _ in pairs}
+    neighborhoods = {neighborhood for _, neighborhood in pairs}
+    
+    totals = {}
+    pair_rows = db.query(Provider.service_type, Provider.neighborhood, *_aggregates()).filter(
+        Provider.service_type.in_(service_types),
+        Provider.neighborhood.in_(neighborhoods)
+    ).group_by(Provider.service_type, Provider.neighborhood)
+    for service_type, neighborhood, *aggregates in pair_rows:
+        if (service_type, neighborhood) in pairs:
+            totals[(service_type, neighborhood)] = aggregates
+    service_rows = db.query(Provider.service_type, *_aggregates()).filter(
+        Provider.service_type.in_(service_types)
+    ).group_by(Provider.service_type)
+    for service_type, *aggregates in service_rows:
+        totals[(service_type, ALL)] = aggregates
+    neighborhood_rows = db.query(Provider.neighborhood, *_aggregates()).filter(
+        Provider.neighborhood.in_(neighborhoods)
+    ).group_by(Provider.neighborhood)
+    for neighborhood, *aggregates in neighborhood_rows:
+        totals[(ALL, neighborhood)] = aggregates
+    totals[(ALL, ALL)] = list(db.query(*_aggregates()).one())
+    
+    # Rows for pairs or rollups that no longer have providers are deleted and not replaced
+    keys = pairs | {(service_type, ALL) for service_type in service_types} \
+        | {(ALL, neighborhood) for neighborhood in neighborhoods} | {(ALL, ALL)}
+    db.query(ProviderStat).filter(
+        tuple_(ProviderStat.service_type, ProviderStat.neighborhood).in_(list(keys))
+    ).delete(synchronize_session=False)
+    stats = _stat_rows(totals)
+    if stats:
+        db.execute(insert(ProviderStat), stats)
+
+def list_pairs(db):
+    """All (service_type, neighborhood) pairs that have providers, largest first"""
+    rows = db.query(ProviderStat.service_type, ProviderStat.neighborhood).filter(
+        ProviderStat.service_type != ALL,
+        ProviderStat.neighborhood != ALL
+    ).order_by(ProviderStat.provider_count.desc()).all()
+    return [(service_type, neighborhood) for service_type, neighborhood in rows]
+
+def list_values(db):
+    """The distinct service types and neighbourhoods that have providers"""
+    rows = db.query(ProviderStat.service_type, ProviderStat.neighborhood).filter(
+        (ProviderStat.service_type == ALL) != (ProviderStat.neighborhood == ALL)
+    ).all()
+    service_types = sorted(service_type for service_type, neighborhood in rows if neighborhood == ALL)
+    neighborhoods = sorted(neighborhood for service_type, neighborhood in rows if service_type == ALL)
+    return service_types, neighborhoods
+
+def read_stats(db):
+    """
+    Return the materialised statistics as a dictionary with the overall
+    total and lists of per-service, per-neighbourhood and per-pair entries,
+    each sorted by provider count (highest first).
+    
+    New reviews adjust only their pair's row, so the rollup figures are
+    summed from the pair rows here rather than read from the rollup rows.
+    """
+    result = {"total": None, "service_types": [], "neighbourhoods": [], "pairs": []}
+    
+    stats = db.query(ProviderStat).all()
+    # [count, rating sum, rated count, reviews] per rollup row
+    totals = {}
+    for stat in stats:
+        if stat.service_type != ALL and stat.neighborhood != ALL:
+            for key in ((stat.service_type, ALL), (ALL, stat.neighborhood), (ALL, ALL)):
+                total = totals.setdefault(key, [0, 0.0, 0, 0])
+                total[0] += stat.provider_count
+                total[1] += stat.rating_sum or 0.0
+                total[2] += stat.rated_count or 0
+                total[3] += stat.total_reviews
+    
+    entries = []
+    for stat in stats:
+        total = totals.get((stat.service_type, stat.neighborhood))
+        if total is None:
+            count, avg_rating, reviews = stat.provider_count, stat.avg_rating, stat.total_reviews
+        else:
+            count, avg_rating, reviews = total[0], total[1] / total[2] if total[2] else None, total[3]
+        entries.append((stat, {
+            "provider_count": count,
+            # Adjusted incrementally by new reviews, so rounded here rather than when stored
+            "avg_rating": round(avg_rating, 2) if avg_rating is not None else None,
+            "total_reviews": reviews
+        }))
+    entries.sort(key=lambda item: item[1]["provider_count"], reverse=True)
+    
+    for stat, entry in entries:
+        if stat.service_type == ALL and stat.neighborhood == ALL:
+            result["total"] = {**entry, "updated_at": stat.updated_at.isoformat() if stat.updated_at else None}
+        elif stat.neighborhood == ALL:
+            result["service_types"].append({"service_type": stat.service_type, **entry})
+        elif stat.service_type == ALL:
+            result["neighbourhoods"].append({"neighborhood": stat.neighborhood, **entry})
+        else:
+            result["pairs"].append({"service_type": stat.service_type, "neighborhood": stat.neighborhood, **entry})
+    
+    return result
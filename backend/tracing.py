@@ -0,0 +1,246 @@
+"""
+Lightweight request tracing for debugging tail latency.
+
+A sampled share of requests (TRACE_SAMPLE_RATE, 0 to 1; off by default) is
+traced end to end: the request itself, session acquisition, every SQL
+statement, to_dict conversion, ranking and response serialisation. Spans
+are written as Chrome trace events ("ph": "X"), one JSON object per line,
+to a size-rotated file (TRACE_FILE) by a background writer thread, so the
+event loop never waits on disk. Each request gets its own track, so
+concurrent requests don't overlap in the viewer.
+
+Convert one or more trace files for chrome://tracing or ui.perfetto.dev:
+
+    python tracing.py to-chrome traces.jsonl traces.jsonl.1 -o trace.json
+
+Uses only the standard library.
+"""
+import argparse
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.environ.get("TRACE_FILE", "./traces.jsonl")
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.environ.get("TRACE_BACKUPS", "3"))
+# Finished traces waiting for the writer thread; beyond this new traces are dropped
+TRACE_QUEUE_SIZE = int(os.environ.get("TRACE_QUEUE_SIZE", "1000"))
+
+# Longest SQL statement text kept on a span
+MAX_STATEMENT_LENGTH = 500
+
+# The trace of the request being handled, or None when it isn't sampled. Copied
+# into threadpool threads and tasks, so spans from find_recommendations land in it.
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+_track_ids = itertools.count(1)
+
+def tracing_enabled():
+    return TRACE_SAMPLE_RATE > 0
+
+class Trace:
+    """The spans recorded for one request"""
+
+    def __init__(self):
+        self.track = next(_track_ids)
+        self.events = []
+
+    def add(self, name, category, start_ns, duration_ns, args=None):
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start_ns // 1000,
+            "dur": duration_ns // 1000,
+            "pid": os.getpid(),
+            "tid": self.track
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+class _Span:
+    def __init__(self, trace, name, category, args):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        # Wall clock for the timestamp so traces from several workers line up
+        self.start_ns = time.time_ns()
+        self.start_counter = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args = {**(self.args or {}), "error": exc_type.__name__}
+        self.trace.add(self.name, self.category, self.start_ns, time.perf_counter_ns() - self.start_counter, self.args)
+        return False
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def span(name, category="app", **args):
+    """Context manager timing a block as a span of the current trace (a no-op when not tracing)"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name, category, args or None)
+
+class TraceWriter:
+    """Writes finished traces to the rotating trace file from a background thread"""
+
+    def __init__(self, path=TRACE_FILE, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS, max_size=TRACE_QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.Queue(maxsize=max_size)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def submit(self, trace):
+        """Queue a finished trace for writing; never blocks the caller"""
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                    self.thread.start()
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            # The disk can't keep up; losing a sample is better than stalling requests
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until every queued trace has been written"""
+        if self.thread is not None:
+            self.queue.join()
+
+    def stop(self):
+        """Write out the queued traces and stop the writer thread"""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+
+    def _run(self):
+        handler = logging.handlers.RotatingFileHandler(
+            self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        try:
+            while True:
+                trace = self.queue.get()
+                try:
+                    if trace is None:
+                        return
+                    # One line per event, written as one record so a rotation never splits a trace
+                    lines = "\n".join(json.dumps(event, separators=(",", ":")) for event in trace.events)
+                    handler.handle(logging.makeLogRecord({"msg": lines}))
+                    self.written += 1
+                finally:
+                    self.queue.task_done()
+        finally:
+            handler.close()
+
+trace_writer = TraceWriter()
+
+def write_trace(trace):
+    trace_writer.submit(trace)
+
+def install_sql_tracing():
+    """Record a span for every SQL statement executed while a trace is active"""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_trace.get() is not None:
+            conn.info.setdefault("trace_starts", []).append((time.time_ns(), time.perf_counter_ns()))
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = _current_trace.get()
+        starts = conn.info.get("trace_starts")
+        if trace is None or not starts:
+            return
+        start_ns, start_counter = starts.pop()
+        trace.add("sql", "db", start_ns, time.perf_counter_ns() - start_counter,
+                  {"statement": statement[:MAX_STATEMENT_LENGTH], "executemany": executemany})
+
+class TracingMiddleware:
+    """ASGI middleware that samples requests and writes their spans when they finish"""
+
+    def __init__(self, app, sample_rate=TRACE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = _current_trace.set(trace)
+        status = {}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            with _Span(trace, "request", "http", {"method": scope["method"], "path": scope["path"],
+                                                 "query": scope.get("query_string", b"").decode("latin-1")}) as request_span:
+                await self.app(scope, receive, send_with_status)
+                request_span.args["status"] = status.get("code")
+        finally:
+            _current_trace.reset(token)
+            write_trace(trace)
+
+def tracing_snapshot():
+    return {
+        "sample_rate": TRACE_SAMPLE_RATE,
+        "traces_written": trace_writer.written,
+        "traces_queued": trace_writer.queue.qsize(),
+        "traces_dropped": trace_writer.dropped
+    }
+
+def to_chrome(paths, output):
+    """Combine JSON-lines trace files into one Chrome trace JSON file"""
+    events = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+    events.sort(key=lambda event: event["ts"])
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    print(f"Wrote {len(events)} events to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work with request trace files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("to-chrome", help="Convert JSON-lines traces to Chrome trace JSON")
+    convert_parser.add_argument("paths", nargs="+", help="Trace files (e.g. traces.jsonl traces.jsonl.1)")
+    convert_parser.add_argument("-o", "--output", default="trace.json", help="Output file")
+    args = parser.parse_args()
+
+    to_chrome(args.paths, args.output)
@@ -1,9 +1,39 @@
+import argparse
+import os
 import sys
-sys.path.append('.')
 
-from backend.database import Provider, SessionLocal
+# Add the backend directory to the path so we can import the database modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from database import Provider, SessionLocal
+from stats import read_stats
 from sqlalchemy import func
 
+def print_stats():
+    """Print coverage from the materialised provider_stats table (no table scans)"""
+    db = SessionLocal()
+    
+    try:
+        stats = read_stats(db)
+        if stats["total"] is None:
+            print("No statistics found. Seed or import data first.")
+            return
+        
+        total = stats["total"]
+        print(f"Total providers in database: {total['provider_count']} (average rating {total['avg_rating']}, {total['total_reviews']} reviews)")
+        print(f"Statistics updated at: {total['updated_at']}")
+        
+        print("\nProviders by service type:")
+        for entry in stats["service_types"]:
+            print(f"  {entry['service_type']}: {entry['provider_count']} providers (average rating {entry['avg_rating']})")
+        
+        print("\nTop 10 neighborhoods:")
+        for entry in stats["neighbourhoods"][:10]:
+            print(f"  {entry['neighborhood']}: {entry['provider_count']} providers (average rating {entry['avg_rating']})")
+        
+    finally:
+        db.close()
+
 def main():
     # Create a database session
     db = SessionLocal()
@@ -47,4 +77,11 @@ def main():
         db.close()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Summarise the providers in the database")
+    parser.add_argument("--stats", action="store_true", help="Read the materialised statistics instead of scanning the providers table")
+    args = parser.parse_args()
+    
+    if args.stats:
+        print_stats()
+    else:
+        main()
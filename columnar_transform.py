@@ -0,0 +1,225 @@
+"""
+Vectorised columnar transform for the ingestion pipeline.
+
+transform_columnar() produces exactly the same provider rows as
+process_data.transform_rows(), but loads a batch of records into Arrow
+columns and runs the closed-business filter, categorisation, neighbourhood
+extraction and phone formatting with Arrow compute kernels instead of
+per-record Python string code.
+
+Categorisation runs once per distinct category list, with one regex per
+service type. Records containing non-ASCII text in a transformed field are
+sent through the row-wise functions, because Python's str.lower(),
+str.strip() and the \\D regex treat some non-ASCII characters differently,
+and batches whose fields don't fit the column types use the row-wise
+transform altogether.
+
+Benchmark against the row-wise path (synthetic data unless a dataset is given):
+
+    python columnar_transform.py --bench [--sizes 1000 10000 100000] [--dataset dataset.json]
+"""
+import argparse
+import random
+import re
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+from process_data import (
+    SERVICE_CATEGORIES, categorize_service, extract_neighborhood, format_phone, transform_rows
+)
+
+# Joins a record's category strings; never appears in a keyword, so a keyword
+# found in the joined string is always a substring of a single category
+CATEGORY_SEPARATOR = '\x1f'
+
+# The ASCII characters str.strip() removes
+ASCII_WHITESPACE = ' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+def _input_type():
+    """Arrow type for the raw record fields the transform reads"""
+    return pa.struct([
+        ('permanentlyClosed', pa.bool_()),
+        ('categoryName', pa.string()),
+        ('categories', pa.list_(pa.string())),
+        ('neighborhood', pa.string()),
+        ('city', pa.string()),
+        ('address', pa.string()),
+        ('phone', pa.string())
+    ])
+
+def _string_field(records, name):
+    """A string field of the record column, treating None and missing values as ''"""
+    return pc.fill_null(records.field(name), '')
+
+def _keyword_pattern(keywords):
+    """Regex matching any of the keywords literally"""
+    return '|'.join(re.sub(r'([\\.^$|?*+()\[\]{}])', r'\\\1', keyword.lower()) for keyword in keywords)
+
+# One pattern per service type, in the precedence order of the row-wise loop
+CATEGORY_PATTERNS = [
+    (service_type, _keyword_pattern(keywords))
+    for service_type, keywords in SERVICE_CATEGORIES.items()
+    if keywords
+]
+
+def categorize_column(category_text):
+    """Vectorised categorize_service over lowercased, joined category strings"""
+    # Scrapes repeat the same few category lists, so match keywords once per distinct value
+    encoded = pc.dictionary_encode(category_text)
+    distinct = encoded.dictionary
+    service_types = pa.nulls(len(distinct), pa.string())
+    # The first service type with any matching keyword wins
+    for service_type, pattern in CATEGORY_PATTERNS:
+        matched = pc.match_substring_regex(distinct, pattern)
+        service_types = pc.if_else(pc.and_(pc.is_null(service_types), matched), service_type, service_types)
+    return pc.take(pc.fill_null(service_types, 'other'), encoded.indices)
+
+def neighborhood_column(neighborhoods, cities, addresses):
+    """Vectorised extract_neighborhood: neighbourhood, then city, then the second address part"""
+    parts = pc.split_pattern(addresses, ',', max_splits=2)
+    has_second = pc.greater(pc.list_value_length(parts), 1)
+    # list_element needs an element to exist, so give single-part addresses a placeholder list
+    parts = pc.if_else(has_second, parts, pa.scalar(['', ''], pa.list_(pa.string())))
+    second_part = pc.ascii_lower(pc.utf8_trim(pc.list_element(parts, 1), ASCII_WHITESPACE))
+    return pc.if_else(
+        pc.not_equal(neighborhoods, ''), pc.ascii_lower(neighborhoods),
+        pc.if_else(pc.not_equal(cities, ''), pc.ascii_lower(cities),
+                   pc.if_else(has_second, second_part, 'unknown'))
+    )
+
+def phone_column(phones):
+    """Vectorised format_phone: the last 7 digits as XXX-XXXX, else the original value"""
+    digits = pc.replace_substring_regex(phones, '[^0-9]', '')
+    formatted = pc.binary_join_element_wise(
+        pc.utf8_slice_codeunits(digits, -7, -4), pc.utf8_slice_codeunits(digits, -4), '-'
+    )
+    return pc.if_else(pc.greater_equal(pc.utf8_length(digits), 7), formatted, phones)
+
+def transform_columnar(data):
+    """Transform raw business records into provider rows with vectorised column operations"""
+    if pa is None:
+        raise ImportError("The columnar transform needs pyarrow: pip install pyarrow")
+
+    try:
+        records = pa.array(data, type=_input_type())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # A field holds something other than the expected text or list (e.g. a numeric phone)
+        return transform_rows(data)
+
+    # Closed-business filter
+    open_mask = pc.invert(pc.fill_null(records.field('permanentlyClosed'), False))
+    kept = [data[i] for i in pc.indices_nonzero(open_mask).to_pylist()]
+    if not kept:
+        return []
+    records = records.filter(open_mask)
+
+    category_text = pc.binary_join_element_wise(
+        _string_field(records, 'categoryName'),
+        pc.fill_null(pc.binary_join(records.field('categories'), CATEGORY_SEPARATOR), ''),
+        CATEGORY_SEPARATOR
+    )
+    neighborhoods = _string_field(records, 'neighborhood')
+    cities = _string_field(records, 'city')
+    addresses = _string_field(records, 'address')
+    phones = _string_field(records, 'phone')
+
+    service_types = categorize_column(pc.ascii_lower(category_text)).to_pylist()
+    neighborhood_values = neighborhood_column(neighborhoods, cities, addresses).to_pylist()
+    contacts = phone_column(phones).to_pylist()
+
+    # Fall back to the row-wise functions where the Arrow kernels could differ from Python
+    def non_ascii(*columns):
+        ascii_mask = pc.string_is_ascii(columns[0])
+        for column in columns[1:]:
+            ascii_mask = pc.and_(ascii_mask, pc.string_is_ascii(column))
+        return pc.indices_nonzero(pc.invert(ascii_mask)).to_pylist()
+
+    for i in non_ascii(category_text):
+        service_types[i] = categorize_service(kept[i])
+    for i in non_ascii(neighborhoods, cities, addresses):
+        neighborhood_values[i] = extract_neighborhood(kept[i])
+    for i in non_ascii(phones):
+        contacts[i] = format_phone(kept[i].get('phone', ''))
+
+    return [
+        {
+            "name": business.get('title', ''),
+            "service_type": service_type,
+            "neighborhood": neighborhood,
+            "contact": contact,
+            "rating": business.get('totalScore', 0),
+            "postal_code": business.get('postalCode'),
+            "full_phone": business.get('phone')
+        }
+        for business, service_type, neighborhood, contact in zip(kept, service_types, neighborhood_values, contacts)
+    ]
+
+def synthetic_records(count, seed=7):
+    """Generate scrape-like business records for benchmarking"""
+    rng = random.Random(seed)
+    categories = ['Car repair and maintenance', 'Plumber', 'Electrician', 'Gardener', 'House cleaning service',
+                  'Locksmith', 'Heating contractor', 'Painter', 'Bakery', 'Tyre shop', 'Drainage service']
+    cities = ['Reading', 'Wokingham', 'Caversham', 'Woodley', 'Earley', '']
+    records = []
+    for i in range(count):
+        city = rng.choice(cities)
+        records.append({
+            'title': f"Business {i}",
+            'categoryName': rng.choice(categories),
+            'categories': rng.sample(categories, 2),
+            'city': city,
+            'address': f"{i} High St, {rng.choice(cities) or 'Tilehurst'} RG{i % 40} 1AA, United Kingdom",
+            'phone': rng.choice([f"+44 118 {rng.randrange(100, 999)} {rng.randrange(1000, 9999)}", '', '12345']),
+            'postalCode': f"RG{i % 40} 1AA",
+            'totalScore': round(rng.uniform(3, 5), 1),
+            'permanentlyClosed': rng.random() < 0.05
+        })
+    return records
+
+def benchmark(sizes, dataset=None, repeats=3):
+    """Time the row-wise and columnar transforms for each batch size and check they agree"""
+    print(f"{'batch size':>10} {'rows (ms)':>12} {'columnar (ms)':>14} {'speedup':>8}")
+    for size in sizes:
+        if dataset:
+            records = [dataset[i % len(dataset)] for i in range(size)]
+        else:
+            records = synthetic_records(size)
+
+        timings = {}
+        for name, transform in (('rows', transform_rows), ('columnar', transform_columnar)):
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                output = transform(records)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = (best, output)
+
+        if timings['rows'][1] != timings['columnar'][1]:
+            raise AssertionError(f"Columnar output differs from row-wise output for batch size {size}")
+
+        rows_ms, columnar_ms = timings['rows'][0] * 1000, timings['columnar'][0] * 1000
+        print(f"{size:>10} {rows_ms:>12.1f} {columnar_ms:>14.1f} {rows_ms / columnar_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    import json
+
+    parser = argparse.ArgumentParser(description="Benchmark the columnar transform against the row-wise transform")
+    parser.add_argument("--bench", action="store_true", help="Run the benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Batch sizes to benchmark")
+    parser.add_argument("--dataset", help="Scraped dataset JSON to sample records from (default: synthetic records)")
+    args = parser.parse_args()
+
+    if args.bench:
+        dataset = None
+        if args.dataset:
+            with open(args.dataset, 'r', encoding='utf-8') as f:
+                dataset = json.load(f)
+        benchmark(args.sizes, dataset)
+    else:
+        parser.print_help()
@@ -0,0 +1,298 @@
+"""
+Fuzzy duplicate-provider detection for the ingestion scripts.
+
+Scrapes often contain the same business more than once under slightly
+different names ("Bosch Car Service - R.A. Engineering" and "Bosch Car
+Service RA Engineering"). Comparing every pair of records is O(n^2), so
+candidates are found by blocking instead. Records in the same service type
+are compared only if they share at least one of:
+- the same phone number (last 9 digits)
+- the same normalised name
+- the same postcode and first name token
+- a MinHash/LSH band over their name tokens
+
+Each block holds only a handful of records, so the work grows roughly
+linearly with the number of records. Blocks that grow past MAX_BLOCK_SIZE
+are too generic to be useful; they are skipped and the number of records
+in them is logged.
+
+Usage:
+
+    python dedupe.py providers.json --output deduped.json --report dedupe_report.json
+"""
+import argparse
+import json
+import random
+import re
+import time
+import zlib
+from collections import defaultdict
+
+# Tokens that say nothing about which business a name refers to
+STOP_TOKENS = {'ltd', 'limited', 'llp', 'plc', 'co', 'company', 'the', 'and', 'of', 'uk', 'services', 'service'}
+
+# MinHash signature length and LSH banding (NUM_BANDS * ROWS_PER_BAND == NUM_PERMUTATIONS).
+# Pairs with name similarity above roughly (1 / NUM_BANDS) ** (1 / ROWS_PER_BAND) ~ 0.64 become candidates.
+NUM_PERMUTATIONS = 24
+NUM_BANDS = 6
+ROWS_PER_BAND = 4
+
+# Blocks larger than this are skipped (e.g. a very common name token in one postcode)
+MAX_BLOCK_SIZE = 50
+
+# Default name similarity (Jaccard over name tokens) for two records to be duplicates
+DEFAULT_THRESHOLD = 0.6
+
+# Lower similarity accepted when the records also share a phone number
+PHONE_MATCH_THRESHOLD = 0.3
+
+# Which record survives a merge
+MERGE_STRATEGIES = ('most_reviews', 'highest_rating', 'first')
+
+# Fixed random universal hash functions so signatures are stable between runs
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+def normalise_name(name):
+    """Lowercase a name, drop punctuation and company suffixes: "R.A. Engineering Ltd" -> "ra engineering" """
+    name = re.sub(r"[.']", '', (name or '').lower())
+    tokens = re.sub(r'[^a-z0-9]+', ' ', name).split()
+    return ' '.join(token for token in tokens if token not in STOP_TOKENS)
+
+def phone_key(record):
+    """Last 9 digits of the provider's phone number, which ignores country and trunk prefixes"""
+    digits = re.sub(r'\D', '', record.get('full_phone') or record.get('contact') or '')
+    return digits[-9:] if len(digits) >= 9 else None
+
+def postcode_key(record):
+    postcode = (record.get('postal_code') or '').replace(' ', '').upper()
+    return postcode or None
+
+def minhash_signature(tokens):
+    """MinHash signature of a set of tokens"""
+    hashes = [zlib.crc32(token.encode('utf-8')) for token in tokens]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in PERMUTATIONS]
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def blocking_keys(record, tokens, name):
+    """Keys under which a record is filed; records sharing any key are compared"""
+    service_type = record.get('service_type')
+    keys = []
+
+    phone = phone_key(record)
+    if phone:
+        keys.append(('phone', service_type, phone))
+
+    if name:
+        keys.append(('name', service_type, name))
+
+    postcode = postcode_key(record)
+    if postcode and tokens:
+        keys.append(('postcode', service_type, postcode, name.split()[0]))
+
+    if tokens:
+        signature = minhash_signature(tokens)
+        for band in range(NUM_BANDS):
+            rows = tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+            keys.append(('lsh', service_type, band, rows))
+
+    return keys
+
+def is_duplicate(a, b, similarity, threshold):
+    """Decide whether two candidate records describe the same business"""
+    # Similar names in different postcodes are usually different branches, even with a shared phone line
+    postcode_a, postcode_b = postcode_key(a), postcode_key(b)
+    if postcode_a and postcode_b and postcode_a != postcode_b:
+        return False
+
+    if phone_key(a) is not None and phone_key(a) == phone_key(b):
+        return similarity >= PHONE_MATCH_THRESHOLD
+
+    return similarity >= threshold
+
+class _UnionFind:
+    def __init__(self, postcodes):
+        self.parent = list(range(len(postcodes)))
+        # Postcodes in each cluster, kept on its root
+        self.postcodes = [{postcode} if postcode else set() for postcode in postcodes]
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        """
+        Join the clusters of i and j and return True, unless that would put
+        records from different postcodes in one cluster (e.g. two branches
+        both matching a record with no postcode).
+        """
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i == root_j:
+            return True
+        postcodes = self.postcodes[root_i] | self.postcodes[root_j]
+        if len(postcodes) > 1:
+            return False
+        root, child = min(root_i, root_j), max(root_i, root_j)
+        self.parent[child] = root
+        self.postcodes[root] = postcodes
+        return True
+
+def choose_survivor(records, strategy):
+    """Pick the record kept for a duplicate cluster"""
+    if strategy == 'most_reviews':
+        return max(records, key=lambda r: (r.get('reviews_count') or 0, r.get('rating') or 0))
+    if strategy == 'highest_rating':
+        return max(records, key=lambda r: (r.get('rating') or 0, r.get('reviews_count') or 0))
+    return records[0]
+
+def merge_records(records, strategy='most_reviews', fill_missing=True):
+    """Merge a cluster into one record, optionally filling empty fields from the others"""
+    survivor = dict(choose_survivor(records, strategy))
+    if fill_missing:
+        for record in records:
+            for field, value in record.items():
+                if survivor.get(field) in (None, '') and value not in (None, ''):
+                    survivor[field] = value
+    return survivor
+
+def find_duplicates(records, threshold=DEFAULT_THRESHOLD):
+    """
+    Find clusters of duplicate records.
+
+    Returns a list of clusters, each a dict with the record indexes and the
+    matched pairs (with the blocking key and similarity that matched them).
+    """
+    tokens = []
+    blocks = defaultdict(list)
+    for i, record in enumerate(records):
+        name = normalise_name(record.get('name'))
+        record_tokens = set(name.split())
+        tokens.append(record_tokens)
+        for key in blocking_keys(record, record_tokens, name):
+            blocks[key].append(i)
+
+    union_find = _UnionFind([postcode_key(record) for record in records])
+    compared = set()
+    matches = []
+    oversized = []
+    for key, members in blocks.items():
+        if len(members) > MAX_BLOCK_SIZE:
+            oversized.append(members)
+            continue
+        if len(members) < 2:
+            continue
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                i, j = members[x], members[y]
+                if (i, j) in compared:
+                    continue
+                compared.add((i, j))
+                similarity = jaccard(tokens[i], tokens[j])
+                if is_duplicate(records[i], records[j], similarity, threshold) and union_find.union(i, j):
+                    matches.append((i, j, key[0], round(similarity, 3)))
+
+    if oversized:
+        # These records may still match through their other blocking keys, but duplicates
+        # that only share a skipped block are missed, so make the gap visible
+        skipped_records = len(set().union(*oversized))
+        print(f"Skipped {len(oversized)} blocks larger than {MAX_BLOCK_SIZE} records ({skipped_records} records not compared within them)")
+
+    clusters = defaultdict(lambda: {'members': set(), 'matches': []})
+    for i, j, block, similarity in matches:
+        cluster = clusters[union_find.find(i)]
+        cluster['members'].update((i, j))
+        cluster['matches'].append({'a': i, 'b': j, 'block': block, 'similarity': similarity})
+
+    return [
+        {'members': sorted(cluster['members']), 'matches': cluster['matches']}
+        for cluster in clusters.values()
+    ]
+
+def dedupe_providers(records, threshold=DEFAULT_THRESHOLD, strategy='most_reviews', fill_missing=True, report_path=None):
+    """
+    Remove fuzzy duplicates from a list of provider records.
+
+    Returns (deduplicated_records, clusters). Each merged cluster is
+    replaced by a single record at the position of its first member. If
+    report_path is given, an audit report of every merge is written there
+    as JSON.
+    """
+    if strategy not in MERGE_STRATEGIES:
+        raise ValueError(f"Unknown merge strategy {strategy!r}, expected one of {', '.join(MERGE_STRATEGIES)}")
+
+    start = time.perf_counter()
+    clusters = find_duplicates(records, threshold)
+
+    merged = {}
+    dropped = set()
+    audit = []
+    for cluster in clusters:
+        members = [records[i] for i in cluster['members']]
+        survivor = merge_records(members, strategy, fill_missing)
+        merged[cluster['members'][0]] = survivor
+        dropped.update(cluster['members'][1:])
+        audit.append({
+            'kept': survivor.get('name'),
+            'merged': [record.get('name') for record in members],
+            'service_type': survivor.get('service_type'),
+            'matches': [
+                {
+                    'a': records[match['a']].get('name'),
+                    'b': records[match['b']].get('name'),
+                    'block': match['block'],
+                    'similarity': match['similarity']
+                }
+                for match in cluster['matches']
+            ]
+        })
+
+    deduped = [merged.get(i, record) for i, record in enumerate(records) if i not in dropped]
+    elapsed = time.perf_counter() - start
+
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'input_records': len(records),
+                'output_records': len(deduped),
+                'clusters': len(clusters),
+                'threshold': threshold,
+                'strategy': strategy,
+                'seconds': round(elapsed, 3),
+                'merges': audit
+            }, f, indent=2)
+
+    print(f"Deduplication merged {len(records) - len(deduped)} duplicate records in {len(clusters)} clusters ({elapsed:.2f}s)")
+    return deduped, clusters
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge fuzzy duplicate providers in a JSON list of provider records")
+    parser.add_argument("input_file", help="JSON file with a list of provider records")
+    parser.add_argument("--output", help="Where to write the deduplicated records (default: print a summary only)")
+    parser.add_argument("--report", default="dedupe_report.json", help="Where to write the merge audit report")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Name similarity needed to merge records")
+    parser.add_argument("--strategy", choices=MERGE_STRATEGIES, default='most_reviews', help="Which record survives a merge")
+    parser.add_argument("--no-fill", action="store_true", help="Don't fill empty fields of the surviving record from its duplicates")
+    args = parser.parse_args()
+
+    with open(args.input_file, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+
+    deduped, clusters = dedupe_providers(
+        records,
+        threshold=args.threshold,
+        strategy=args.strategy,
+        fill_missing=not args.no_fill,
+        report_path=args.report
+    )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(deduped, f, indent=2)
+        print(f"Wrote {len(deduped)} records to {args.output}")
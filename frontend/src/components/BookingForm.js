@@ -10,6 +10,7 @@ function BookingForm() {
   const queryParams = new URLSearchParams(location.search);
   
   // Get provider details from URL parameters
+  const providerId = queryParams.get('provider_id') || '';
   const providerName = queryParams.get('provider') || '';
   const serviceType = queryParams.get('service') || '';
   const providerPhone = queryParams.get('phone') || '';
@@ -77,21 +78,47 @@ function BookingForm() {
   };
   
   // Handle form submission
-  const handleSubmit = (e) => {
+  const handleSubmit = async (e) => {
     e.preventDefault();
     setIsSubmitting(true);
     setSubmitError('');
     
-    // Simulate API call with timeout
-    setTimeout(() => {
-      setIsSubmitting(false);
+    try {
+      // Get backend URL from environment variable
+      const backendUrl = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8000';
+      
+      // Send the booking request to the API
+      const response = await fetch(`${backendUrl}/bookings`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          provider_id: Number(providerId),
+          name: formData.name,
+          email: formData.email,
+          phone: formData.phone,
+          date: formData.date,
+          time: formData.time,
+          message: formData.message || null
+        })
+      });
+      
+      // Check if the response is ok
+      if (!response.ok) {
+        throw new Error(`API error: ${response.status}`);
+      }
+      
       setSubmitSuccess(true);
       
-      // Reset form after 3 seconds and redirect back to home
+      // Redirect back to home after 3 seconds
       setTimeout(() => {
         navigate('/');
       }, 3000);
-    }, 1500);
+    } catch (err) {
+      console.error('Error submitting booking:', err);
+      setSubmitError(`Failed to send booking request: ${err.message}`);
+    } finally {
+      setIsSubmitting(false);
+    }
   };
   
   return (
@@ -8,6 +8,35 @@ import React, { useState } from 'react';
  * @param {string} props.error - Error message if any
  */
 function ProviderResults({ providers, loading, error }) {
+  // Similar providers per provider id: { loading, providers, error }
+  const [similar, setSimilar] = useState({});
+
+  // Fetch (or hide, if already shown) providers similar to the given provider
+  const toggleSimilar = async (provider) => {
+    if (similar[provider.id]) {
+      setSimilar((current) => {
+        const next = { ...current };
+        delete next[provider.id];
+        return next;
+      });
+      return;
+    }
+
+    setSimilar((current) => ({ ...current, [provider.id]: { loading: true, providers: [], error: null } }));
+    try {
+      const backendUrl = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8000';
+      const response = await fetch(`${backendUrl}/providers/${provider.id}/similar?k=3&same_service_type=true`);
+      if (!response.ok) {
+        throw new Error(`Server responded with status ${response.status}`);
+      }
+      const data = await response.json();
+      setSimilar((current) => ({ ...current, [provider.id]: { loading: false, providers: data.similar, error: null } }));
+    } catch (err) {
+      console.error('Error fetching similar providers:', err);
+      setSimilar((current) => ({ ...current, [provider.id]: { loading: false, providers: [], error: 'Could not load similar providers.' } }));
+    }
+  };
+
   // Helper function to render star rating
   const renderStars = (rating) => {
     const fullStars = Math.floor(rating);
@@ -268,15 +297,55 @@ function ProviderResults({ providers, loading, error }) {
                     </a>
                     
                     <a 
-                      href={`/booking?provider=${encodeURIComponent(provider.name)}&service=${encodeURIComponent(provider.service_type)}&phone=${encodeURIComponent(provider.full_phone || '')}&email=${encodeURIComponent(provider.email || '')}`} 
+                      href={`/booking?provider_id=${provider.id}&provider=${encodeURIComponent(provider.name)}&service=${encodeURIComponent(provider.service_type)}&phone=${encodeURIComponent(provider.full_phone || '')}&email=${encodeURIComponent(provider.email || '')}`} 
                       className="w-full bg-green-600 hover:bg-green-700 text-white py-2 px-4 rounded-md text-sm font-medium transition-colors duration-200 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-green-500 block text-center"
                     >
                       Make Booking
                     </a>
+                    
+                    <button
+                      type="button"
+                      onClick={() => toggleSimilar(provider)}
+                      className="w-full mt-2 bg-white hover:bg-gray-50 text-blue-600 border border-blue-200 py-2 px-4 rounded-md text-sm font-medium transition-colors duration-200 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-blue-500"
+                    >
+                      {similar[provider.id] ? 'Hide Similar Providers' : 'Show Similar Providers'}
+                    </button>
                   </div>
                 </div>
               </div>
               
+              {/* Similar Providers */}
+              {similar[provider.id] && (
+                <div className="mt-4 pt-4 border-t border-gray-200">
+                  <h4 className="text-sm font-semibold text-gray-700 mb-3">Similar Providers</h4>
+                  {similar[provider.id].loading && (
+                    <p className="text-sm text-gray-500">Finding similar providers...</p>
+                  )}
+                  {similar[provider.id].error && (
+                    <p className="text-sm text-red-600">{similar[provider.id].error}</p>
+                  )}
+                  {!similar[provider.id].loading && !similar[provider.id].error && similar[provider.id].providers.length === 0 && (
+                    <p className="text-sm text-gray-500">No similar providers found.</p>
+                  )}
+                  <div className="space-y-2">
+                    {similar[provider.id].providers.map((alternative) => (
+                      <div key={alternative.id} className="bg-gray-50 p-3 rounded-md flex justify-between items-center">
+                        <div>
+                          <span className="text-sm font-medium text-gray-700 block">{alternative.name}</span>
+                          <span className="text-xs text-gray-500 capitalize">{alternative.neighborhood}</span>
+                        </div>
+                        <div className="flex items-center">
+                          {renderStars(alternative.rating)}
+                          <span className="text-xs text-gray-500 ml-1">
+                            {alternative.rating ? alternative.rating.toFixed(1) : 'N/A'}
+                          </span>
+                        </div>
+                      </div>
+                    ))}
+                  </div>
+                </div>
+              )}
+              
               {/* Reviews Section */}
               {provider.reviews && provider.reviews.length > 0 && (
                 <div className="mt-4 pt-4 border-t border-gray-200">
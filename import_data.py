@@ -3,11 +3,15 @@ import os
 import sys
 import re
 
-# Add the current directory to the path so we can import from backend
-sys.path.append('.')
+# Add the backend directory to the path so we can import the database modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
 
 # Import database modules
-from backend.database import Provider, SessionLocal, create_tables
+from sqlalchemy import and_, or_
+
+from database import Provider, SessionLocal, create_tables, make_provider_key, publish_data_change
+from stats import refresh_stats
+from dedupe import dedupe_providers
 
 def categorize_service(business_info):
     """Categorize a business based on its category name and categories list"""
@@ -85,9 +89,9 @@ def main():
     db = SessionLocal()
     
     try:
-        # Process and add each business
-        added_count = 0
         skipped_count = 0
+        records = []
+        added_neighborhoods = set()
         
         for business in data:
             # Skip businesses that are permanently closed
@@ -103,48 +107,53 @@ def main():
                 skipped_count += 1
                 continue
             
-            # Extract neighborhood
-            neighborhood = extract_neighborhood(business)
-            
-            # Format phone number
-            phone = format_phone(business.get('phone', ''))
-            
-            # Get rating
-            rating = business.get('totalScore', 0)
-            
-            # Check if provider already exists
-            existing = db.query(Provider).filter(
-                Provider.name == business.get('title', ''),
-                Provider.service_type == service_type
-            ).first()
+            records.append({
+                "name": business.get('title', ''),
+                "service_type": service_type,
+                "neighborhood": extract_neighborhood(business),
+                "contact": format_phone(business.get('phone', '')),
+                "rating": business.get('totalScore', 0),
+                "postal_code": business.get('postalCode'),
+                "full_phone": business.get('phone')
+            })
+        
+        # Merge fuzzy duplicates (same business under slightly different names)
+        deduped = dedupe_providers(records, report_path="dedupe_report.json")[0]
+        skipped_count += len(records) - len(deduped)
+        
+        # Add each remaining business
+        added_count = 0
+        for record in deduped:
+            # Check if provider already exists (rows loaded before provider keys existed match by name)
+            provider_key = make_provider_key(record['name'], record['service_type'])
+            existing = db.query(Provider).filter(or_(
+                Provider.provider_key == provider_key,
+                and_(Provider.name == record['name'], Provider.service_type == record['service_type'])
+            )).first()
             
             if existing:
                 skipped_count += 1
                 continue
             
-            # Create new provider
-            provider = Provider(
-                name=business.get('title', ''),
-                service_type=service_type,
-                neighborhood=neighborhood,
-                contact=phone,
-                rating=rating
-            )
-            
             # Add to database
-            db.add(provider)
+            db.add(Provider(**record, provider_key=provider_key))
             added_count += 1
+            added_neighborhoods.add(record['neighborhood'])
             
             # Commit in batches to avoid large transactions
             if added_count % 20 == 0:
                 db.commit()
                 print(f"Added {added_count} providers so far...")
         
-        # Final commit
+        # Final commit, refreshing the materialised statistics with it, then
+        # publishing the new rows so running workers drop their caches
+        refresh_stats(db)
         db.commit()
+        if added_count:
+            publish_data_change(added_neighborhoods)
         
         print(f"Successfully added {added_count} new providers to the database")
-        print(f"Skipped {skipped_count} businesses (already exists, closed, or 'other' category)")
+        print(f"Skipped {skipped_count} businesses (already exists, duplicate, closed, or 'other' category)")
         
     except Exception as e:
         print(f"Error: {e}")
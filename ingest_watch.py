@@ -0,0 +1,210 @@
+"""
+Continuous incremental ingestion of scrape dumps.
+
+Watches a directory for dataset*.json files and ingests each new file once:
+transform (process_data), fuzzy dedupe, then upsert by provider key so only
+new or changed providers are written. Processed files are recorded in the
+ingest_ledger table by SHA-256 checksum, so restarts, renames and re-copied
+files are not applied twice. Files that fail to ingest are kept in a
+separate failed list and retried after --retry-interval seconds.
+
+    python ingest_watch.py incoming/ [--pattern "dataset*.json"] [--interval 5] [--retry-interval 60] [--report-dir reports/] [--once]
+
+Uses the watchdog package for filesystem events when it is installed and
+falls back to polling otherwise. Each file reports its throughput
+(records/s) and lag (time from the file being written to it being applied).
+"""
+import argparse
+import fnmatch
+import hashlib
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+# Add the backend directory to the path so we can import the database modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from database import IngestedFile, SessionLocal, create_tables, publish_data_change
+from dedupe import dedupe_providers
+from ingest import upsert_providers
+from process_data import process_data
+from similarity import build_similarity_index
+from stats import refresh_stats
+
+def file_checksum(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+class HotFolder:
+    """Tracks candidate files in a directory and ingests each new one once"""
+
+    def __init__(self, directory, pattern='dataset*.json', engine='rows', report_dir=None, retry_interval=60.0):
+        self.directory = directory
+        self.pattern = pattern
+        self.engine = engine
+        self.report_dir = report_dir
+        self.retry_interval = retry_interval
+        # path -> (size, mtime) seen on the previous scan; a file is only read once it stops changing
+        self.pending = {}
+        # path -> (size, mtime) of files already handled, so unchanged files aren't re-hashed
+        self.handled = {}
+        # path -> {signature, attempts, error, retry_at} for files whose last ingest failed
+        self.failed = {}
+
+    def scan(self):
+        """Ingest every new file whose size and mtime were stable since the last scan"""
+        seen = set()
+        for filename in sorted(os.listdir(self.directory)):
+            if not fnmatch.fnmatch(filename, self.pattern):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            seen.add(path)
+
+            if self.handled.get(path) == signature:
+                continue
+            failure = self.failed.get(path)
+            if failure and failure['signature'] == signature and time.time() < failure['retry_at']:
+                continue
+            if self.pending.get(path) != signature:
+                # New or still being written; check again on the next scan
+                self.pending[path] = signature
+                continue
+
+            del self.pending[path]
+            try:
+                self.ingest_file(path, stat)
+            except Exception as e:
+                attempts = failure['attempts'] + 1 if failure else 1
+                self.failed[path] = {
+                    'signature': signature,
+                    'attempts': attempts,
+                    'error': str(e),
+                    'retry_at': time.time() + self.retry_interval
+                }
+                print(f"Error ingesting {path} (attempt {attempts}, retrying in {self.retry_interval:.0f}s): {e}")
+                continue
+            self.failed.pop(path, None)
+            self.handled[path] = signature
+
+        for path in list(self.pending):
+            if path not in seen:
+                del self.pending[path]
+        for path in list(self.failed):
+            if path not in seen:
+                del self.failed[path]
+
+    def ingest_file(self, path, stat):
+        """Apply one file and record it in the ledger; raises if the file could not be ingested"""
+        checksum = file_checksum(path)
+        db = SessionLocal()
+        try:
+            previous = db.query(IngestedFile).filter(IngestedFile.checksum == checksum).first()
+            if previous:
+                print(f"Skipping {path}: already ingested as {previous.path} at {previous.ingested_at}")
+                return
+
+            start = time.perf_counter()
+            rows = process_data(path, engine=self.engine)
+            report_path = None
+            if self.report_dir:
+                # Kept out of the watched directory so reports are never picked up as scrape dumps
+                os.makedirs(self.report_dir, exist_ok=True)
+                report_path = os.path.join(self.report_dir, os.path.basename(path) + '.dedupe_report.json')
+            rows, _ = dedupe_providers(rows, report_path=report_path)
+            counts = upsert_providers(db, rows)
+            if counts['touched']:
+                refresh_stats(db, counts['touched'])
+            elapsed = time.perf_counter() - start
+
+            db.add(IngestedFile(
+                checksum=checksum,
+                path=path,
+                size=stat.st_size,
+                records=len(rows),
+                inserted=counts['inserted'],
+                updated=counts['updated'],
+                unchanged=counts['unchanged'],
+                seconds=round(elapsed, 3),
+                ingested_at=datetime.utcnow()
+            ))
+            db.commit()
+            if counts['touched']:
+                publish_data_change(pairs=counts['touched'])
+                build_similarity_index()
+
+            lag = time.time() - stat.st_mtime
+            rate = len(rows) / elapsed if elapsed > 0 else float('inf')
+            print(
+                f"Ingested {path}: {len(rows)} records, {counts['inserted']} new, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {counts['skipped']} skipped "
+                f"in {elapsed:.2f}s ({rate:.0f} records/s, lag {lag:.1f}s)"
+            )
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+def watch(folder, interval):
+    """Scan forever, woken early by filesystem events when watchdog is available"""
+    directory, pattern = folder.directory, folder.pattern
+    changed = threading.Event()
+
+    if Observer is not None:
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                changed.set()
+
+        observer = Observer()
+        observer.schedule(Handler(), directory)
+        observer.start()
+        print(f"Watching {directory} for {pattern} (filesystem events, checking at least every {interval}s)")
+    else:
+        print(f"Watching {directory} for {pattern} (polling every {interval}s)")
+
+    while True:
+        folder.scan()
+        # Files must look the same on two scans before they're read, so rescan soon after activity
+        if changed.wait(timeout=interval):
+            changed.clear()
+            time.sleep(min(1.0, interval))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest new scrape dumps from a directory as they arrive")
+    parser.add_argument("directory", help="Directory to watch")
+    parser.add_argument("--pattern", default="dataset*.json", help="Filename pattern of scrape dumps")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between scans")
+    parser.add_argument("--engine", choices=("rows", "columnar"), default="rows", help="Transform engine to use")
+    parser.add_argument("--retry-interval", type=float, default=60.0, help="Seconds before a file that failed is retried")
+    parser.add_argument("--report-dir", help="Directory for per-file dedupe audit reports (default: none)")
+    parser.add_argument("--once", action="store_true", help="Ingest the files currently present and exit")
+    args = parser.parse_args()
+
+    create_tables()
+
+    folder = HotFolder(args.directory, args.pattern, args.engine, args.report_dir, args.retry_interval)
+    if args.once:
+        # Two scans: the first records file sizes, the second ingests files that didn't change
+        folder.scan()
+        folder.scan()
+        if folder.failed:
+            print(f"{len(folder.failed)} files failed: {', '.join(sorted(folder.failed))}")
+            sys.exit(1)
+    else:
+        watch(folder, args.interval)
@@ -4,59 +4,12 @@ import sys
 import re
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from backend.database import Base, Provider
 
-# Define service type categories
-SERVICE_CATEGORIES = {
-    # Auto services
-    'auto': [
-        'car', 'auto', 'mechanic', 'garage', 'tyre', 'tire', 'vehicle', 'mot', 'brake', 
-        'battery', 'transmission', 'exhaust', 'wheel', 'alignment', 'oil change'
-    ],
-    
-    # Home improvement
-    'home_improvement': [
-        'builder', 'construction', 'renovation', 'remodel', 'contractor', 'carpentry', 
-        'painter', 'painting', 'decorator', 'flooring', 'tiling', 'roofing', 'roofer',
-        'kitchen', 'bathroom', 'cabinet', 'drywall', 'insulation', 'handyman'
-    ],
-    
-    # Plumbing
-    'plumber': [
-        'plumb', 'plumbing', 'drain', 'pipe', 'toilet', 'faucet', 'sink', 'water heater'
-    ],
-    
-    # Electrical
-    'electrician': [
-        'electric', 'electrical', 'electrician', 'wiring', 'lighting', 'power'
-    ],
-    
-    # Landscaping/Gardening
-    'gardener': [
-        'garden', 'landscape', 'lawn', 'tree', 'shrub', 'mow', 'yard', 'outdoor', 
-        'plant', 'grass', 'hedge', 'weed'
-    ],
-    
-    # Cleaning
-    'cleaner': [
-        'clean', 'cleaning', 'maid', 'janitorial', 'housekeeping', 'carpet cleaning', 
-        'window cleaning', 'pressure washing'
-    ],
-    
-    # HVAC
-    'hvac': [
-        'hvac', 'heating', 'cooling', 'air conditioning', 'furnace', 'boiler', 
-        'ventilation', 'heat pump'
-    ],
-    
-    # Locksmith
-    'locksmith': [
-        'lock', 'key', 'security', 'door'
-    ],
-    
-    # Other services (default category)
-    'other': []
-}
+# Add the backend directory to the path so we can import the database modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from database import Base, Provider
+from dedupe import dedupe_providers
+from service_categories import SERVICE_CATEGORIES
 
 def categorize_service(business_info):
     """Categorize a business based on its category name and categories list"""
@@ -113,12 +66,25 @@ def format_phone(phone):
     
     return phone
 
-def process_data(input_file):
-    """Process the dataset and return formatted data for the database"""
+def process_data(input_file, engine="rows"):
+    """
+    Process the dataset and return formatted data for the database.
+    
+    engine selects the transform: "rows" (one record at a time) or
+    "columnar" (vectorised Arrow kernels, see columnar_transform.py).
+    Both produce identical output.
+    """
     # Read the JSON data
     with open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
+    if engine == "columnar":
+        from columnar_transform import transform_columnar
+        return transform_columnar(data)
+    return transform_rows(data)
+
+def transform_rows(data):
+    """Transform raw business records into provider rows, one record at a time"""
     formatted_data = []
     
     for business in data:
@@ -148,7 +114,9 @@ def process_data(input_file):
             "service_type": service_type,
             "neighborhood": neighborhood,
             "contact": phone,
-            "rating": rating
+            "rating": rating,
+            "postal_code": business.get('postalCode'),
+            "full_phone": business.get('phone')
         }
         
         formatted_data.append(formatted_entry)
@@ -158,9 +126,9 @@ def process_data(input_file):
 def add_to_database(formatted_data):
     """Add the formatted data to the database"""
     # Import here to avoid circular imports
-    import sys
-    sys.path.append('.')
-    from backend.database import Base, Provider, SessionLocal, engine
+    from sqlalchemy import and_, or_
+    from database import Provider, SessionLocal, make_provider_key, publish_data_change
+    from stats import refresh_stats
     
     # Create session
     db = SessionLocal()
@@ -170,18 +138,22 @@ def add_to_database(formatted_data):
         
         # Add each provider to the database
         added_count = 0
+        added_neighborhoods = set()
         for provider_data in formatted_data:
             try:
-                # Check if provider already exists (by name and service_type)
-                existing = db.query(Provider).filter(
-                    Provider.name == provider_data['name'],
-                    Provider.service_type == provider_data['service_type']
-                ).first()
+                # Check if provider already exists (by provider key, or by name and service_type
+                # for rows loaded before provider keys existed)
+                provider_key = make_provider_key(provider_data['name'], provider_data['service_type'])
+                existing = db.query(Provider).filter(or_(
+                    Provider.provider_key == provider_key,
+                    and_(Provider.name == provider_data['name'], Provider.service_type == provider_data['service_type'])
+                )).first()
                 
                 if not existing:
-                    provider = Provider(**provider_data)
+                    provider = Provider(**provider_data, provider_key=provider_key)
                     db.add(provider)
                     added_count += 1
+                    added_neighborhoods.add(provider_data['neighborhood'])
                     
                     # Commit in batches to avoid large transactions
                     if added_count % 50 == 0:
@@ -191,8 +163,12 @@ def add_to_database(formatted_data):
                 print(f"Error adding provider {provider_data['name']}: {item_error}")
                 continue
         
-        # Final commit for any remaining providers
+        # Final commit for any remaining providers, refreshing the materialised statistics with it
+        # and then publishing the new rows so running workers drop their caches
+        refresh_stats(db)
         db.commit()
+        if added_count:
+            publish_data_change(added_neighborhoods)
         print(f"Successfully added {added_count} new providers to the database")
         
     except Exception as e:
@@ -222,13 +198,22 @@ def print_category_summary(formatted_data):
         print(f"  {neighborhood}: {count} providers")
 
 if __name__ == "__main__":
-    input_file = "dataset.json"
+    import argparse
+    parser = argparse.ArgumentParser(description="Process a scraped dataset and add the providers to the database")
+    parser.add_argument("input_file", nargs="?", default="dataset.json", help="Scraped dataset JSON file")
+    parser.add_argument("--engine", choices=("rows", "columnar"), default="rows", help="Transform engine to use")
+    args = parser.parse_args()
+    input_file = args.input_file
     
     # Process the data
     print(f"Processing data from {input_file}...")
-    formatted_data = process_data(input_file)
+    formatted_data = process_data(input_file, engine=args.engine)
     print(f"Processed {len(formatted_data)} businesses")
     
+    # Merge fuzzy duplicates (same business under slightly different names)
+    formatted_data, _ = dedupe_providers(formatted_data, report_path="dedupe_report.json")
+    print(f"{len(formatted_data)} businesses after deduplication (merges listed in dedupe_report.json)")
+    
     # Print category summary
     print_category_summary(formatted_data)
     
@@ -0,0 +1,75 @@
+"""
+Shared pytest setup: the backend modules read their configuration from the
+environment at import time, so point them at a throwaway SQLite database
+before anything imports them.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "backend"), ROOT]
+
+TEST_DIR = tempfile.mkdtemp(prefix="neighbourhood-pro-finder-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["SEED_LOCK_FILE"] = os.path.join(TEST_DIR, "seed.lock")
+os.environ["SEED_ON_STARTUP"] = "0"
+os.environ["SIMILARITY_INDEX_PATH"] = os.path.join(TEST_DIR, "similarity_index.npz")
+# The API tests issue many requests from one client; admission control has its own tests
+os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+
+# PostgreSQL-only behaviour is tested against this database when it is set, e.g.
+# postgresql+psycopg2://postgres@/postgres?host=/tmp/pgdata. Its public schema is wiped.
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+@pytest.fixture(scope="session")
+def seeded():
+    """Create the tables and load the seed data once for the whole run"""
+    from seed import run_seed
+    run_seed()
+
+@pytest.fixture
+def client(seeded):
+    from fastapi.testclient import TestClient
+    from main import app, query_normalizer, response_cache
+    # Start from what a worker has just after a data version change, so each test's
+    # requests see the data it set up (the version watcher only polls periodically)
+    query_normalizer.loaded = False
+    response_cache.clear()
+    with TestClient(app) as test_client:
+        yield test_client
+    query_normalizer.loaded = False
+    response_cache.clear()
+
+@pytest.fixture
+def fresh_database(seeded, tmp_path, monkeypatch):
+    """Point the database module at a new, empty SQLite database for one test"""
+    import database
+    previous = database.get_engine()
+    monkeypatch.setattr(database, "DATABASE_URL", f"sqlite:///{tmp_path / 'fresh.db'}")
+    monkeypatch.setattr(database, "_engine", None)
+    database.create_tables()
+    yield database.get_engine()
+    database.get_engine().dispose()
+    database._session_factory.configure(bind=previous)
+
+@pytest.fixture
+def postgres_database(seeded, monkeypatch):
+    """Point the database module at an emptied TEST_POSTGRES_URL database for one test"""
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    import database
+    previous = database.get_engine()
+    monkeypatch.setattr(database, "DATABASE_URL", TEST_POSTGRES_URL)
+    monkeypatch.setattr(database, "_engine", None)
+    engine = database.get_engine()
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    database.create_tables()
+    yield engine
+    engine.dispose()
+    database._session_factory.configure(bind=previous)
@@ -0,0 +1,51 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from admission import AdmissionController, AdmissionControlMiddleware, TokenBucket
+
+def make_client(controller):
+    app = FastAPI()
+    app.add_middleware(AdmissionControlMiddleware, controller=controller)
+
+    @app.get("/work")
+    def work():
+        return {"ok": True}
+
+    @app.get("/ping")
+    def ping():
+        return {"status": "ok"}
+
+    return TestClient(app)
+
+def test_token_bucket_allows_bursts_then_waits():
+    bucket = TokenBucket(rate=1, capacity=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert 0 < bucket.take() <= 1
+
+def test_clients_over_their_rate_get_429_with_retry_after():
+    controller = AdmissionController(rate=0.5, burst=2, max_in_flight=0)
+    client = make_client(controller)
+    assert client.get("/work").status_code == 200
+    assert client.get("/work").status_code == 200
+    response = client.get("/work")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    # Health checks are never rate limited
+    assert client.get("/ping").status_code == 200
+    assert controller.snapshot()["rejected_rate_limited"] == 1
+
+def test_requests_over_the_in_flight_cap_are_shed():
+    controller = AdmissionController(rate=0, burst=0, max_in_flight=1)
+    client = make_client(controller)
+    controller.in_flight = 1
+    response = client.get("/work")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    controller.in_flight = 0
+    assert client.get("/work").status_code == 200
+    assert controller.snapshot()["admitted"] == 1
+    assert controller.snapshot()["rejected_overloaded"] == 1
+
+def test_metrics_reports_admission_counters(client):
+    assert "admitted" in client.get("/metrics").json()["admission"]
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+from sqlalchemy import func
+
+from analytics_snapshot import SnapshotReader, export_snapshot
+from database import Provider, SessionLocal
+
+@pytest.mark.parametrize("file_format", ["arrow", "parquet"])
+def test_snapshot_summaries_match_the_database(seeded, tmp_path, file_format):
+    counts = export_snapshot(str(tmp_path), file_format)
+    db = SessionLocal()
+    try:
+        by_service = dict(db.query(Provider.service_type, func.count(Provider.id)).group_by(Provider.service_type).all())
+        five_star = db.query(func.sum(Provider.five_star)).scalar() or 0
+    finally:
+        db.close()
+
+    reader = SnapshotReader(str(tmp_path))
+    assert counts["providers"] == sum(by_service.values())
+    assert dict(reader.counts_by("service_type")) == by_service
+    assert reader.star_distribution()["five_star"] == five_star
+    assert reader.read("reviews").num_rows == counts["reviews"]
+
+def test_reader_only_opens_files_listed_in_the_manifest(seeded, tmp_path):
+    export_snapshot(str(tmp_path))
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    first = manifest["files"]["providers"][0]["path"]
+    # A leftover file from an interrupted export must not be read
+    (tmp_path / first).with_name("part-1.arrow").write_bytes(b"not an arrow file")
+    (tmp_path / "providers" / "service_type=stray").mkdir()
+    reader = SnapshotReader(str(tmp_path))
+    assert reader.read("providers").num_rows == manifest["providers"]
+
+def test_empty_table_exports_and_reads(fresh_database, tmp_path):
+    counts = export_snapshot(str(tmp_path / "snapshot"))
+    assert counts == {"providers": 0, "reviews": 0}
+    reader = SnapshotReader(str(tmp_path / "snapshot"))
+    assert reader.read("providers").num_rows == 0
+    assert reader.counts_by("neighborhood") == []
+    assert reader.star_distribution()["one_star"] == 0
+    assert reader.rating_histogram() == []
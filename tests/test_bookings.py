@@ -0,0 +1,76 @@
+import asyncio
+import os
+import runpy
+
+import uvicorn
+
+from bookings import BookingQueue
+from database import Booking, Provider, SessionLocal, seed_database
+
+BOOKING = {
+    "name": "Sam Taylor",
+    "email": "sam@example.com",
+    "phone": "020 7946 0000",
+    "date": "2024-07-01",
+    "time": "10:00",
+    "message": "Leaking tap"
+}
+
+def first_provider_id():
+    db = SessionLocal()
+    try:
+        return db.query(Provider.id).order_by(Provider.id).first()[0]
+    finally:
+        db.close()
+
+def test_booking_is_committed_before_the_response(client):
+    provider_id = first_provider_id()
+    response = client.post("/bookings", json={**BOOKING, "provider_id": provider_id})
+    assert response.status_code == 201
+    db = SessionLocal()
+    try:
+        booking = db.get(Booking, response.json()["id"])
+        assert booking.provider_id == provider_id
+        assert booking.message == "Leaking tap"
+    finally:
+        db.close()
+
+def test_booking_for_an_unknown_provider_is_404(client):
+    response = client.post("/bookings", json={**BOOKING, "provider_id": 10 ** 9})
+    assert response.status_code == 404
+
+def test_concurrent_bookings_are_group_committed(seeded):
+    provider_id = first_provider_id()
+    queue = BookingQueue(batch_size=10, flush_interval=0.05, max_size=100, wait_for_commit=True)
+
+    async def run():
+        queue.start()
+        futures = [queue.submit({**BOOKING, "provider_id": provider_id}) for _ in range(25)]
+        ids = await asyncio.gather(*futures)
+        await queue.stop()
+        return ids
+
+    ids = asyncio.run(run())
+    assert len(set(ids)) == 25
+    assert queue.snapshot()["written"] == 25
+    assert queue.snapshot()["batches"] == 3
+
+def test_reseeding_detaches_bookings_from_removed_providers(client):
+    provider_id = first_provider_id()
+    booking_id = client.post("/bookings", json={**BOOKING, "provider_id": provider_id}).json()["id"]
+    seed_database(force=True)
+    db = SessionLocal()
+    try:
+        booking = db.get(Booking, booking_id)
+        assert booking.provider_id is None
+        assert booking.provider_name
+    finally:
+        db.close()
+
+def test_running_main_starts_uvicorn(monkeypatch):
+    calls = []
+    monkeypatch.setattr(uvicorn, "run", lambda *args, **kwargs: calls.append(args))
+    module = runpy.run_path(os.path.join(os.path.dirname(__file__), "..", "backend", "main.py"), run_name="__main__")
+    assert calls == [("main:app",)]
+    booking_routes = [route for route in module["app"].routes if getattr(route, "path", None) == "/bookings"]
+    assert len(booking_routes) == 1
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import main
+import partitioning
+from database import Provider, ProviderStat, SessionLocal, get_data_changes
+
+HEADERS = {"Authorization": "Bearer secret"}
+
+def ndjson(*records):
+    return "\n".join(json.dumps(record) for record in records) + "\n"
+
+def providers():
+    db = SessionLocal()
+    try:
+        return {provider.provider_key: (provider.id, provider.neighborhood, provider.rating)
+                for provider in db.query(Provider).order_by(Provider.id)}
+    finally:
+        db.close()
+
+def stat(service_type, neighborhood):
+    db = SessionLocal()
+    try:
+        row = db.get(ProviderStat, (service_type, neighborhood))
+        return row.provider_count if row else 0
+    finally:
+        db.close()
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+
+def test_requires_the_admin_token(client, admin):
+    response = client.post("/admin/providers:bulkUpsert", content=ndjson({}))
+    assert response.status_code == 401
+
+def test_inserts_updates_and_reports_invalid_lines(fresh_database, admin, client):
+    plumber = {"name": "Pipe Works", "service_type": "Plumber", "neighborhood": "northam", "rating": 4.0}
+    body = ndjson(plumber, {"name": "No Area", "service_type": "plumber"}, {**plumber, "rating": 4.5})
+    response = client.post("/admin/providers:bulkUpsert", content=body, headers=HEADERS).json()
+    assert (response["inserted"], response["updated"], response["invalid"]) == (1, 1, 1)
+    assert [result["status"] for result in response["results"]] == ["inserted", "invalid", "updated"]
+    assert providers() == {"plumber:pipe works": (response["results"][0]["id"], "northam", 4.5)}
+    assert stat("plumber", "northam") == 1
+
+    # The version published after the batch names only the pairs it touched
+    version, _ = get_data_changes(None)
+    client.post("/admin/providers:bulkUpsert", content=ndjson({**plumber, "rating": 3.0}), headers=HEADERS)
+    assert get_data_changes(version)[1] == {("plumber", "northam")}
+
+def test_moves_between_partitions_on_postgres(postgres_database, admin, client, monkeypatch):
+    monkeypatch.setattr(partitioning, "PARTITION_MODE", "neighborhood")
+    plumber = {"name": "Pipe Works", "service_type": "plumber", "neighborhood": "northam", "rating": 4.0}
+    other = {"name": "Sparky", "service_type": "electrician", "neighborhood": "south end", "rating": 3.0}
+    first = client.post("/admin/providers:bulkUpsert", content=ndjson(plumber, other), headers=HEADERS).json()
+    assert first["inserted"] == 2
+    partitioning.migrate_postgres(postgres_database)
+    assert partitioning.is_partitioned(postgres_database)
+
+    moved = client.post("/admin/providers:bulkUpsert", headers=HEADERS,
+                        content=ndjson({**plumber, "neighborhood": "south end", "rating": 5.0})).json()
+    assert moved["updated"] == 1
+    rows = providers()
+    assert rows["plumber:pipe works"] == (first["results"][0]["id"], "south end", 5.0)
+    assert len(rows) == 2
+    assert (stat("plumber", "northam"), stat("plumber", "south end")) == (0, 1)
+    params = {"service_type": "plumber", "neighborhood": "south end"}
+    assert [p["name"] for p in client.get("/recommendations", params=params).json()["providers"]] == ["Pipe Works"]
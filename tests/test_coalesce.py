@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+import pytest
+
+from coalesce import SingleFlight
+
+def test_concurrent_calls_with_the_same_key_share_one_execution():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_query(value):
+        calls.append(value)
+        release.wait(5)
+        return [value]
+
+    async def run():
+        waiters = [asyncio.ensure_future(flights.do("key", slow_query, 1)) for _ in range(5)]
+        other = asyncio.ensure_future(flights.do("other", slow_query, 2))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*waiters), await other
+
+    results, other = asyncio.run(run())
+    assert results == [[1]] * 5
+    assert all(result is results[0] for result in results)
+    assert other == [2]
+    assert sorted(calls) == [1, 2]
+    assert flights.snapshot() == {"executions": 2, "coalesced": 4, "in_flight_keys": 0}
+
+def test_errors_are_shared_and_not_cached():
+    flights = SingleFlight()
+
+    def failing():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(flights.do("key", failing))
+    assert asyncio.run(flights.do("key", lambda: "recovered")) == "recovered"
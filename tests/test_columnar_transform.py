@@ -0,0 +1,34 @@
+from columnar_transform import synthetic_records, transform_columnar
+from process_data import transform_rows
+
+def test_columnar_output_matches_row_wise_output():
+    records = synthetic_records(2000)
+    assert transform_columnar(records) == transform_rows(records)
+
+def test_edge_cases_match_row_wise_output():
+    records = [
+        {"title": "No fields"},
+        {"title": "Nulls", "categoryName": "Shop", "categories": [], "city": None, "address": None, "phone": None},
+        {"title": "Closed", "categoryName": "Plumber", "permanentlyClosed": True},
+        {"title": "Address only", "categoryName": "Tree surgeon", "address": "1 High St,\t Caversham ,RG4 8AA"},
+        {"title": "One part address", "categoryName": "Bakery", "address": "Reading"},
+        {"title": "Neighbourhood wins", "categoryName": "Locksmith", "neighborhood": "Earley", "city": "Reading"},
+        {"title": "Second category", "categoryName": "Shop", "categories": ["Shop", "Boiler repair"]},
+        {"title": "Precedence", "categoryName": "Garden centre", "categories": ["Car park"]},
+        {"title": "Short phone", "categoryName": "Painter", "phone": "12-34"},
+        {"title": "Phone", "categoryName": "Painter", "phone": "+44 (0)118 496 0123"},
+        # Non-ASCII text goes through the row-wise functions: the Kelvin sign lowercases to "k"
+        {"title": "Kelvin", "categoryName": "\u212aey cutting", "city": "École", "phone": "١٢٣٤٥٦٧"},
+        {"title": "Unicode space", "categoryName": "Electrician", "address": "1 Rue, Montmartre ,Paris"},
+    ]
+    expected = transform_rows(records)
+    assert transform_columnar(records) == expected
+    assert expected[9]["service_type"] == "locksmith"
+
+def test_batches_that_do_not_fit_the_columns_use_the_row_wise_transform():
+    records = [{"title": "Odd flag", "categoryName": "Plumber", "permanentlyClosed": "yes"}] + synthetic_records(10)
+    assert transform_columnar(records) == transform_rows(records)
+
+def test_empty_and_all_closed_batches():
+    assert transform_columnar([]) == []
+    assert transform_columnar([{"title": "Gone", "permanentlyClosed": True}]) == []
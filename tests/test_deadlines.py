@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+import deadlines
+from deadlines import DeadlineMiddleware, DeadlineStats, deadline_for, install_statement_timeouts
+
+# A statement that runs for far longer than any test deadline
+SLOW_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) SELECT count(*) FROM n"
+
+@pytest.fixture
+def deadline():
+    """Run the test body as if inside a request with the given seconds left"""
+    tokens = []
+
+    def start(seconds):
+        tokens.append(deadlines._deadline.set(time.monotonic() + seconds))
+
+    yield start
+    for token in reversed(tokens):
+        deadlines._deadline.reset(token)
+
+def busy_timeout(conn):
+    return conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+
+def test_endpoint_deadlines():
+    assert deadline_for("/ping") == 0
+    assert deadline_for("/export/providers") == 0
+    assert deadline_for("/recommendations") == deadlines.REQUEST_DEADLINE_SECONDS
+
+def test_sqlite_statements_stop_at_the_deadline(tmp_path, deadline):
+    engine = create_engine(f"sqlite:///{tmp_path / 'slow.db'}")
+    install_statement_timeouts(engine)
+    deadline(0.2)
+    start = time.monotonic()
+    with pytest.raises(OperationalError, match="interrupted"):
+        with engine.connect() as conn:
+            conn.exec_driver_sql(SLOW_QUERY)
+    assert time.monotonic() - start < 5
+    engine.dispose()
+
+def test_sqlite_busy_timeout_is_capped_per_checkout_and_restored(tmp_path, deadline):
+    engine = create_engine(f"sqlite:///{tmp_path / 'busy.db'}", pool_size=1)
+    install_statement_timeouts(engine)
+    with engine.connect() as conn:
+        default = busy_timeout(conn)
+    deadline(2)
+    with engine.connect() as conn:
+        assert 0 < busy_timeout(conn) <= 2000
+    deadlines._deadline.set(None)
+    with engine.connect() as conn:
+        assert busy_timeout(conn) == default
+    engine.dispose()
+
+def test_listeners_are_only_added_to_the_given_engine(tmp_path, deadline):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    other = create_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    install_statement_timeouts(engine)
+    deadline(0.2)
+    time.sleep(0.3)
+    # The deadline has passed, but the other engine's statements are not interrupted
+    with other.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+    with pytest.raises(OperationalError, match="interrupted"):
+        with engine.connect() as conn:
+            conn.exec_driver_sql(SLOW_QUERY)
+    engine.dispose()
+    other.dispose()
+
+def test_postgres_timeout_is_set_once_per_transaction(deadline):
+    if not os.environ.get("TEST_POSTGRES_URL"):
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    install_statement_timeouts(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    deadline(3)
+    with engine.begin() as conn:
+        timeout = conn.exec_driver_sql("SHOW statement_timeout").scalar()
+        conn.exec_driver_sql("SELECT 1")
+        conn.exec_driver_sql("SELECT 2")
+    assert timeout != "0"
+    assert sum(statement.startswith("SET LOCAL statement_timeout") for statement in statements) == 1
+    engine.dispose()
+
+def test_middleware_answers_504_after_the_deadline(monkeypatch):
+    monkeypatch.setattr(deadlines, "ENDPOINT_DEADLINES", [("/slow", 0.05)])
+    stats = DeadlineStats()
+    messages = []
+
+    async def slow_app(scope, receive, send):
+        await asyncio.sleep(1)
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/slow", "headers": []}
+    asyncio.run(DeadlineMiddleware(slow_app, stats)(scope, None, send))
+    assert messages[0]["status"] == 504
+    assert stats.timeouts == {"/slow": 1}
+
+def test_connections_opened_before_the_listeners_are_capped_and_restored(tmp_path, deadline):
+    engine = create_engine(f"sqlite:///{tmp_path / 'early.db'}", pool_size=1)
+    with engine.connect() as conn:
+        default = busy_timeout(conn)
+    install_statement_timeouts(engine)
+    deadline(2)
+    with engine.connect() as conn:
+        assert 0 < busy_timeout(conn) <= 2000
+    deadlines._deadline.set(None)
+    with engine.connect() as conn:
+        assert busy_timeout(conn) == default
+    engine.dispose()
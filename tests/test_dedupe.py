@@ -0,0 +1,64 @@
+import json
+
+import import_data
+from database import Provider, SessionLocal
+from dedupe import MAX_BLOCK_SIZE, dedupe_providers, find_duplicates
+
+def record(name, postal_code=None, phone=None, reviews_count=0, service_type="auto"):
+    return {
+        "name": name,
+        "service_type": service_type,
+        "postal_code": postal_code,
+        "full_phone": phone,
+        "reviews_count": reviews_count
+    }
+
+def test_name_variants_of_one_business_are_merged(tmp_path):
+    records = [
+        record("Bosch Car Service - R.A. Engineering", "SW1A 1AA", "020 7946 0001", reviews_count=3),
+        record("Bosch Car Service RA Engineering Ltd", "SW1A1AA", None, reviews_count=40),
+        record("Brixton Tyres", "SW2 1AA", "020 7946 0002"),
+    ]
+    report = tmp_path / "report.json"
+    deduped, clusters = dedupe_providers(records, report_path=str(report))
+    assert [r["name"] for r in deduped] == ["Bosch Car Service RA Engineering Ltd", "Brixton Tyres"]
+    # The survivor keeps the phone number of the record it absorbed
+    assert deduped[0]["full_phone"] == "020 7946 0001"
+    assert json.loads(report.read_text())["clusters"] == 1
+
+def test_records_in_different_postcodes_are_never_merged():
+    records = [
+        record("Kwik Fit", "SW1A 1AA", "020 7946 0003"),
+        record("Kwik Fit", None, "020 7946 0003"),
+        record("Kwik Fit", "N1 9GU", "020 7946 0003"),
+    ]
+    clusters = find_duplicates(records)
+    assert len(clusters) == 1
+    assert 2 not in clusters[0]["members"]
+
+def test_skipped_oversized_blocks_are_logged(capsys):
+    # Different businesses sharing one switchboard number
+    records = [record(f"Garage {i} Motors {i * 7}", phone="020 7946 0004") for i in range(MAX_BLOCK_SIZE + 1)]
+    find_duplicates(records)
+    assert f"({MAX_BLOCK_SIZE + 1} records not compared within them)" in capsys.readouterr().out
+
+def test_import_data_merges_duplicates_before_loading(seeded, tmp_path, monkeypatch):
+    business = {
+        "title": "Dedupe Test Plumbing Ltd",
+        "categoryName": "Plumber",
+        "city": "Dedupeville",
+        "phone": "+44 20 7946 0005",
+        "postalCode": "E1 6AN",
+        "totalScore": 4.5
+    }
+    dataset = [business, {**business, "title": "Dedupe Test Plumbing"}]
+    (tmp_path / "dataset.json").write_text(json.dumps(dataset))
+    monkeypatch.chdir(tmp_path)
+    import_data.main()
+    db = SessionLocal()
+    try:
+        names = [name for (name,) in db.query(Provider.name).filter(Provider.neighborhood == "dedupeville")]
+    finally:
+        db.close()
+    assert len(names) == 1
+    assert (tmp_path / "dedupe_report.json").exists()
@@ -0,0 +1,39 @@
+import csv
+import gzip
+import io
+import json
+
+from sqlalchemy import func
+
+import export
+from database import Provider, SessionLocal
+
+def provider_count():
+    db = SessionLocal()
+    try:
+        return db.query(func.count(Provider.id)).scalar()
+    finally:
+        db.close()
+
+def test_ndjson_export_streams_every_provider(client, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 50)
+    response = client.get("/export/providers")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == provider_count()
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+
+def test_csv_export_is_gzipped_when_accepted(client):
+    response = client.get("/export/providers", params={"format": "csv"}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == export.CSV_COLUMNS
+    assert len(rows) - 1 == provider_count()
+
+def test_gzip_chunks_round_trip():
+    chunks = [b"first chunk\n", b"", b"second chunk\n"]
+    compressed = b"".join(export.gzip_chunks(iter(chunks)))
+    assert gzip.decompress(compressed) == b"".join(chunks)
+
+def test_unknown_export_format_is_rejected(client):
+    assert client.get("/export/providers", params={"format": "xml"}).status_code == 422
@@ -0,0 +1,85 @@
+import json
+
+import ingest_watch
+from database import IngestedFile, Provider, SessionLocal
+from ingest import upsert_providers
+from ingest_watch import HotFolder
+
+BUSINESSES = [
+    {"title": "Hot Folder Plumbing", "categoryName": "Plumber", "city": "Watchford", "phone": "0118 496 0100", "totalScore": 4.1},
+    {"title": "Hot Folder Sparks", "categoryName": "Electrician", "city": "Watchford", "phone": "0118 496 0200", "totalScore": 4.6},
+]
+
+def write_dump(path, businesses=BUSINESSES):
+    path.write_text(json.dumps(businesses))
+
+def providers():
+    db = SessionLocal()
+    try:
+        return {provider.name: provider.rating for provider in db.query(Provider).filter(Provider.neighborhood == "watchford")}
+    finally:
+        db.close()
+
+def test_upsert_only_writes_new_or_changed_providers(fresh_database):
+    row = {"name": "Upsert Co", "service_type": "plumber", "neighborhood": "watchford", "rating": 4.0}
+    db = SessionLocal()
+    try:
+        assert upsert_providers(db, [row])["inserted"] == 1
+        db.commit()
+        assert upsert_providers(db, [row])["unchanged"] == 1
+        counts = upsert_providers(db, [{**row, "neighborhood": "elsewhere"}, {**row, "name": ""}])
+        db.commit()
+    finally:
+        db.close()
+    assert counts["updated"] == 1
+    assert counts["skipped"] == 1
+    assert counts["touched"] == {("plumber", "watchford"), ("plumber", "elsewhere")}
+
+def test_stable_files_are_ingested_once(fresh_database, tmp_path):
+    write_dump(tmp_path / "dataset-1.json")
+    folder = HotFolder(str(tmp_path))
+    folder.scan()
+    assert providers() == {}
+    folder.scan()
+    assert providers() == {"Hot Folder Plumbing": 4.1, "Hot Folder Sparks": 4.6}
+
+    # The same dump under another name is recognised by its checksum
+    write_dump(tmp_path / "dataset-2.json")
+    folder.scan()
+    folder.scan()
+    db = SessionLocal()
+    try:
+        assert db.query(IngestedFile).count() == 1
+    finally:
+        db.close()
+
+def test_failed_files_are_retried(fresh_database, tmp_path, monkeypatch):
+    write_dump(tmp_path / "dataset-1.json")
+    calls = []
+    process_data = ingest_watch.process_data
+
+    def flaky_process_data(path, engine):
+        calls.append(path)
+        if len(calls) == 1:
+            raise OSError("share went away")
+        return process_data(path, engine=engine)
+
+    monkeypatch.setattr(ingest_watch, "process_data", flaky_process_data)
+    folder = HotFolder(str(tmp_path), retry_interval=0)
+    folder.scan()
+    folder.scan()
+    assert folder.failed[str(tmp_path / "dataset-1.json")]["attempts"] == 1
+    assert providers() == {}
+
+    folder.scan()
+    folder.scan()
+    assert folder.failed == {}
+    assert len(calls) == 2
+    assert providers() == {"Hot Folder Plumbing": 4.1, "Hot Folder Sparks": 4.6}
+
+def test_failed_files_wait_for_the_retry_interval(fresh_database, tmp_path):
+    (tmp_path / "dataset-1.json").write_text("{not json")
+    folder = HotFolder(str(tmp_path), retry_interval=3600)
+    for _ in range(4):
+        folder.scan()
+    assert folder.failed[str(tmp_path / "dataset-1.json")]["attempts"] == 1
@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import insert
+
+from database import Provider, SessionLocal
+from stats import refresh_stats
+
+PROVIDERS = [
+    ("North A", "northam", 4.9), ("North B", "northam", 4.1), ("North C", "northam", None),
+    ("East A", "easton", 4.7), ("East B", "easton", 3.2),
+    ("West A", "weston", 4.5), ("West B", "weston", None),
+]
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def providers(request):
+    request.getfixturevalue("fresh_database" if request.param == "sqlite" else "postgres_database")
+    db = SessionLocal()
+    try:
+        db.execute(insert(Provider), [
+            {"name": name, "service_type": "plumber", "neighborhood": neighborhood, "rating": rating,
+             "provider_key": f"plumber:{name.lower()}"}
+            for name, neighborhood, rating in PROVIDERS
+        ])
+        refresh_stats(db)
+        db.commit()
+    finally:
+        db.close()
+
+def search(client, **params):
+    return client.get("/recommendations", params={"service_type": "plumber", **params}).json()
+
+def test_neighbourhoods_are_merged_in_rank_order(providers, client):
+    response = search(client, neighborhood=["northam", "easton,weston"])
+    assert [provider["name"] for provider in response["providers"]] == [
+        "North A", "East A", "West A", "North B", "East B", "North C", "West B"
+    ]
+    assert [provider["rank"] for provider in response["providers"]] == list(range(1, 8))
+    assert response["canonical"]["neighborhood"] == ["northam", "easton", "weston"]
+
+def test_open_search_pages_through_every_neighbourhood(providers, client):
+    first = search(client, limit=3)
+    second = search(client, limit=3, offset=3)
+    last = search(client, limit=3, offset=6)
+    assert [provider["name"] for provider in first["providers"]] == ["North A", "East A", "West A"]
+    assert [provider["rank"] for provider in second["providers"]] == [4, 5, 6]
+    assert first["has_more"] and second["has_more"] and not last["has_more"]
+    assert [provider["name"] for provider in last["providers"]] == ["West B"]
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import insert, text, update
+
+import main
+import partitioning
+from database import Provider, SessionLocal, publish_data_change
+from stats import refresh_stats
+
+ROWS = [
+    {"name": "North Plumbing", "service_type": "plumber", "neighborhood": "northam", "rating": 4.5, "provider_key": "plumber:north plumbing"},
+    {"name": "North Sparks", "service_type": "electrician", "neighborhood": "northam", "rating": 4.0, "provider_key": "electrician:north sparks"},
+    {"name": "South Plumbing", "service_type": "plumber", "neighborhood": "south end", "rating": 3.5, "provider_key": "plumber:south plumbing"},
+]
+
+@pytest.fixture
+def partitioned(monkeypatch, tmp_path):
+    monkeypatch.setattr(partitioning, "PARTITION_MODE", "neighborhood")
+    monkeypatch.setattr(partitioning, "PARTITION_DIR", str(tmp_path / "partitions"))
+
+def add_rows(rows=ROWS):
+    db = SessionLocal()
+    try:
+        db.execute(insert(Provider), rows)
+        refresh_stats(db)
+        db.commit()
+    finally:
+        db.close()
+
+def test_partition_names_are_identifier_safe_and_distinct():
+    assert partitioning.partition_name("South End").startswith("providers_p_south_end_")
+    assert partitioning.partition_name("south-end") != partitioning.partition_name("south end")
+
+def test_recommendations_are_read_from_the_neighbourhood_file(fresh_database, partitioned, client):
+    add_rows()
+    assert partitioning.rebuild_sqlite_partitions() == 2
+
+    # Changes to the main table are only served once the partition is refreshed
+    db = SessionLocal()
+    try:
+        db.execute(update(Provider).where(Provider.name == "North Plumbing").values(rating=1.0))
+        db.commit()
+    finally:
+        db.close()
+    params = {"service_type": "plumber", "neighborhood": "northam"}
+    assert client.get("/recommendations", params=params).json()["providers"][0]["rating"] == 4.5
+    publish_data_change(["northam"])
+    # What the version watcher does once it sees the new version
+    main.response_cache.clear()
+    assert client.get("/recommendations", params=params).json()["providers"][0]["rating"] == 1.0
+
+def test_unbuilt_partitions_fall_back_to_the_main_database(fresh_database, partitioned):
+    add_rows()
+    db = partitioning.session_for_neighborhood("northam")
+    try:
+        assert db.get_bind() is fresh_database
+    finally:
+        db.close()
+
+def test_removed_neighbourhoods_lose_their_files(fresh_database, partitioned):
+    add_rows()
+    partitioning.rebuild_sqlite_partitions()
+    db = SessionLocal()
+    try:
+        db.query(Provider).filter(Provider.neighborhood == "south end").delete()
+        db.commit()
+    finally:
+        db.close()
+    partitioning.rebuild_sqlite_partitions()
+    assert partitioning._partition_engine(partitioning.partition_path("south end")) is None
+    assert partitioning._partition_engine(partitioning.partition_path("northam")) is not None
+
+def test_postgres_migration_prunes_to_one_partition(postgres_database):
+    add_rows()
+    partitioning.migrate_postgres(postgres_database)
+    assert partitioning.is_partitioned(postgres_database)
+
+    with postgres_database.begin() as conn:
+        plan = "\n".join(row[0] for row in conn.execute(text(
+            "EXPLAIN SELECT * FROM providers WHERE service_type = 'plumber' AND neighborhood = 'northam'"
+        )))
+        assert partitioning.partition_name("northam") in plan
+        assert partitioning.partition_name("south end") not in plan
+        # Sort indexes keep their DESC NULLS LAST order on the partitioned table
+        definition = conn.execute(text(
+            "SELECT indexdef FROM pg_indexes WHERE indexname = 'ix_providers_service_neighborhood_reviews'"
+        )).scalar()
+        assert "reviews_count DESC NULLS LAST, rating DESC NULLS LAST" in definition
+
+    # New neighbourhoods land in the default partition until the next migrate
+    add_rows([{**ROWS[0], "neighborhood": "westbury", "provider_key": "plumber:west plumbing"}])
+    partitioning.split_default_partition(postgres_database)
+    with postgres_database.connect() as conn:
+        assert partitioning.partition_name("westbury") in partitioning._partition_tables(conn)
+        assert conn.execute(text(f"SELECT count(*) FROM {partitioning.DEFAULT_PARTITION}")).scalar() == 0
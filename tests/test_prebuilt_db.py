@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+from startup_profile import BACKEND_DIR
+
+SERVE = """
+import json
+from fastapi.testclient import TestClient
+import database, main
+with TestClient(main.app) as client:
+    providers = client.get("/recommendations", params={"service_type": "plumber", "neighborhood": "reading"}).json()["providers"]
+    booking = client.post("/bookings", json={"provider_id": 1, "name": "A", "email": "a@example.com", "phone": "1", "date": "2030-01-01", "time": "10:00"})
+print(json.dumps({"url": str(database.get_engine().url), "providers": len(providers), "booking": booking.status_code}))
+"""
+
+def run(args, tmp_path, **env):
+    environment = {**os.environ, "SIMILARITY_INDEX_PATH": str(tmp_path / "similarity_index.npz"),
+                   "SEED_LOCK_FILE": str(tmp_path / "seed.lock"), **env}
+    result = subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, env=environment, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+def test_prebuilt_snapshot_is_served_read_only(tmp_path):
+    snapshot = tmp_path / "providers.db"
+    run(["prebuilt_db.py", "-o", str(snapshot), "--workers", "1"], tmp_path)
+    assert not (tmp_path / "providers.db.building").exists()
+    before = snapshot.stat()
+
+    output = run(["-c", SERVE], tmp_path, PREBUILT_DB_PATH=str(snapshot), DATABASE_URL="sqlite:///unused.db")
+    served = json.loads(output.strip().splitlines()[-1])
+    assert "immutable=1" in served["url"] and "mode=ro" in served["url"]
+    assert served["providers"] > 0
+    assert served["booking"] == 503
+    assert (snapshot.stat().st_size, snapshot.stat().st_mtime) == (before.st_size, before.st_mtime)
+    assert not os.path.exists(os.path.join(BACKEND_DIR, "unused.db"))
@@ -0,0 +1,36 @@
+from query_normalizer import QueryNormalizer, normalise_term
+
+def normalizer():
+    query_normalizer = QueryNormalizer()
+    query_normalizer.build(["plumber", "electrician", "handyman"], ["reading", "caversham heights"])
+    return query_normalizer
+
+def test_normalise_term():
+    assert normalise_term(" Home-Improvement ") == "home improvement"
+    assert normalise_term(None) == ""
+
+def test_service_aliases():
+    query_normalizer = normalizer()
+    assert query_normalizer.service_type("Plumbing") == "plumber"
+    assert query_normalizer.service_type("electricians") == "electrician"
+    # home_improvement is stored under its "handyman" keyword
+    assert query_normalizer.service_type("home improvement") == "handyman"
+    assert query_normalizer.service_type("blocked toilet repair") == "plumber"
+    assert query_normalizer.service_type("astronaut") is None
+
+def test_neighbourhood_aliases():
+    query_normalizer = normalizer()
+    assert query_normalizer.neighborhood("Reading ") == "reading"
+    assert query_normalizer.neighborhood("Caversham-Heights") == "caversham heights"
+    assert query_normalizer.neighborhood("cavershamheights") == "caversham heights"
+    assert query_normalizer.neighborhood("atlantis") is None
+
+def test_loads_from_the_database_on_first_use(seeded):
+    query_normalizer = QueryNormalizer()
+    assert query_normalizer.service_type("Plumbing") == "plumber"
+    assert query_normalizer.loaded
+    assert query_normalizer.neighborhood_aliases
+
+def test_recommendations_report_canonical_terms(client):
+    response = client.get("/recommendations", params={"service_type": "Plumbing", "neighborhood": "atlantis"}).json()
+    assert response == {"providers": [], "has_more": False, "canonical": {"service_type": "plumber", "neighborhood": None}}
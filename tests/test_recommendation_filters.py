@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import insert, select, text
+
+import main
+from database import Provider, SessionLocal
+from stats import refresh_stats
+
+PROVIDERS = [
+    {"name": "Unrated", "rating": None, "reviews_count": None, "website": None, "full_phone": "0118 496 0000"},
+    {"name": "Good", "rating": 4.2, "reviews_count": 30, "website": "https://good.example", "full_phone": None},
+    {"name": "Best", "rating": 4.9, "reviews_count": 5, "website": "", "full_phone": "0118 496 0001"},
+    {"name": "Busy", "rating": 3.1, "reviews_count": 300, "website": "https://busy.example", "full_phone": "0118 496 0002"},
+]
+
+@pytest.fixture
+def pair(fresh_database):
+    db = SessionLocal()
+    try:
+        db.execute(insert(Provider), [
+            {**provider, "service_type": "plumber", "neighborhood": "filterton"} for provider in PROVIDERS
+        ])
+        refresh_stats(db)
+        db.commit()
+    finally:
+        db.close()
+    return {"service_type": "plumber", "neighborhood": "filterton"}
+
+def names(client, **params):
+    return [provider["name"] for provider in client.get("/recommendations", params=params).json()["providers"]]
+
+def test_sort_modes_put_missing_values_last(client, pair):
+    assert names(client, **pair) == ["Best", "Good", "Busy", "Unrated"]
+    assert names(client, **pair, sort="reviews_count") == ["Busy", "Good", "Best", "Unrated"]
+
+def test_filters(client, pair):
+    assert names(client, **pair, min_rating=4) == ["Best", "Good"]
+    assert names(client, **pair, min_reviews=10) == ["Good", "Busy"]
+    assert names(client, **pair, has_website="true") == ["Good", "Busy"]
+    assert names(client, **pair, has_website="false") == ["Best", "Unrated"]
+    assert names(client, **pair, has_phone="false") == ["Good"]
+    assert client.get("/recommendations", params={**pair, "min_rating": 6}).status_code == 422
+
+def query_sql(engine, sort):
+    query = select(Provider).where(
+        Provider.service_type == "plumber", Provider.neighborhood == "filterton"
+    ).order_by(*main.SORT_ORDERS[sort])
+    return str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+
+# Sort modes on providers columns; sentiment orders by the joined provider_features table
+PROVIDER_SORTS = sorted(set(main.SORT_ORDERS) - {"sentiment"})
+
+@pytest.mark.parametrize("sort", PROVIDER_SORTS)
+def test_sqlite_reads_each_sort_mode_from_an_index(fresh_database, sort):
+    with fresh_database.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + query_sql(fresh_database, sort))))
+    assert "USING INDEX ix_providers_service_neighborhood" in plan
+    assert "TEMP B-TREE" not in plan
+
+@pytest.mark.parametrize("sort", PROVIDER_SORTS)
+def test_postgres_reads_each_sort_mode_from_an_index(postgres_database, sort):
+    with postgres_database.begin() as conn:
+        conn.execute(insert(Provider), [
+            {**provider, "service_type": "plumber", "neighborhood": "filterton"} for provider in PROVIDERS
+        ])
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = "\n".join(row[0] for row in conn.execute(text("EXPLAIN " + query_sql(postgres_database, sort))))
+    assert "ix_providers_service_neighborhood" in plan
+    assert "Sort" not in plan
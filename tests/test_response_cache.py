@@ -0,0 +1,53 @@
+import json
+
+import partitioning
+from database import get_data_version
+from ingest_watch import HotFolder
+from response_cache import ResponseCache, warm_cache
+
+def test_cache_evicts_least_recently_used_entries():
+    cache = ResponseCache(max_entries=2, max_bytes=1024, ttl=0)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    assert cache.get("a") == [1]
+    cache.put("c", [3])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1]
+    assert cache.snapshot()["evictions"] == 1
+
+def test_values_computed_before_a_clear_are_dropped():
+    cache = ResponseCache(ttl=0)
+    generation = cache.generation
+    cache.clear()
+    assert cache.put("a", [1], generation) is False
+    assert cache.get("a") is None
+
+def test_warm_cache_stops_at_its_budgets():
+    keys = [("plumber", f"area{i}") for i in range(5)]
+    cache = ResponseCache(ttl=0)
+    report = warm_cache(cache, lambda *key: list(key), keys, time_budget=60, memory_budget=1024 * 1024)
+    assert report["warmed"] == 5 and report["stopped_by"] == "complete"
+    assert cache.get(("plumber", "area4")) == ["plumber", "area4"]
+
+    cache = ResponseCache(ttl=0)
+    report = warm_cache(cache, lambda *key: list(key), keys, time_budget=60, memory_budget=1)
+    assert report["warmed"] == 1 and report["stopped_by"] == "memory_budget"
+
+    report = warm_cache(ResponseCache(ttl=0), lambda *key: list(key), keys, time_budget=0, memory_budget=1024)
+    assert report["warmed"] == 0 and report["stopped_by"] == "time_budget"
+
+def test_ingest_rebuilds_partitions_before_publishing_a_new_version(fresh_database, tmp_path, monkeypatch):
+    (tmp_path / "dataset.json").write_text(json.dumps([
+        {"title": "Publish Order Plumbing", "categoryName": "Plumber", "city": "Ordervale", "totalScore": 4.2}
+    ]))
+    versions = []
+    monkeypatch.setattr(partitioning, "refresh_partitions", lambda neighborhoods=None: versions.append((get_data_version(), neighborhoods)))
+    before = get_data_version()
+
+    folder = HotFolder(str(tmp_path))
+    folder.scan()
+    folder.scan()
+
+    # Partitions are refreshed while workers still see the old version, then the version moves on
+    assert versions == [(before, {"ordervale"})]
+    assert get_data_version() not in (None, before)
@@ -0,0 +1,45 @@
+import json
+from datetime import datetime, timedelta
+
+from database import Provider, SessionLocal
+from review_dates import parse_review_date, resolve_review_dates
+
+SCRAPED_AT = datetime(2024, 6, 1, 12, 0, 0)
+
+def test_relative_and_absolute_dates_are_resolved():
+    assert parse_review_date("a month ago", SCRAPED_AT) == SCRAPED_AT - timedelta(days=30.44)
+    assert parse_review_date("3 weeks ago", SCRAPED_AT) == SCRAPED_AT - timedelta(weeks=3)
+    assert parse_review_date("Yesterday", SCRAPED_AT) == SCRAPED_AT - timedelta(days=1)
+    assert parse_review_date("2024-05-01T10:00:00+02:00", SCRAPED_AT) == datetime(2024, 5, 1, 8, 0, 0)
+    assert parse_review_date("last spring", SCRAPED_AT) is None
+    assert parse_review_date(None, SCRAPED_AT) is None
+
+def test_activity_aggregates_are_computed_from_the_sample():
+    reviews = json.dumps([{"date": "a day ago"}, {"date": "2 months ago"}, {"date": "sometime"}])
+    resolved = resolve_review_dates(reviews, SCRAPED_AT)
+    assert resolved["last_review_at"] == SCRAPED_AT - timedelta(days=1)
+    span_days = (SCRAPED_AT - (SCRAPED_AT - 2 * timedelta(days=30.44))).days
+    assert resolved["review_velocity"] == round(2 * 30 / span_days, 3)
+    stored = json.loads(resolved["reviews"])
+    assert "published_at" in stored[0] and "published_at" not in stored[2]
+
+def test_providers_without_dated_reviews_have_no_activity():
+    resolved = resolve_review_dates(None, SCRAPED_AT)
+    assert resolved["last_review_at"] is None
+    assert resolved["review_velocity"] is None
+
+def test_recommendations_sort_by_recent_activity(client):
+    db = SessionLocal()
+    try:
+        pairs = db.query(Provider.service_type, Provider.neighborhood).distinct().all()
+    finally:
+        db.close()
+    for service_type, neighborhood in pairs:
+        params = {"service_type": service_type, "neighborhood": neighborhood, "sort": "recent_activity"}
+        providers = client.get("/recommendations", params=params).json()["providers"]
+        dates = [provider["last_review_at"] for provider in providers]
+        dated = [date for date in dates if date is not None]
+        assert dated == sorted(dated, reverse=True)
+        # Providers without any dated review come last
+        assert dates[:len(dated)] == dated
+    assert client.get("/recommendations", params={**params, "sort": "newest"}).status_code == 422
@@ -0,0 +1,60 @@
+import json
+
+from sqlalchemy import func, insert, select
+
+from database import Provider, ProviderFeature, SessionLocal
+from review_features import compute_features, provider_features, review_sentiment, TOKEN_PATTERN
+from seed import run_seed
+from stats import refresh_stats
+
+def sentiment(text):
+    return review_sentiment(TOKEN_PATTERN.findall(text))
+
+def test_sentiment_handles_negation():
+    assert sentiment("great and friendly") == 1
+    assert sentiment("not good, rude") == -1
+    assert sentiment("a lack of communication") == -1
+    assert sentiment("arrived on tuesday") is None
+
+def test_provider_features_flag_mentions():
+    reviews = [{"text": "Came out for an emergency, same-day fix"}, {"text": "Excellent work"}, {"text": None}]
+    row = provider_features(7, json.dumps(reviews))
+    assert row["review_texts"] == 2
+    assert row["mentions_emergency"] and row["mentions_same_day"] and not row["mentions_warranty"]
+    assert row["sentiment"] == 1
+    assert provider_features(8, "not json")["review_texts"] == 0
+
+def test_seeding_computes_features_for_every_provider(seeded):
+    run_seed(force=True)
+    db = SessionLocal()
+    try:
+        providers = db.scalar(select(func.count(Provider.id)))
+        features = db.scalar(select(func.count(ProviderFeature.provider_id)))
+    finally:
+        db.close()
+    assert providers and features == providers
+
+def test_recommendations_filter_and_sort_on_features(fresh_database, client):
+    reviews = {
+        "Warm Plumbing": [{"text": "Excellent, friendly, came out for an emergency"}],
+        "Cold Plumbing": [{"text": "Rude and late, an emergency job left broken"}],
+        "Quiet Plumbing": [{"text": "Fitted a tap"}],
+    }
+    db = SessionLocal()
+    try:
+        db.execute(insert(Provider), [
+            {"name": name, "service_type": "plumber", "neighborhood": "featureton", "rating": 4.0,
+             "provider_key": f"plumber:{name.lower()}", "reviews": json.dumps(texts)}
+            for name, texts in reviews.items()
+        ])
+        refresh_stats(db)
+        db.commit()
+    finally:
+        db.close()
+    compute_features(workers=1)
+
+    params = {"service_type": "plumber", "neighborhood": "featureton"}
+    ranked = client.get("/recommendations", params={**params, "sort": "sentiment"}).json()["providers"]
+    assert [provider["name"] for provider in ranked] == ["Warm Plumbing", "Cold Plumbing", "Quiet Plumbing"]
+    emergency = client.get("/recommendations", params={**params, "mentions": "emergency"}).json()["providers"]
+    assert {provider["name"] for provider in emergency} == {"Warm Plumbing", "Cold Plumbing"}
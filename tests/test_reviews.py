@@ -0,0 +1,111 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from database import Provider, ProviderStat, SessionLocal, get_data_changes, publish_data_change
+from reviews import MAX_STORED_REVIEWS, ReviewChanges, add_review
+from stats import ALL, read_stats, refresh_stats
+
+def old_reviews(count):
+    start = datetime(2024, 1, 1)
+    return json.dumps([{"text": f"review {i}", "rating": 4, "published_at": (start - timedelta(days=30 * i)).isoformat()}
+                       for i in range(count)])
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def provider_id(request):
+    request.getfixturevalue("fresh_database" if request.param == "sqlite" else "postgres_database")
+    db = SessionLocal()
+    try:
+        db.execute(insert(Provider), [
+            {"name": "Pipe Works", "service_type": "plumber", "neighborhood": "northam", "rating": 4.3,
+             "reviews_count": 3, "four_star": 3, "provider_key": "plumber:pipe works", "reviews": old_reviews(3)},
+            {"name": "Unrated", "service_type": "plumber", "neighborhood": "northam", "rating": None,
+             "provider_key": "plumber:unrated"},
+        ])
+        refresh_stats(db)
+        db.commit()
+        return db.query(Provider.id).filter(Provider.name == "Pipe Works").scalar()
+    finally:
+        db.close()
+
+def review(provider_id, rating):
+    db = SessionLocal()
+    try:
+        return add_review(db, provider_id, rating, text="Great", reviewer="A")
+    finally:
+        db.close()
+
+def load(provider_id):
+    db = SessionLocal()
+    try:
+        provider = db.get(Provider, provider_id)
+        return provider, db.get(ProviderStat, ("plumber", "northam"))
+    finally:
+        db.close()
+
+def test_rating_is_a_running_average_with_one_decimal(provider_id):
+    # (4.3 * 3 + 5) / 4 = 4.475
+    assert review(provider_id, 5) == (4.5, 4, "plumber", "northam")
+    provider, stat = load(provider_id)
+    assert (provider.rating, provider.reviews_count, provider.five_star) == (4.5, 4, 1)
+    # The pair's running sum moved by exactly the rounded difference
+    assert stat.rating_sum == pytest.approx(4.5)
+    assert stat.total_reviews == 4
+
+def test_review_is_sampled_and_updates_the_velocity(provider_id):
+    before, _ = load(provider_id)
+    review(provider_id, 1)
+    provider, _ = load(provider_id)
+    reviews = json.loads(provider.reviews)
+    assert reviews[0]["text"] == "Great" and len(reviews) == 4
+    assert provider.last_review_at is not None
+    # The new review is recent, so the sample's reviews per 30 days goes up
+    assert provider.review_velocity > (before.review_velocity or 0)
+    for _ in range(MAX_STORED_REVIEWS):
+        review(provider_id, 3)
+    assert len(json.loads(load(provider_id)[0].reviews)) == MAX_STORED_REVIEWS
+
+def test_first_review_rates_an_unrated_provider_and_rollups_follow(provider_id):
+    db = SessionLocal()
+    try:
+        unrated = db.query(Provider.id).filter(Provider.name == "Unrated").scalar()
+    finally:
+        db.close()
+    assert review(unrated, 2)[0] == 2.0
+    _, stat = load(provider_id)
+    assert stat.rated_count == 2
+    db = SessionLocal()
+    try:
+        stats = read_stats(db)
+    finally:
+        db.close()
+    assert stats["total"]["avg_rating"] == round((4.3 + 2.0) / 2, 2)
+    assert stats["total"]["total_reviews"] == 4
+
+def test_unknown_provider_is_not_reviewed(provider_id):
+    assert review(-1, 5) is None
+
+def test_review_changes_publish_their_pairs(fresh_database):
+    publish_data_change()
+    version, _ = get_data_changes(None)
+    changes = ReviewChanges(interval=3600)
+    changes.record(("plumber", "northam"))
+    changes.record(("plumber", "northam"))
+    asyncio.run(changes.flush())
+    assert get_data_changes(version)[1] == {("plumber", "northam")}
+    assert changes.snapshot() == {"pending_pairs": 0, "published_pairs": 1, "failed": 0}
+
+def test_review_endpoint(client):
+    db = SessionLocal()
+    try:
+        provider_id = db.query(Provider.id).filter(Provider.service_type != ALL).first()[0]
+    finally:
+        db.close()
+    response = client.post(f"/providers/{provider_id}/reviews", json={"rating": 5, "text": "Quick and tidy"})
+    assert response.status_code == 201
+    assert response.json()["provider_id"] == provider_id
+    assert client.post(f"/providers/{provider_id}/reviews", json={"rating": 6}).status_code == 422
+    assert client.post("/providers/-1/reviews", json={"rating": 5}).status_code == 404
@@ -0,0 +1,28 @@
+import main
+from database import SessionLocal, get_state, seed_database, seed_lock
+
+def test_reseeding_unchanged_data_is_skipped(seeded):
+    assert seed_database() is False
+    db = SessionLocal()
+    try:
+        assert get_state(db, "seed_fingerprint") is not None
+    finally:
+        db.close()
+
+def test_seed_lock_is_exclusive():
+    with seed_lock() as acquired:
+        assert acquired
+        with seed_lock(blocking=False) as second:
+            assert second is False
+    with seed_lock(blocking=False) as acquired:
+        assert acquired
+
+def test_ready_reports_loaded_data(client):
+    assert client.get("/ready").json() == {"status": "ready"}
+
+def test_ready_returns_503_until_seeded(client, monkeypatch):
+    monkeypatch.setattr(main, "data_ready", False)
+    monkeypatch.setattr(main, "is_data_ready", lambda: False)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "starting"}
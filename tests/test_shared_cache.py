@@ -0,0 +1,76 @@
+import pytest
+
+import main
+import shared_cache
+from response_cache import ResponseCache, create_response_cache
+from shared_cache import SharedResponseCache
+
+PLUMBERS = ("plumber", "northam", "rating", None, None, None, None, None)
+ELECTRICIANS = ("electrician", "northam", "rating", None, None, None, None, None)
+
+def workers(tmp_path, **options):
+    path = str(tmp_path / "cache.db")
+    return SharedResponseCache(path, ttl=0, **options), SharedResponseCache(path, ttl=0, **options)
+
+def test_one_workers_entries_are_served_to_the_others(tmp_path):
+    first, second = workers(tmp_path)
+    first.set_version("v1")
+    second.set_version("v1")
+    assert first.put(PLUMBERS, [{"id": 1}])
+    assert second.get(PLUMBERS) == [{"id": 1}]
+    assert second.snapshot()["entries"] == 1
+
+def test_entries_are_only_served_on_their_data_version(tmp_path):
+    first, second = workers(tmp_path)
+    first.set_version("v1")
+    first.put(PLUMBERS, [1])
+    # A worker that hasn't seen the new version yet neither serves nor stores anything
+    assert second.get(PLUMBERS) is None
+    assert second.put(PLUMBERS, [2]) is False
+
+def test_new_version_drops_only_the_changed_pairs(tmp_path):
+    first, second = workers(tmp_path)
+    first.set_version("v1")
+    first.put(PLUMBERS, [1])
+    first.put(ELECTRICIANS, [2])
+    first.put(main.OPTIONS_KEY, {"service_types": []})
+    first.set_version("v2", {("plumber", "northam")})
+    assert first.get(PLUMBERS) is None
+    assert first.get(main.OPTIONS_KEY) is None
+    assert first.get(ELECTRICIANS) == [2]
+    # The other worker finds the entries already retagged when it moves to v2
+    second.set_version("v2", {("plumber", "northam")})
+    assert second.get(ELECTRICIANS) == [2]
+
+def test_values_computed_before_an_invalidation_are_dropped(tmp_path):
+    cache, _ = workers(tmp_path)
+    cache.set_version("v1")
+    generation = cache.generation
+    cache.invalidate_pairs({("plumber", "northam")})
+    assert cache.put(PLUMBERS, [1], generation) is False
+
+def test_least_recently_stored_entries_are_evicted(tmp_path):
+    cache, _ = workers(tmp_path, max_entries=1)
+    cache.set_version("v1")
+    cache.put(PLUMBERS, [1])
+    cache.put(ELECTRICIANS, [2])
+    assert cache.get(PLUMBERS) is None
+    assert cache.get(ELECTRICIANS) == [2]
+    assert cache.snapshot()["evictions"] == 1
+
+def test_backend_is_chosen_by_name(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "RESPONSE_CACHE_PATH", str(tmp_path / "shared.db"))
+    assert isinstance(create_response_cache("memory"), ResponseCache)
+    shared = create_response_cache("sqlite")
+    assert isinstance(shared, SharedResponseCache) and shared.path == str(tmp_path / "shared.db")
+    with pytest.raises(ValueError):
+        create_response_cache("redis")
+
+def test_recommendations_use_the_shared_cache(client, tmp_path, monkeypatch):
+    cache = SharedResponseCache(str(tmp_path / "cache.db"), ttl=0)
+    cache.set_version(main.cache_state["data_version"] or "v1")
+    monkeypatch.setattr(main, "response_cache", cache)
+    params = {"service_type": "plumber", "neighborhood": "reading"}
+    first = client.get("/recommendations", params=params).json()
+    assert client.get("/recommendations", params=params).json() == first
+    assert cache.snapshot()["hits"] >= 1
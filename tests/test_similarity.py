@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+
+from sqlalchemy import insert
+
+import main
+import similarity
+from database import Provider, SessionLocal, get_data_version
+from similarity import SimilarityIndex, get_similarity_index
+
+PROVIDERS = [
+    ("Boiler Doctor", "plumber", "Fixed our boiler and radiator, great boiler service"),
+    ("Radiator Kings", "plumber", "Replaced a radiator and serviced the boiler"),
+    ("Spark Right", "electrician", "Rewired the kitchen sockets and fuse board"),
+    ("Fuse Box Co", "electrician", "New fuse board and kitchen sockets fitted"),
+]
+
+def add_providers():
+    db = SessionLocal()
+    try:
+        db.execute(insert(Provider), [
+            {"name": name, "service_type": service_type, "neighborhood": "simton", "rating": 4.0,
+             "provider_key": f"{service_type}:{name.lower()}", "reviews": json.dumps([{"text": text}])}
+            for name, service_type, text in PROVIDERS
+        ])
+        db.commit()
+        return {provider.name: provider.id for provider in db.query(Provider)}
+    finally:
+        db.close()
+
+def build(version="v1"):
+    db = SessionLocal()
+    try:
+        return SimilarityIndex.build(db, version)
+    finally:
+        db.close()
+
+def test_similar_providers_share_review_terms(fresh_database):
+    ids = add_providers()
+    index = build()
+    assert index.similar(ids["Boiler Doctor"], k=1)[0][0] == ids["Radiator Kings"]
+    assert index.similar(ids["Spark Right"], k=1, same_service_type=True)[0][0] == ids["Fuse Box Co"]
+    assert index.similar(-1) is None
+
+def test_save_replaces_the_index_without_leaving_temporary_files(fresh_database, tmp_path):
+    add_providers()
+    directory = tmp_path / "index"
+    directory.mkdir()
+    path = directory / "index.npz"
+    build("v1").save(str(path))
+    build("v2").save(str(path))
+    assert SimilarityIndex.load(str(path)).data_version == "v2"
+    assert [entry.name for entry in directory.iterdir()] == ["index.npz"]
+
+def test_old_index_is_served_while_the_new_one_builds(fresh_database, tmp_path, monkeypatch):
+    add_providers()
+    old = build("v1")
+    release = threading.Event()
+    built = threading.Event()
+
+    def slow_build(path, data_version):
+        release.wait(5)
+        index = build(data_version)
+        built.set()
+        return index
+
+    monkeypatch.setattr(similarity, "_index", old)
+    monkeypatch.setattr(similarity, "build_similarity_index", slow_build)
+    path = str(tmp_path / "missing.npz")
+    assert get_similarity_index("v2", path) is old
+    assert get_similarity_index("v2", path) is old
+    release.set()
+    assert built.wait(5)
+    for _ in range(100):
+        if similarity._index is not old:
+            break
+        time.sleep(0.01)
+    assert get_similarity_index("v2", path).data_version == "v2"
+
+def test_similar_endpoint(client, monkeypatch):
+    monkeypatch.setitem(main.cache_state, "data_version", get_data_version())
+    db = SessionLocal()
+    try:
+        provider_id = db.query(Provider.id).filter(Provider.reviews.isnot(None)).first()[0]
+    finally:
+        db.close()
+    response = client.get(f"/providers/{provider_id}/similar", params={"k": 3})
+    assert response.status_code == 200
+    assert len(response.json()["similar"]) <= 3
+    assert client.get("/providers/-1/similar").status_code == 404
+
+def test_recent_index_is_kept_without_a_rebuild(fresh_database, tmp_path, monkeypatch):
+    add_providers()
+    old = build("v1")
+    builds = []
+    monkeypatch.setattr(similarity, "_index", old)
+    monkeypatch.setattr(similarity, "_index_loaded_at", time.monotonic())
+    monkeypatch.setattr(similarity, "build_similarity_index", lambda path, data_version: builds.append(data_version))
+    assert get_similarity_index("v2", str(tmp_path / "missing.npz")) is old
+    assert builds == [] and similarity._building is None
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+import database
+from startup_profile import BACKEND_DIR, import_breakdown
+
+def test_importing_main_does_not_connect_or_load_seed_data():
+    check = (
+        "import sys, main, database; "
+        "assert database._engine is None; "
+        "assert 'enhanced_providers' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", check], cwd=BACKEND_DIR, check=True, env=os.environ.copy())
+
+def test_engine_is_created_once_on_first_use():
+    engine = database.get_engine()
+    assert database.get_engine() is engine
+    assert database.engine is engine
+    db = database.SessionLocal()
+    try:
+        assert db.get_bind() is engine
+    finally:
+        db.close()
+
+def test_import_breakdown_reports_slowest_imports():
+    total_ms, rows = import_breakdown("database", top=5)
+    assert total_ms > 0
+    assert len(rows) == 5
+    assert rows == sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)
@@ -0,0 +1,27 @@
+from sqlalchemy import func
+
+from database import Provider, SessionLocal
+
+def provider_counts():
+    db = SessionLocal()
+    try:
+        total = db.query(func.count(Provider.id), func.sum(Provider.reviews_count)).one()
+        by_service = dict(db.query(Provider.service_type, func.count(Provider.id)).group_by(Provider.service_type).all())
+        return total, by_service
+    finally:
+        db.close()
+
+def test_stats_match_the_providers_table(client):
+    (count, reviews), by_service = provider_counts()
+    stats = client.get("/stats").json()
+    assert stats["total"]["provider_count"] == count
+    assert stats["total"]["total_reviews"] == (reviews or 0)
+    assert {entry["service_type"]: entry["provider_count"] for entry in stats["service_types"]} == by_service
+    assert sum(entry["provider_count"] for entry in stats["pairs"]) == count
+    assert sum(entry["provider_count"] for entry in stats["neighbourhoods"]) == count
+
+def test_stats_entries_are_sorted_by_provider_count(client):
+    stats = client.get("/stats").json()
+    for section in ("service_types", "neighbourhoods", "pairs"):
+        counts = [entry["provider_count"] for entry in stats[section]]
+        assert counts == sorted(counts, reverse=True)
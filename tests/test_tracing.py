@@ -0,0 +1,63 @@
+import asyncio
+import json
+import threading
+
+import tracing
+from tracing import Trace, TraceWriter, TracingMiddleware, span, to_chrome
+
+def read_events(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_middleware_records_spans_and_writes_off_the_request_path(tmp_path, monkeypatch):
+    writer = TraceWriter(path=str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(tracing, "trace_writer", writer)
+
+    async def app(scope, receive, send):
+        with span("work", answer=42):
+            pass
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/ping", "query_string": b"x=1"}
+    asyncio.run(TracingMiddleware(app, sample_rate=1)(scope, None, send))
+    writer.stop()
+
+    events = {event["name"]: event for event in read_events(tmp_path / "traces.jsonl")}
+    assert events["request"]["args"] == {"method": "GET", "path": "/ping", "query": "x=1", "status": 204}
+    assert events["work"]["args"] == {"answer": 42}
+    assert events["work"]["tid"] == events["request"]["tid"]
+    assert writer.written == 1
+
+def test_writer_drops_traces_instead_of_blocking_when_full(tmp_path):
+    release = threading.Event()
+    busy = threading.Event()
+
+    class SlowEvents:
+        def __iter__(self):
+            busy.set()
+            release.wait(5)
+            return iter([{"name": "slow", "ts": 1}])
+
+    writer = TraceWriter(path=str(tmp_path / "traces.jsonl"), max_size=1)
+    slow = Trace()
+    slow.events = SlowEvents()
+    writer.submit(slow)
+    assert busy.wait(5)
+    writer.submit(Trace())
+    writer.submit(Trace())
+    assert writer.dropped == 1
+
+    release.set()
+    writer.flush()
+    assert writer.written == 2
+    writer.stop()
+
+def test_to_chrome_merges_files_in_time_order(tmp_path):
+    (tmp_path / "a.jsonl").write_text('{"name": "late", "ts": 2}\n')
+    (tmp_path / "b.jsonl").write_text('{"name": "early", "ts": 1}\n\n')
+    to_chrome([str(tmp_path / "a.jsonl"), str(tmp_path / "b.jsonl")], str(tmp_path / "trace.json"))
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    assert [event["name"] for event in trace["traceEvents"]] == ["early", "late"]